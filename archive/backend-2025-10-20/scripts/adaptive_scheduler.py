@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Adaptive concurrency for persona-user jobs (run_persona_inplace.py).
+
+AdaptiveScheduler runs callables on a thread pool whose effective size follows a
+target re-evaluated every interval from host signals:
+- CPU: 1-minute load average per core (os.getloadavg)
+- memory: MemAvailable from /proc/meminfo
+- LLM throttling: rate-limited (429) calls observed since the last adjustment,
+  read through an optional rate_limit_probe counter
+
+The target moves AIMD-style: one more worker while there is queued work and the
+host has headroom, one fewer when CPU is saturated, halved on 429s or memory
+pressure. Bounds come from the caller (TESTS_MIN_WORKERS / TESTS_MAX_WORKERS).
+
+An optional gate (fair_share.FairShareGate) must grant a lease before each job
+starts; the lease is released with the job's duration when it finishes.
+"""
+
+import collections
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+
+def cpu_load_per_core() -> Optional[float]:
+    try:
+        return os.getloadavg()[0] / float(os.cpu_count() or 1)
+    except Exception:
+        return None
+
+
+def mem_available_mb() -> Optional[float]:
+    try:
+        with open('/proc/meminfo', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024.0
+    except Exception:
+        return None
+    return None
+
+
+class AdaptiveScheduler:
+    def __init__(
+        self,
+        *,
+        max_workers: int,
+        min_workers: int = 1,
+        initial_workers: Optional[int] = None,
+        interval_sec: float = 2.0,
+        cpu_target: float = 0.85,
+        mem_floor_mb: float = 512.0,
+        rate_limit_probe: Optional[Callable[[], int]] = None,
+        adaptive: bool = True,
+        label: str = '[scheduler]',
+        gate: Any = None,
+        gate_poll_sec: float = 0.5,
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.min_workers = max(1, min(int(min_workers), self.max_workers))
+        if initial_workers is None:
+            # Jobs mostly wait on the LLM or sleep on the sim clock; start above core count
+            initial_workers = 2 * (os.cpu_count() or 2)
+        self.target = self.max_workers if not adaptive else max(self.min_workers, min(self.max_workers, int(initial_workers)))
+        self.interval_sec = float(interval_sec)
+        self.cpu_target = float(cpu_target)
+        self.mem_floor_mb = float(mem_floor_mb)
+        self.rate_limit_probe = rate_limit_probe
+        self.adaptive = adaptive
+        self.label = label
+        self.gate = gate
+        self.gate_poll_sec = float(gate_poll_sec)
+        self.history: list[Dict[str, Any]] = []
+        self._last_throttled = self._probe()
+
+    @classmethod
+    def from_env(cls, *, rate_limit_probe: Optional[Callable[[], int]] = None, label: str = '[scheduler]', gate: Any = None) -> 'AdaptiveScheduler':
+        """TESTS_MAX_WORKERS (16), TESTS_MIN_WORKERS (1), TESTS_INITIAL_WORKERS (2x cores),
+        TESTS_SCHED_INTERVAL_SEC (2), TESTS_CPU_TARGET (0.85 load/core), TESTS_MEM_FLOOR_MB
+        (512); TESTS_ADAPTIVE=0 keeps a fixed pool of TESTS_MAX_WORKERS."""
+        return cls(
+            max_workers=int(os.getenv('TESTS_MAX_WORKERS', '16')),
+            min_workers=int(os.getenv('TESTS_MIN_WORKERS', '1')),
+            initial_workers=int(os.getenv('TESTS_INITIAL_WORKERS')) if os.getenv('TESTS_INITIAL_WORKERS') else None,
+            interval_sec=float(os.getenv('TESTS_SCHED_INTERVAL_SEC', '2')),
+            cpu_target=float(os.getenv('TESTS_CPU_TARGET', '0.85')),
+            mem_floor_mb=float(os.getenv('TESTS_MEM_FLOOR_MB', '512')),
+            rate_limit_probe=rate_limit_probe,
+            adaptive=os.getenv('TESTS_ADAPTIVE', '1').strip().lower() not in {'0', 'false', 'no', 'off'},
+            label=label,
+            gate=gate,
+        )
+
+    def _probe(self) -> int:
+        if self.rate_limit_probe is None:
+            return 0
+        try:
+            return int(self.rate_limit_probe())
+        except Exception:
+            return 0
+
+    def adjust(self, in_flight: int, queued: int) -> int:
+        """Recompute the target from current signals and return it."""
+        if not self.adaptive:
+            return self.target
+        load = cpu_load_per_core()
+        mem_mb = mem_available_mb()
+        throttled_now = self._probe()
+        throttled = max(0, throttled_now - self._last_throttled)
+        self._last_throttled = throttled_now
+        target = self.target
+        reason = ''
+        if throttled > 0:
+            target, reason = target // 2, f'{throttled} rate-limited LLM calls'
+        elif mem_mb is not None and mem_mb < self.mem_floor_mb:
+            target, reason = target // 2, f'{mem_mb:.0f}MB available'
+        elif load is not None and load > self.cpu_target:
+            target, reason = target - 1, f'load {load:.2f}/core'
+        elif queued and in_flight >= target and (load is None or load < 0.8 * self.cpu_target) and (mem_mb is None or mem_mb > 2 * self.mem_floor_mb):
+            target, reason = target + 1, 'headroom'
+        target = max(self.min_workers, min(self.max_workers, target))
+        if target != self.target:
+            self.history.append({'t': time.time(), 'from': self.target, 'to': target, 'reason': reason, 'load': load, 'mem_mb': mem_mb})
+            print(f"{self.label} workers {self.target} -> {target} ({reason})", flush=True)
+            self.target = target
+        return self.target
+
+    def run(self, tasks: Iterable[Tuple[Any, Callable[[], Any]]]) -> Iterator[Tuple[Any, Any, Optional[BaseException]]]:
+        """Run (key, fn) tasks in the given order; yield (key, result, exception) as each finishes."""
+        queue: Deque[Tuple[Any, Callable[[], Any]]] = collections.deque(tasks)
+        in_flight: Dict[Future, Tuple[Any, Any, float]] = {}
+        next_adjust = time.monotonic() + self.interval_sec
+        with ThreadPoolExecutor(max_workers=self.max_workers) as ex:
+            while queue or in_flight:
+                gated = False
+                while queue and len(in_flight) < self.target:
+                    lease = None
+                    if self.gate is not None:
+                        lease = self.gate.try_acquire()
+                        if lease is None:
+                            gated = True
+                            break
+                    key, fn = queue.popleft()
+                    in_flight[ex.submit(fn)] = (key, lease, time.monotonic())
+                timeout = max(0.0, next_adjust - time.monotonic())
+                if gated:
+                    timeout = min(timeout, self.gate_poll_sec)
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(timeout)
+                    done = set()
+                for fut in done:
+                    key, lease, started = in_flight.pop(fut)
+                    if self.gate is not None:
+                        self.gate.release(lease, time.monotonic() - started)
+                    exc = fut.exception()
+                    yield key, (None if exc else fut.result()), exc
+                if time.monotonic() >= next_adjust:
+                    self.adjust(len(in_flight), len(queue))
+                    next_adjust = time.monotonic() + self.interval_sec
@@ -2,16 +2,18 @@
 import os
 import sys
 import json
-import base64
 import argparse
 import pathlib
 import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict
 
 from dotenv import load_dotenv
-from PIL import Image
 import google.generativeai as genai
 
+import llm_client
+from image_variants import image_part
+
 ROOT = pathlib.Path(__file__).resolve().parent.parent
 SCREENS_DIR_DEFAULT = ROOT / 'figma_screens'
 LOGS_DIR = ROOT / 'logs'
@@ -40,17 +42,7 @@ def file_sha1(path: pathlib.Path) -> str:
     return h.hexdigest()
 
 
-def image_to_base64(path: pathlib.Path) -> str:
-    with Image.open(path) as img:
-        # Normalize to PNG for consistent upload
-        img = img.convert('RGBA')
-        from io import BytesIO
-        buf = BytesIO()
-        img.save(buf, format='PNG')
-        return base64.b64encode(buf.getvalue()).decode('utf-8')
-
-
-def describe_screen(model, image_b64: str, filename: str, *, timeout_sec: int = 30, max_retries: int = 2) -> Dict:
+def describe_screen(model, image: Dict, filename: str, *, timeout_sec: int = 30, max_retries: int = 2) -> Dict:
     prompt = (
         "You are documenting UI screens as graph nodes. "
         "Given a single app screen image, return a short JSON with fields: "
@@ -59,15 +51,15 @@ def describe_screen(model, image_b64: str, filename: str, *, timeout_sec: int =
         f"Use the filename as a hint: {filename}."
     )
 
-    # Gemini's Python SDK expects input as parts; we send text + image
+    # Gemini's Python SDK expects input as parts; we send text + image (downscaled variant, image_variants.py)
     # Best-effort with retry
     last_err = None
     for attempt in range(max(1, int(max_retries)) + 1):
         try:
-            response = model.generate_content([
+            response = llm_client.generate(model, [
                 {"text": prompt},
-                {"inline_data": {"mime_type": "image/png", "data": image_b64}},
-            ], request_options={"timeout": int(timeout_sec)})
+                image,
+            ], timeout_sec=int(timeout_sec), max_retries=0)
             break
         except Exception as e:
             last_err = e
@@ -94,6 +86,14 @@ def describe_screen(model, image_b64: str, filename: str, *, timeout_sec: int =
     return obj
 
 
+def write_nodes(out_path: pathlib.Path, nodes: List[Dict]) -> None:
+    """Atomically (re)write screen_nodes.json with the nodes finished so far, in id order."""
+    tmp = out_path.with_name(out_path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(sorted(nodes, key=lambda n: n['id']), f, ensure_ascii=False, indent=2)
+    os.replace(tmp, out_path)
+
+
 def main():
     load_dotenv()
     api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
@@ -110,6 +110,7 @@ def main():
     parser.add_argument('--out', type=str, default=str(OUTPUT_PATH_DEFAULT), help='Path to write screen_nodes.json')
     parser.add_argument('--timeout-sec', type=int, default=int(os.getenv('LLM_TIMEOUT_SEC', '30')), help='Per-call timeout')
     parser.add_argument('--retries', type=int, default=int(os.getenv('LLM_RETRIES', '2')), help='Number of retries on timeout/error')
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('ANALYZE_CONCURRENCY', '4')), help='Screens analyzed in parallel (calls still share the LLM rate limit)')
     args = parser.parse_args()
 
     screens_dir = pathlib.Path(args.screens_dir)
@@ -138,10 +139,9 @@ def main():
         except Exception:
             manifest = []
 
-    for idx, p in enumerate(imgs, start=args.start_id):
-        img_b64 = image_to_base64(p)
-        node = describe_screen(model, img_b64, p.name, timeout_sec=args.timeout_sec, max_retries=args.retries)
-        # Force integral ID and ensure required fields
+    def analyze(idx: int, p: pathlib.Path) -> Dict:
+        node = describe_screen(model, image_part(p), p.name, timeout_sec=args.timeout_sec, max_retries=args.retries)
+        # Force integral ID (by sorted filename, independent of completion order) and ensure required fields
         node['id'] = int(idx)
         if 'name' not in node:
             node['name'] = p.stem
@@ -156,11 +156,24 @@ def main():
                 node['screen_id'] = str(rec['node_id'])
         except Exception:
             pass
-        nodes.append(node)
-        print(f'Analyzed: {p.name}')
+        return node
+
+    # Finished screens are flushed as they complete so a crash keeps them
+    with ThreadPoolExecutor(max_workers=max(1, min(args.concurrency, len(imgs)))) as ex:
+        futures = {ex.submit(analyze, idx, p): p for idx, p in enumerate(imgs, start=args.start_id)}
+        first_err = None
+        for fut in as_completed(futures):
+            try:
+                nodes.append(fut.result())
+            except Exception as e:
+                print(f'Failed: {futures[fut].name}: {e}')
+                first_err = first_err or e
+                continue
+            write_nodes(out_path, nodes)
+            print(f'Analyzed: {futures[fut].name} ({len(nodes)}/{len(imgs)})')
+    if first_err is not None:
+        raise first_err
 
-    with open(out_path, 'w', encoding='utf-8') as f:
-        json.dump(nodes, f, ensure_ascii=False, indent=2)
     print(f'Wrote {len(nodes)} nodes to {out_path}')
 
 
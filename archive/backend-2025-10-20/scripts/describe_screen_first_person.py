@@ -2,8 +2,9 @@
 import os
 import sys
 import json
-import base64
+import hashlib
 import requests
+import threading
 from functools import lru_cache
 import pathlib
 import argparse
@@ -11,17 +12,23 @@ import concurrent.futures
 import random
 
 from dotenv import load_dotenv
-import threading
-import time
+import numpy as np
+
+import llm_client
+import embedding_store
+from image_variants import image_part
+# Re-exported for the persona runner's scheduler probe
+from llm_client import llm_call_stats  # noqa: F401
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
 ROOT = pathlib.Path(__file__).resolve().parent.parent
 FIGMA_CONFIG = ROOT / 'config' / 'figma.config.json'
 
 
 
-def encode_image_png(path: pathlib.Path) -> str:
-    return base64.b64encode(path.read_bytes()).decode('utf-8')
-
-
 def _bound_words(text: str, min_words: int = 50, max_words: int = 75) -> str:
     """Clamp text to roughly the requested word range without breaking words."""
     words = [w for w in (text or '').split() if w]
@@ -74,45 +81,6 @@ def _append_jsonl(log_path: pathlib.Path, obj: dict) -> None:
         pass
 
 
-# --------------------
-# LLM rate limiter and retry wrapper (accuracy-neutral)
-# --------------------
-_LLM_LOCK = threading.Lock()
-_LLM_TOKENS = 0
-_LLM_WINDOW_START = 0.0
-_LLM_LAST_TS = 0.0
-
-def _rate_limited_generate(model, parts_or_prompt, timeout_sec: int = 30):
-    """Token-bucket-ish limiter by QPS; set via env LLM_QPS (default 8). Retries with backoff on 429/5xx."""
-    qps = float(os.getenv('LLM_QPS', '8'))
-    max_retries = int(os.getenv('LLM_MAX_RETRIES', '4'))
-    base_sleep = float(os.getenv('LLM_RETRY_BASE_SEC', '0.5'))
-    for attempt in range(max_retries + 1):
-        # simple QPS gate
-        if qps > 0:
-            with _LLM_LOCK:
-                now = time.time()
-                global _LLM_LAST_TS
-                # ensure at most qps per second
-                min_interval = 1.0 / qps
-                wait = max(0.0, (_LLM_LAST_TS + min_interval) - now)
-                if wait > 0:
-                    time.sleep(wait)
-                _LLM_LAST_TS = time.time()
-        try:
-            if isinstance(parts_or_prompt, list):
-                return model.generate_content(parts_or_prompt, request_options={"timeout": timeout_sec})
-            else:
-                return model.generate_content([{ 'text': str(parts_or_prompt) }], request_options={"timeout": timeout_sec})
-        except Exception as e:
-            msg = str(e).lower()
-            retriable = ('429' in msg) or ('rate' in msg) or ('temporarily unavailable' in msg) or ('timeout' in msg) or ('503' in msg) or ('500' in msg)
-            if attempt >= max_retries or not retriable:
-                raise
-            sleep = (base_sleep * (2 ** attempt)) * (1.0 + 0.2 * random.random())
-            time.sleep(min(sleep, 8.0))
-
-
 # --------------------
 # User/persona utilities
 # --------------------
@@ -382,7 +350,7 @@ def _llm_compose_action_text(model_name: str, goal: str | None, narrative: str,
             pieces.append(f"Why: {rationale}")
         pieces.append("Constraints: 6-20 words, plain imperative, no quotes, no UI jargon unless visible (e.g., 'Search').")
         prompt = "\n".join(pieces)
-        resp = _rate_limited_generate(model, [{ 'text': prompt }], timeout_sec=int(os.getenv('LLM_TIMEOUT_SEC','30')))
+        resp = llm_client.generate(model, [{ 'text': prompt }], timeout_sec=int(os.getenv('LLM_TIMEOUT_SEC','30')))
         text = (getattr(resp, 'text', '') or '').strip()
         if text.startswith('```'):
             text = text.strip('`')
@@ -620,7 +588,7 @@ def _embed_text_gemini(text: str) -> list[float] | None:
         except Exception:
             genai.configure(api_key=api_key)
         model_name = os.getenv('EMBED_MODEL', 'text-embedding-004')
-        resp = genai.embed_content(model=model_name, content=text[:3000])
+        resp = llm_client.embed(text[:3000], model_name=model_name)
         vec = (resp.get('embedding') if isinstance(resp, dict) else getattr(resp, 'embedding', None)) or None
         if isinstance(vec, list) and vec:
             return [float(x) for x in vec]
@@ -629,23 +597,75 @@ def _embed_text_gemini(text: str) -> list[float] | None:
         return None
 
 
-def _semantic_similarity(t1: str, t2: str) -> float:
-    t1 = (t1 or '').strip()
-    t2 = (t2 or '').strip()
-    if not t1 or not t2:
-        return 0.0
-    # Try embeddings
-    v1 = _embed_text_gemini(t1)
-    v2 = _embed_text_gemini(t2) if v1 is not None else None
-    if v1 is not None and v2 is not None:
-        return _cosine_sim(v1, v2)
-    # Fallback: token Jaccard
+# Run's precomputed link-text embeddings (embedding_store.py), set when links are loaded
+_EMBED_STORE: embedding_store.EmbeddingStore | None = None
+_EMBED_STORE_PATH: pathlib.Path | None = None
+
+
+def use_embedding_store(links_json: pathlib.Path | None) -> None:
+    """Memory-map the embeddings stored next to links_json (once per path) for _semantic_similarities."""
+    global _EMBED_STORE, _EMBED_STORE_PATH
+    if not links_json:
+        return
+    path = pathlib.Path(links_json).parent / embedding_store.STORE_FILE
+    if path == _EMBED_STORE_PATH:
+        return
+    store = embedding_store.load_embedding_store(path)
+    if store is not None and store.model != os.getenv('EMBED_MODEL', 'text-embedding-004'):
+        store = None
+    _EMBED_STORE, _EMBED_STORE_PATH = store, path
+
+
+def _text_vector(text: str) -> np.ndarray | None:
+    store = _EMBED_STORE
+    if store is not None:
+        vec = store.vector(text)
+        if vec is not None:
+            return vec
+    vec = _embed_text_gemini(text)
+    return embedding_store.normalize_rows(np.asarray(vec, dtype=np.float32)) if vec is not None else None
+
+
+def _lexical_similarity(t1: str, t2: str) -> float:
+    # Token Jaccard
     a, b = _token_set(t1), _token_set(t2)
     inter = len(a & b)
     union = max(1, len(a | b))
     return inter / union
 
 
+def _semantic_similarities(query: str, texts: list[str]) -> list[float]:
+    """Similarity in [0,1] of query to each text: cosine of embeddings (all candidates in one
+    matrix-vector product), token Jaccard where an embedding is unavailable."""
+    query = (query or '').strip()
+    texts = [(t or '').strip() for t in texts]
+    out = [0.0] * len(texts)
+    if not query:
+        return out
+    q = _text_vector(query)
+    vecs: list[np.ndarray | None] = [None] * len(texts)
+    if q is not None:
+        rows = _EMBED_STORE.rows(texts) if _EMBED_STORE is not None else [None] * len(texts)
+        for i, t in enumerate(texts):
+            if t:
+                vecs[i] = _EMBED_STORE.vectors[rows[i]] if rows[i] is not None else _text_vector(t)
+        have = [i for i, v in enumerate(vecs) if v is not None]
+        if have:
+            cos = np.stack([vecs[i] for i in have]) @ q
+            # map to [0,1] like _cosine_sim
+            sims = np.clip((cos + 1.0) / 2.0, 0.0, 1.0)
+            for i, v in zip(have, sims.tolist()):
+                out[i] = float(v)
+    for i, t in enumerate(texts):
+        if t and vecs[i] is None:
+            out[i] = _lexical_similarity(query, t)
+    return out
+
+
+def _semantic_similarity(t1: str, t2: str) -> float:
+    return _semantic_similarities(t1, [t2])[0]
+
+
 def _fuse_match_to_link(llm_text: str, links: list[dict], current_screen: dict, screens_dir: pathlib.Path) -> dict | None:
     # Inputs
     token = os.getenv('FIGMA_TOKEN') or ''
@@ -682,9 +702,23 @@ def _fuse_match_to_link(llm_text: str, links: list[dict], current_screen: dict,
     if not cands:
         cands = links or []
 
+    # Embedding/lexical semantic similarity on rich text (dominant signal now): all candidates at once
+    cand_texts: list[str] = []
+    for ln in cands:
+        meta = ln.get('meta') or {}
+        cand_text_parts = [
+            str(ln.get('user_intent') or ''),
+            str(ln.get('click_target') or ''),
+            str(ln.get('source_element_name') or ''),
+            str(meta.get('product_name') or '') if isinstance(meta, dict) else '',
+            str(meta.get('product_id') or '') if isinstance(meta, dict) else '',
+        ]
+        cand_texts.append(' '.join([p for p in cand_text_parts if p]))
+    embed_scores = _semantic_similarities(llm_text or '', cand_texts)
+
     best = None
     best_score = -1.0
-    for ln in cands:
+    for ln, s_embed in zip(cands, embed_scores):
         # Scores
         s_loc, s_ann, s_sem = 0.0, 0.0, 0.0
         # Figma element center vs anchor and intent coverage
@@ -758,17 +792,6 @@ def _fuse_match_to_link(llm_text: str, links: list[dict], current_screen: dict,
             if (meta.get('role') or '').lower() == 'product_card':
                 s_sem += 0.10
 
-        # Embedding/lexical semantic similarity on rich text (dominant signal now)
-        cand_text_parts = [
-            str(ln.get('user_intent') or ''),
-            str(ln.get('click_target') or ''),
-            str(ln.get('source_element_name') or ''),
-            str(meta.get('product_name') or '') if isinstance(meta, dict) else '',
-            str(meta.get('product_id') or '') if isinstance(meta, dict) else '',
-        ]
-        cand_text = ' '.join([p for p in cand_text_parts if p])
-        s_embed = _semantic_similarity(llm_text or '', cand_text)
-
         # Final score: let semantics dominate; keep small spatial/annotation influence
         score = 0.20 * s_loc + 0.20 * s_ann + 0.15 * s_sem + 0.45 * s_embed
         if score > best_score:
@@ -993,7 +1016,7 @@ def generate_second_step_with_llm(goal: str, links: list[dict], persona_user: di
     prompt = build_links_review_prompt(goal, links, persona_note)
     try:
         model = _get_generative_model(model_name) or genai.GenerativeModel(model_name)
-        resp = _rate_limited_generate(model, [{ 'text': prompt }], timeout_sec=int(os.getenv('LLM_TIMEOUT_SEC','30')))
+        resp = llm_client.generate(model, [{ 'text': prompt }], timeout_sec=int(os.getenv('LLM_TIMEOUT_SEC','30')))
         text = (getattr(resp, 'text', '') or '').strip()
         if text.startswith('```'):
             text = text.strip('`')
@@ -1047,6 +1070,99 @@ def build_ux_audit_prompt(goal: str | None = None) -> str:
     return base
 
 
+# --------------------
+# Persona-neutral screen analysis (one vision call per screen, shared by every journey of a run)
+# --------------------
+SCREEN_ANALYSIS_VERSION = 1
+
+
+def screen_analysis_enabled() -> bool:
+    return os.getenv('SCREEN_ANALYSIS', '1').strip().lower() not in {'0', 'false', 'no', 'off'}
+
+
+def build_screen_analysis_prompt() -> str:
+    return (
+        "You are a neutral UX analyst looking at a single mobile app screen image. Describe ONLY what is on the screen, "
+        "with no persona, goal or opinion of a particular user. "
+        "Return STRICT JSON with keys: {\"screen_summary\": string (2-4 sentences: purpose and content of the screen), "
+        "\"layout\": string (regions top to bottom), "
+        "\"elements\": [ {\"label\": string, \"type\": string (button/icon/tab/input/card/text/image), \"location\": string (e.g. 'top-right', 'bottom bar, 2nd from left')} ], "
+        "\"salient_ctas\": [ {\"label\": string, \"location\": string, \"purpose\": string} ] (most prominent actions first), "
+        "\"ux_issues\": [ {\"heuristic\": string, \"problem\": string, \"severity_0_1\": number} ] (max 5, Nielsen heuristics)}. "
+        "List every visible tappable element; keep labels verbatim."
+    )
+
+
+_SCREEN_ANALYSES: dict[str, dict] = {}
+_SCREEN_ANALYSES_LOCK = threading.Lock()
+
+
+def get_screen_analysis(model, model_name: str, image_path: pathlib.Path) -> dict | None:
+    """Persona-neutral analysis of a screen (audit, element inventory, salient CTAs).
+
+    Computed with one vision call per screen image and cached in memory and under
+    <screens_dir>/../screen_analysis/ (keyed by image, model and prompt version); a file
+    lock makes concurrent journeys in other threads/processes wait for the first call
+    instead of repeating it. Returns None when the analysis cannot be produced.
+    """
+    try:
+        data = pathlib.Path(image_path).read_bytes()
+    except Exception:
+        return None
+    key = hashlib.sha1(data + f"|{model_name}|{SCREEN_ANALYSIS_VERSION}".encode('utf-8')).hexdigest()
+    with _SCREEN_ANALYSES_LOCK:
+        if key in _SCREEN_ANALYSES:
+            return _SCREEN_ANALYSES[key]
+    cache_dir = pathlib.Path(image_path).resolve().parent.parent / 'screen_analysis'
+    path = cache_dir / f'{key}.json'
+    analysis = None
+    lock_fd = None
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        if fcntl is not None:
+            lock_fd = os.open(str(path) + '.lock', os.O_RDWR | os.O_CREAT, 0o666)
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        if path.exists():
+            analysis = json.loads(path.read_text(encoding='utf-8'))
+        else:
+            parts = [
+                {"text": build_screen_analysis_prompt()},
+                image_part(image_path),
+            ]
+            resp = llm_client.generate(model, parts, timeout_sec=int(os.getenv('LLM_TIMEOUT_SEC', '30')))
+            text = (getattr(resp, 'text', '') or '').strip()
+            if text.startswith('```'):
+                text = text.strip('`')
+                if text.startswith('json'):
+                    text = text[4:]
+            analysis = json.loads(text)
+            if not isinstance(analysis, dict) or not (analysis.get('screen_summary') or analysis.get('elements')):
+                raise ValueError('incomplete screen analysis')
+            tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+            tmp.write_text(json.dumps(analysis, ensure_ascii=False, indent=2), encoding='utf-8')
+            os.replace(tmp, path)
+    except Exception:
+        # Remembered for this process too, so journeys fall back to the image without retrying
+        analysis = None
+    finally:
+        if lock_fd is not None:
+            os.close(lock_fd)
+    with _SCREEN_ANALYSES_LOCK:
+        _SCREEN_ANALYSES[key] = analysis
+    return analysis
+
+
+def _screen_part(model, model_name: str, image_path: pathlib.Path) -> dict:
+    """The screen as a prompt part: the cached analysis as text, or the image itself as a fallback."""
+    analysis = get_screen_analysis(model, model_name, image_path) if screen_analysis_enabled() else None
+    if analysis:
+        return {"text": (
+            "You cannot see the screen image directly; this is a faithful, persona-neutral analysis of it. "
+            "Treat it as exactly what you see on the screen: " + json.dumps(analysis, ensure_ascii=False)
+        )}
+    return image_part(image_path)
+
+
 def generate_first_person_description(image_path: pathlib.Path, model_name: str, goal: str | None = None, user: dict | None = None, previous_input: str | None = None, available_links: list[dict] | None = None) -> dict:
     try:
         import google.generativeai as genai
@@ -1057,20 +1173,26 @@ def generate_first_person_description(image_path: pathlib.Path, model_name: str,
     if not api_key:
         raise RuntimeError('Missing GEMINI_API_KEY/GOOGLE_API_KEY in environment/.env')
 
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name)
+    # Reuse the process-wide client so many journeys in one worker share it
+    model = _get_generative_model(model_name)
+    if model is None:
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel(model_name)
+
+    # Persona passes are text-only over the shared screen analysis (image fallback)
+    screen_part = _screen_part(model, model_name, image_path)
 
     # --- Pass 1: baseline narrative (no goal bias) ---
     persona_note = persona_instructions_for(user, derive_user_bias(user))
     parts1 = [
         {"text": build_base_prompt()},
-        {"inline_data": {"mime_type": "image/png", "data": encode_image_png(image_path)}},
+        screen_part,
     ]
     if persona_note:
         parts1.append({"text": persona_note})
     if previous_input:
         parts1.append({"text": f"Previous screen input (for continuity): {previous_input}"})
-    resp1 = _rate_limited_generate(model, parts1, timeout_sec=int(os.getenv('LLM_TIMEOUT_SEC', '30')))
+    resp1 = llm_client.generate(model, parts1, timeout_sec=int(os.getenv('LLM_TIMEOUT_SEC', '30')))
     text1 = (getattr(resp1, 'text', '') or '').strip()
     if text1.startswith('```'):
         text1 = text1.strip('`')
@@ -1103,13 +1225,13 @@ def generate_first_person_description(image_path: pathlib.Path, model_name: str,
     if goal and str(goal).strip():
         parts2 = [
             {"text": build_goal_prompt(goal)},
-            {"inline_data": {"mime_type": "image/png", "data": encode_image_png(image_path)}},
+            screen_part,
         ]
         if persona_note:
             parts2.append({"text": persona_note})
         if previous_input:
             parts2.append({"text": f"Previous screen input (for continuity): {previous_input}"})
-        resp2 = _rate_limited_generate(model, parts2, timeout_sec=int(os.getenv('LLM_TIMEOUT_SEC', '30')))
+        resp2 = llm_client.generate(model, parts2, timeout_sec=int(os.getenv('LLM_TIMEOUT_SEC', '30')))
         text2 = (getattr(resp2, 'text', '') or '').strip()
         if text2.startswith('```'):
             text2 = text2.strip('`')
@@ -1226,14 +1348,14 @@ def generate_first_person_description(image_path: pathlib.Path, model_name: str,
         # --- Pass 3: UX audit snapshot (heuristics + overall reflection) ---
         parts3 = [
             {"text": build_ux_audit_prompt(goal)},
-            {"inline_data": {"mime_type": "image/png", "data": encode_image_png(image_path)}},
+            screen_part,
         ]
         if persona_note:
             parts3.append({"text": persona_note})
         if previous_input:
             parts3.append({"text": f"Previous screen input (for continuity): {previous_input}"})
         try:
-            resp3 = _rate_limited_generate(model, parts3, timeout_sec=int(os.getenv('LLM_TIMEOUT_SEC', '30')))
+            resp3 = llm_client.generate(model, parts3, timeout_sec=int(os.getenv('LLM_TIMEOUT_SEC', '30')))
             text3 = (getattr(resp3, 'text', '') or '').strip()
             if text3.startswith('```'):
                 text3 = text3.strip('`')
@@ -1266,6 +1388,189 @@ def generate_first_person_description(image_path: pathlib.Path, model_name: str,
     return out
 
 
+# --------------------
+# Journey library entry points (shared by the CLI and in-process batch runners)
+# --------------------
+def load_journey_context(screen_nodes: pathlib.Path, links_json: pathlib.Path | None = None, screens_dir: pathlib.Path | None = None) -> dict:
+    """Load screen_nodes.json and prototype links once; the result is read-only and can be
+    shared by many concurrent journeys in the same process."""
+    nodes = json.loads(pathlib.Path(screen_nodes).read_text(encoding='utf-8')) or []
+    rows: list[dict] = []
+    if links_json:
+        try:
+            enp = pathlib.Path(links_json)
+            rows = json.loads(enp.read_text(encoding='utf-8')) if enp.exists() else []
+        except Exception:
+            rows = []
+        use_embedding_store(pathlib.Path(links_json))
+    by_id: dict[int, dict] = {}
+    by_screen_id: dict[str, dict] = {}
+    for n in nodes:
+        try:
+            by_id[int(n.get('id'))] = n
+        except Exception:
+            pass
+        sid = str(n.get('screen_id') or '')
+        if sid and sid not in by_screen_id:
+            by_screen_id[sid] = n
+    links_by_source: dict[str, list[dict]] = {}
+    for row in (rows or []):
+        try:
+            links_by_source.setdefault(str(row.get('source_screen_id') or ''), []).append(row)
+        except Exception:
+            continue
+    return {
+        'nodes': nodes,
+        'by_id': by_id,
+        'by_screen_id': by_screen_id,
+        'links': rows,
+        'links_by_source': links_by_source,
+        'screens_dir': pathlib.Path(screens_dir) if screens_dir else pathlib.Path(screen_nodes).parent / 'screens',
+    }
+
+
+def journey_links_for(jctx: dict, screen_id: str | None) -> list[dict]:
+    links: list[dict] = []
+    for row in jctx['links_by_source'].get(str(screen_id), []):
+        links.append({
+            'linkId': row.get('linkId'),
+            'click_target': row.get('click_target'),
+            'user_intent': row.get('user_intent'),
+            'source_element_name': row.get('source_element_name'),
+            'source_element_id': row.get('source_element_id'),
+            'destination_screen_id': row.get('destination_screen_id'),
+        })
+    return links
+
+
+def run_journey(jctx: dict, *, source_screen_id: int, target_screen_id: int, goal: str | None, persona_user: dict | None,
+                model_name: str, stream_log: pathlib.Path | None = None, fallback_image: pathlib.Path | None = None,
+                max_hops: int | None = None) -> dict:
+    """Walk from source to target, one first-person description per screen. Returns {'journey': [...]}."""
+    nodes = jctx['nodes']
+    screens_dir = jctx['screens_dir']
+    current_rec = jctx['by_id'].get(int(source_screen_id))
+    current_screen_id = str(current_rec.get('screen_id')) if current_rec else None
+    if fallback_image is None and current_rec:
+        fallback_image = screens_dir / str(current_rec.get('file') or '')
+    target_sid = None
+    # Resolve target screen_id string
+    tr = jctx['by_id'].get(int(target_screen_id))
+    if tr:
+        target_sid = str(tr.get('screen_id') or '') or None
+    steps: list[dict] = []
+    previous_input = None
+    if max_hops is None:
+        max_hops = int(os.getenv('JOURNEY_MAX_STEPS', '150'))
+    for hop in range(max_hops):
+        # Resolve image path for current
+        curr_file = current_rec.get('file') if current_rec else None
+        curr_img = (screens_dir / curr_file) if curr_file else fallback_image
+        # Compute available_links for this current screen (before generation)
+        links = journey_links_for(jctx, current_screen_id)
+        # Generate per-screen logs with link constraints
+        one_raw = generate_first_person_description(curr_img, model_name, goal, persona_user, previous_input, available_links=links)
+        # Compose a front-matter header so screen_id and frame_name appear first
+        frame_name = str((current_rec or {}).get('name') or (current_rec or {}).get('file') or '')
+        header = {
+            'step': hop + 1,
+            'screen_id': current_screen_id,
+            'frame_name': frame_name,
+            'screen_header': f"Screen Step {hop+1}",
+        }
+        if links:
+            header['available_links'] = links
+        # Ensure header keys come first in output order
+        one = { **header, **one_raw }
+        # Stream this step to jsonl immediately (best effort)
+        if stream_log is not None:
+            _append_jsonl(stream_log, one)
+        # Move to next screen if not target
+        if target_sid and str(current_screen_id) == str(target_sid):
+            steps.append(one)
+            break
+        next_sid = None
+        # Prefer deterministic binding using chosen_link_id from second_action when present.
+        try:
+            chosen_link = None
+            # 0) chosen_link_id direct
+            chosen_id = one.get('chosen_link_id')
+            if chosen_id is not None:
+                for ln in (one.get('available_links') or []):
+                    if str(ln.get('linkId')) == str(chosen_id) and ln.get('destination_screen_id'):
+                        chosen_link = ln
+                        break
+
+            # 1) Try final_action text (second_action if present, else first_action)
+            if not chosen_link:
+                intent_text = (one.get('final_action') or one.get('first_action')) or ''
+                if intent_text and isinstance(intent_text, str) and intent_text.strip():
+                    cand = _fuse_match_to_link(intent_text, one.get('available_links') or [], current_rec or {}, screens_dir)
+                    if cand and cand.get('destination_screen_id'):
+                        chosen_link = cand
+
+            # Fallback 1: semantic key match (align action key to link key)
+            if not chosen_link:
+                try:
+                    action_key = _map_llm_action_to_key((one.get('final_action') or one.get('first_action') or '')) or ''
+                except Exception:
+                    action_key = ''
+                if action_key:
+                    for ln in (one.get('available_links') or []):
+                        lk = _map_click_target_to_key(str(ln.get('click_target') or '')) or ''
+                        if lk == action_key and ln.get('destination_screen_id'):
+                            chosen_link = ln
+                            break
+
+            # Fallback 2: token overlap between goal/narratives and link texts
+            if not chosen_link:
+                def _toks(s: str) -> set:
+                    import re
+                    return set(t for t in re.findall(r'[a-zA-Z0-9]+', (s or '').lower()) if len(t) > 2)
+                pref_text = ' '.join([
+                    str(one.get('links_review_narrative') or ''),
+                    str(one.get('goal_based_narrative') or ''),
+                    str(goal or ''),
+                    str((one.get('final_action') or one.get('first_action') or '')),
+                ])
+                q = _toks(pref_text)
+                best, best_sc = None, -1
+                for ln in (one.get('available_links') or []):
+                    cand_text = ' '.join([
+                        str(ln.get('user_intent') or ''),
+                        str(ln.get('click_target') or ''),
+                        str(ln.get('source_element_name') or ''),
+                    ])
+                    sc = len(q.intersection(_toks(cand_text)))
+                    if sc > best_sc and ln.get('destination_screen_id'):
+                        best, best_sc = ln, sc
+                if best:
+                    chosen_link = best
+
+            if chosen_link:
+                next_sid = str(chosen_link.get('destination_screen_id'))
+                if not one.get('final_action'):
+                    one['final_action'] = str(chosen_link.get('click_target') or '')
+                    one['final_action_struct'] = {
+                        'control': str(chosen_link.get('source_element_name') or ''),
+                        'location': '',
+                        'rationale': 'Chosen from available_links based on user goal/preferences',
+                        'decision_source': 'fallback_available_links',
+                        'linkId': chosen_link.get('linkId'),
+                    }
+        except Exception:
+            next_sid = None
+        steps.append(one)
+        if not next_sid or not nodes:
+            break
+        # advance current
+        current_screen_id = next_sid
+        # update record by screen_id match
+        current_rec = jctx['by_screen_id'].get(str(current_screen_id))
+        previous_input = (one.get('links_review_narrative') or one.get('goal_based_narrative') or '')
+    return {'journey': steps}
+
+
 def main():
     load_dotenv()
     parser = argparse.ArgumentParser(description='Describe a screen image in first-person using Gemini')
@@ -1445,6 +1750,7 @@ def main():
                         rows = json.loads(enp.read_text(encoding='utf-8')) if enp.exists() else []
                     except Exception:
                         rows = []
+                    use_embedding_store(enp)
                     sid_here = str(current_sid_local)
                     for row in (rows or []):
                         try:
@@ -1534,14 +1840,14 @@ def main():
                         # decision confidence via embedding similarity top-2
                         try:
                             inten = fa or one.get('final_action') or ''
-                            scores = []
-                            for ln in (one.get('available_links') or []):
-                                cand_text = ' '.join([
+                            scores = _semantic_similarities(inten, [
+                                ' '.join([
                                     str(ln.get('user_intent') or ''),
                                     str(ln.get('click_target') or ''),
                                     str(ln.get('source_element_name') or ''),
                                 ])
-                                scores.append(_semantic_similarity(inten, cand_text))
+                                for ln in (one.get('available_links') or [])
+                            ])
                             scores.sort(reverse=True)
                             one['decision_confidence'] = round(float(scores[0] - (scores[1] if len(scores) > 1 else 0.0)), 3) if scores else 0.0
                         except Exception:
@@ -1750,7 +2056,6 @@ def main():
             result = generate_first_person_description(img_path, args.model, args.goal, persona_user, previous_input=None)
         else:
             # Journey loop from source to target using available links and final_action
-            steps: list[dict] = []
             # Optional streaming log path
             stream_log = None
             try:
@@ -1763,152 +2068,17 @@ def main():
                         stream_log.unlink()
             except Exception:
                 stream_log = None
-            current_rec = get_rec_by_id(int(args.source_screen_id)) if 'get_rec_by_id' in locals() else None
-            current_screen_id = str(current_rec.get('screen_id')) if current_rec else resolved_screen_id
-            target_sid = None
-            # Resolve target screen_id string
-            tr = get_rec_by_id(int(args.target_screen_id)) if 'get_rec_by_id' in locals() else None
-            if tr:
-                target_sid = str(tr.get('screen_id') or '') or None
-            previous_input = None
-            max_hops = int(os.getenv('JOURNEY_MAX_STEPS', '150'))
-            for hop in range(max_hops):
-                # Resolve image path for current
-                curr_file = current_rec.get('file') if current_rec else None
-                curr_img = (screens_dir / curr_file) if curr_file else img_path
-                # Compute available_links for this current screen (before generation) if links-json provided
-                links = []
-                if args.links_json:
-                    try:
-                        enp = pathlib.Path(args.links_json)
-                        rows = json.loads(enp.read_text(encoding='utf-8')) if enp.exists() else []
-                    except Exception:
-                        rows = []
-                    sid_here = str(current_screen_id)
-                for row in (rows or []):
-                        try:
-                            if str(row.get('source_screen_id') or '') == sid_here:
-                                links.append({
-                                    'linkId': row.get('linkId'),
-                                    'click_target': row.get('click_target'),
-                                'user_intent': row.get('user_intent'),
-                                    'source_element_name': row.get('source_element_name'),
-                                    'source_element_id': row.get('source_element_id'),
-                                    'destination_screen_id': row.get('destination_screen_id'),
-                                })
-                        except Exception:
-                            continue
-                # Generate per-screen logs with link constraints
-                one_raw = generate_first_person_description(curr_img, args.model, args.goal, persona_user, previous_input, available_links=links)
-                # Compose a front-matter header so screen_id and frame_name appear first
-                frame_name = str((current_rec or {}).get('name') or (current_rec or {}).get('file') or '')
-                header = {
-                    'step': hop + 1,
-                    'screen_id': current_screen_id,
-                    'frame_name': frame_name,
-                    'screen_header': f"Screen Step {hop+1}",
-                }
-                if links:
-                    header['available_links'] = links
-                # Ensure header keys come first in output order
-                one = { **header, **one_raw }
-                # Stream this step to jsonl immediately (best effort)
-                if stream_log is not None:
-                    _append_jsonl(stream_log, one)
-                # Decide final_action already computed inside generate; if not, fallback
-                final_text = one.get('final_action') or one.get('first_action')
-                final_struct = one.get('final_action_struct') or one.get('first_action_struct')
-                # Move to next screen if not target
-                if target_sid and str(current_screen_id) == str(target_sid):
-                    steps.append(one)
-                    result = {'journey': steps}
-                    break
-                next_sid = None
-                # Prefer deterministic binding using chosen_link_id from second_action when present.
-                try:
-                    chosen_link = None
-                    # 0) chosen_link_id direct
-                    chosen_id = one.get('chosen_link_id')
-                    if chosen_id is not None:
-                        for ln in (one.get('available_links') or []):
-                            if str(ln.get('linkId')) == str(chosen_id) and ln.get('destination_screen_id'):
-                                chosen_link = ln
-                                break
-
-                    # 1) Try final_action text (second_action if present, else first_action)
-                    if not chosen_link:
-                        intent_text = (one.get('final_action') or one.get('first_action')) or ''
-                        if intent_text and isinstance(intent_text, str) and intent_text.strip():
-                            cand = _fuse_match_to_link(intent_text, one.get('available_links') or [], current_rec or {}, screens_dir)
-                            if cand and cand.get('destination_screen_id'):
-                                chosen_link = cand
-
-                    # Fallback 1: semantic key match (align action key to link key)
-                    if not chosen_link:
-                        try:
-                            action_key = _map_llm_action_to_key((one.get('final_action') or one.get('first_action') or '')) or ''
-                        except Exception:
-                            action_key = ''
-                        if action_key:
-                            for ln in (one.get('available_links') or []):
-                                lk = _map_click_target_to_key(str(ln.get('click_target') or '')) or ''
-                                if lk == action_key and ln.get('destination_screen_id'):
-                                    chosen_link = ln
-                                    break
-
-                    # Fallback 2: token overlap between goal/narratives and link texts
-                    if not chosen_link:
-                        def _toks(s: str) -> set:
-                            import re
-                            return set(t for t in re.findall(r'[a-zA-Z0-9]+', (s or '').lower()) if len(t) > 2)
-                        pref_text = ' '.join([
-                            str(one.get('links_review_narrative') or ''),
-                            str(one.get('goal_based_narrative') or ''),
-                            str(args.goal or ''),
-                            str((one.get('final_action') or one.get('first_action') or '')),
-                        ])
-                        q = _toks(pref_text)
-                        best, best_sc = None, -1
-                        for ln in (one.get('available_links') or []):
-                            cand_text = ' '.join([
-                                str(ln.get('user_intent') or ''),
-                                str(ln.get('click_target') or ''),
-                                str(ln.get('source_element_name') or ''),
-                            ])
-                            sc = len(q.intersection(_toks(cand_text)))
-                            if sc > best_sc and ln.get('destination_screen_id'):
-                                best, best_sc = ln, sc
-                        if best:
-                            chosen_link = best
-
-                    if chosen_link:
-                        next_sid = str(chosen_link.get('destination_screen_id'))
-                        if not one.get('final_action'):
-                            one['final_action'] = str(chosen_link.get('click_target') or '')
-                            one['final_action_struct'] = {
-                                'control': str(chosen_link.get('source_element_name') or ''),
-                                'location': '',
-                                'rationale': 'Chosen from available_links based on user goal/preferences',
-                                'decision_source': 'fallback_available_links',
-                                'linkId': chosen_link.get('linkId'),
-                            }
-                except Exception:
-                    next_sid = None
-                steps.append(one)
-                if not next_sid or not nodes:
-                    result = {'journey': steps}
-                    break
-                # advance current
-                current_screen_id = next_sid
-                # update record by screen_id match
-                current_rec = None
-                for n in (nodes or []):
-                    if str(n.get('screen_id') or '') == str(current_screen_id):
-                        current_rec = n
-                        break
-                previous_input = (one.get('links_review_narrative') or one.get('goal_based_narrative') or '')
-            else:
-                result = {'journey': steps}
+            jctx = load_journey_context(nodes_path, pathlib.Path(args.links_json) if args.links_json else None, screens_dir)
+            result = run_journey(
+                jctx,
+                source_screen_id=int(args.source_screen_id),
+                target_screen_id=int(args.target_screen_id),
+                goal=args.goal,
+                persona_user=persona_user,
+                model_name=args.model,
+                stream_log=stream_log,
+                fallback_image=img_path,
+            )
     except Exception as e:
         print(f"ERROR: {e}", file=sys.stderr)
         sys.exit(2)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Vectorized edge scoring for the traversal simulator.
+
+Each run's edges are tokenized once into sparse (CSR) term sets. Scoring all
+outgoing edges of a screen for one or many users is then a handful of NumPy
+operations, with persona scales applied as (users x 3) vectors.
+
+Scores and ordering are bit-for-bit identical to simulate_user_traversal.score_edge
+and choose_edge: the same float64 operations run in the same order, and ties keep
+link order (stable sort). `python scripts/edge_scoring.py --run-dir ...` sweeps every
+screen/persona against the reference implementation and reports any mismatch;
+set SCORING_PARITY_CHECK=1 to cross-check every live decision as well.
+"""
+
+import argparse
+import pathlib
+import sys
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+_SCALE_KEYS = ('direct_scale', 'back_scale', 'distance_scale')
+
+
+def _csr(rows: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    ptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    flat: List[int] = []
+    for i, r in enumerate(rows):
+        flat.extend(r)
+        ptr[i + 1] = len(flat)
+    return ptr, np.asarray(flat, dtype=np.int64)
+
+
+def _row_index(ptr: np.ndarray) -> np.ndarray:
+    """Edge index for every token position of a CSR token array."""
+    return np.repeat(np.arange(len(ptr) - 1, dtype=np.int64), np.diff(ptr))
+
+
+class EdgeScorer:
+    """Pre-tokenized, vectorized replacement for score_edge/choose_edge/match_intent_to_edge/is_wait_edge.
+
+    Build it with the simulator's tokenizer and token constants so both code paths share
+    one definition. When a compiled RunGraph is passed its token arrays are reused as-is.
+    """
+
+    def __init__(
+        self,
+        edges_by_source_id: Dict[int, List[Dict[str, Any]]],
+        *,
+        tokenize: Callable[[str], List[str]],
+        generic_cta: Iterable[str],
+        back_tokens: Iterable[str],
+        wait_keywords: Iterable[str],
+        graph: Any = None,
+    ) -> None:
+        self._tokenize = tokenize
+        self.edges: Sequence[Dict[str, Any]] = []
+        self._range: Dict[int, Tuple[int, int]] = {}
+        if graph is not None:
+            ptr = graph.indptr.tolist()
+            for i, nid in enumerate(graph.node_ids.tolist()):
+                if ptr[i + 1] > ptr[i]:
+                    self._range[int(nid)] = (ptr[i], ptr[i + 1])
+            # Edge dicts stay lazy; scores only need the token and id arrays
+            self.edges = graph.edges
+            self.vocab: Dict[str, int] = {w: i for i, w in enumerate(graph.vocab)}
+            self.score_ptr = graph.score_tok_ptr.astype(np.int64)
+            self.score_ids = graph.score_tok_ids.astype(np.int64)
+            self.match_ptr = graph.match_tok_ptr.astype(np.int64)
+            self.match_ids = graph.match_tok_ids.astype(np.int64)
+            self.wait = graph.wait_flag.astype(bool)
+        else:
+            self.vocab = {}
+            score_rows: List[List[int]] = []
+            match_rows: List[List[int]] = []
+            wait_rows: List[bool] = []
+            wait_set = set(wait_keywords)
+            for sid, arr in edges_by_source_id.items():
+                a = len(self.edges)
+                for e in arr:
+                    self.edges.append(e)
+                    score_rows.append(self._term_ids(e.get('user_intent'), e.get('click_target'), e.get('destination_screen_description'), e.get('destination_screen_name')))
+                    match_rows.append(self._term_ids(e.get('click_target'), e.get('user_intent'), e.get('destination_screen_name')))
+                    wtoks = set()
+                    for f in (e.get('click_target'), e.get('user_intent'), e.get('source_element_name'), e.get('destination_screen_name')):
+                        wtoks.update(tokenize(str(f or '')))
+                    wait_rows.append(bool(wtoks & wait_set))
+                self._range[int(sid)] = (a, len(self.edges))
+            self.score_ptr, self.score_ids = _csr(score_rows)
+            self.match_ptr, self.match_ids = _csr(match_rows)
+            self.wait = np.asarray(wait_rows, dtype=bool)
+        self.score_row = _row_index(self.score_ptr)
+        self.match_row = _row_index(self.match_ptr)
+        n = len(self.edges)
+        if graph is not None:
+            self.dest_ids = graph.edge_dest_id.astype(np.int64)
+        else:
+            self.dest_ids = np.asarray([e.get('_dest_id') if isinstance(e.get('_dest_id'), int) else -1 for e in self.edges], dtype=np.int64)
+        self.has_dest = self.dest_ids >= 0
+        self.cta = self._flag(generic_cta, n)
+        self.back = self._flag(back_tokens, n)
+
+    # --- construction helpers ---
+    def _term_ids(self, *texts: Any) -> List[int]:
+        out = set()
+        for t in texts:
+            for w in self._tokenize(str(t or '')):
+                if w not in self.vocab:
+                    self.vocab[w] = len(self.vocab)
+                out.add(self.vocab[w])
+        return sorted(out)
+
+    def _flag(self, tokens: Iterable[str], n: int) -> np.ndarray:
+        hit = np.zeros(len(self.vocab), dtype=bool)
+        for t in tokens:
+            if t in self.vocab:
+                hit[self.vocab[t]] = True
+        per_tok = hit[self.score_ids] if len(self.score_ids) else np.zeros(0, dtype=bool)
+        return np.bincount(self.score_row, weights=per_tok, minlength=n)[:n] > 0
+
+    @lru_cache(maxsize=256)
+    def _query_terms(self, text: str) -> np.ndarray:
+        mask = np.zeros(len(self.vocab), dtype=bool)
+        for w in self._tokenize(text):
+            i = self.vocab.get(w)
+            if i is not None:
+                mask[i] = True
+        return mask
+
+    def _overlap(self, text: str, a: int, b: int, ptr: np.ndarray, ids: np.ndarray, row: np.ndarray) -> np.ndarray:
+        mask = self._query_terms(text or '')
+        lo, hi = int(ptr[a]), int(ptr[b])
+        hits = mask[ids[lo:hi]] if hi > lo else np.zeros(0, dtype=bool)
+        return np.bincount(row[lo:hi] - a, weights=hits, minlength=b - a)[: b - a]
+
+    # --- public API ---
+    def edge_span(self, source_id: int) -> Tuple[int, int]:
+        return self._range.get(int(source_id), (0, 0))
+
+    def outgoing(self, source_id: int) -> List[Dict[str, Any]]:
+        a, b = self.edge_span(source_id)
+        return self.edges[a:b]
+
+    def score_batch(
+        self,
+        goal: str,
+        source_id: int,
+        target_id: Optional[int],
+        distances: Optional[Dict[int, int]],
+        visited: Sequence[Optional[Sequence[int]]],
+        scales: np.ndarray,
+    ) -> np.ndarray:
+        """Scores (users x outgoing edges) for one screen.
+
+        visited holds one recent-visit list per user; scales is (users x 3) in
+        (direct_scale, back_scale, distance_scale) order.
+        """
+        a, b = self.edge_span(source_id)
+        k = b - a
+        scales = np.asarray(scales, dtype=np.float64).reshape(-1, 3)
+        u = scales.shape[0]
+        if k == 0:
+            return np.zeros((u, 0), dtype=np.float64)
+        direct_s = scales[:, 0:1]
+        back_s = scales[:, 1:2]
+        dist_s = scales[:, 2:3]
+        dest = self.dest_ids[a:b]
+
+        score = np.broadcast_to(self._overlap(goal, a, b, self.score_ptr, self.score_ids, self.score_row).astype(np.float64), (u, k)).copy()
+        score = np.where(self.cta[a:b], score + 0.3, score)
+        score = np.where(self.back[a:b], score - 6.0 * back_s, score)
+        if target_id is not None:
+            score = np.where(dest == int(target_id), score + 100.0 * direct_s, score)
+            if distances:
+                d = np.asarray([distances.get(int(x)) if x >= 0 and isinstance(distances.get(int(x)), int) else -1 for x in dest.tolist()], dtype=np.int64)
+                bonus = np.maximum(0.0, 40.0 - 10.0 * d.astype(np.float64))
+                score = np.where(d >= 0, score + dist_s * bonus, score)
+        for i, vis in enumerate(visited):
+            if not vis:
+                continue
+            recent = np.isin(dest, np.asarray(list(vis[-2:]), dtype=np.int64)) & (dest >= 0)
+            earlier = np.isin(dest, np.asarray(list(vis), dtype=np.int64)) & (dest >= 0) & ~recent
+            score[i] = np.where(recent, score[i] - 8.0, np.where(earlier, score[i] - 4.0, score[i]))
+        return score
+
+    def rank(
+        self,
+        goal: str,
+        source_id: int,
+        target_id: Optional[int] = None,
+        distances: Optional[Dict[int, int]] = None,
+        visited_recent: Optional[List[int]] = None,
+        persona_scales: Optional[Dict[str, float]] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], List[Tuple[Dict[str, Any], float]]]:
+        """Drop-in for choose_edge over the outgoing edges of source_id."""
+        ps = persona_scales or {'direct_scale': 1.0, 'back_scale': 1.0, 'distance_scale': 1.0}
+        scales = np.asarray([[ps[k] for k in _SCALE_KEYS]], dtype=np.float64)
+        scores = self.score_batch(goal, source_id, target_id, distances, [visited_recent], scales)[0]
+        a, _ = self.edge_span(source_id)
+        order = np.argsort(-scores, kind='stable')
+        vals = scores.tolist()
+        ranked = [(self.edges[a + j], vals[j]) for j in order.tolist()]
+        return (ranked[0][0] if ranked else None), ranked
+
+    def match_intent(self, decision_text: str, source_id: int) -> Optional[Dict[str, Any]]:
+        """Drop-in for match_intent_to_edge: first edge with the highest token overlap."""
+        a, b = self.edge_span(source_id)
+        if b <= a:
+            return None
+        counts = self._overlap(decision_text, a, b, self.match_ptr, self.match_ids, self.match_row)
+        return self.edges[a + int(np.argmax(counts))]
+
+    def wait_edges(self, source_id: int) -> List[Dict[str, Any]]:
+        a, b = self.edge_span(source_id)
+        return [self.edges[a + j] for j in np.flatnonzero(self.wait[a:b]).tolist()]
+
+
+def scales_matrix(scales_list: Sequence[Optional[Dict[str, float]]]) -> np.ndarray:
+    """Stack persona scale dicts into the (users x 3) matrix score_batch expects."""
+    rows = []
+    for ps in scales_list:
+        ps = ps or {'direct_scale': 1.0, 'back_scale': 1.0, 'distance_scale': 1.0}
+        rows.append([float(ps[k]) for k in _SCALE_KEYS])
+    return np.asarray(rows, dtype=np.float64).reshape(-1, 3)
+
+
+def check_parity(scorer: EdgeScorer, reference_choose: Callable, goal: str, source_id: int, target_id: Optional[int],
+                 distances: Optional[Dict[int, int]], visited: Optional[List[int]], scales: Optional[Dict[str, float]]) -> Optional[str]:
+    """Compare one decision against the reference choose_edge; returns a message on mismatch."""
+    edges = scorer.outgoing(source_id)
+    _, ref = reference_choose(goal, edges, target_id, distances, visited, scales)
+    _, got = scorer.rank(goal, source_id, target_id, distances, visited, scales)
+    ref_key = [(e.get('linkId'), id(e), sc) for e, sc in ref]
+    got_key = [(e.get('linkId'), id(e), sc) for e, sc in got]
+    if ref_key != got_key:
+        return f"screen={source_id} goal={goal!r} visited={visited} scales={scales}: reference={[(k[0], k[2]) for k in ref_key]} vectorized={[(k[0], k[2]) for k in got_key]}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check vectorized edge scoring against score_edge/choose_edge for a run')
+    parser.add_argument('--run-dir', required=True)
+    parser.add_argument('--goal', action='append', required=True, help='Goal text (repeatable)')
+    parser.add_argument('--persona-json', default=None, help='Personas to sweep (default: neutral scales only)')
+    parser.add_argument('--target-id', type=int, action='append', default=None, help='Target screen id (repeatable; default: every screen)')
+    args = parser.parse_args()
+
+    import simulate_user_traversal as sut
+
+    ctx = sut.load_traversal_context(pathlib.Path(args.run_dir))
+    scorer = sut.build_edge_scorer(ctx)
+    personas = sut.load_personas(pathlib.Path(args.persona_json)) if args.persona_json else []
+    scale_sets: List[Optional[Dict[str, float]]] = [None] + [sut.compute_persona_scales(p) for p in personas]
+    targets = args.target_id or sorted(ctx.id_to_name)
+    checked = 0
+    failures: List[str] = []
+    for goal in args.goal:
+        for tgt in targets:
+            dist = ctx.distances_to(tgt)
+            for sid in sorted(ctx.edges_by_source_id):
+                dests = [e.get('_dest_id') for e in ctx.edges_by_source_id[sid] if isinstance(e.get('_dest_id'), int)]
+                visited_variants: List[Optional[List[int]]] = [None, [sid], dests[:1] + [sid], dests + [sid]]
+                for ps in scale_sets:
+                    for vis in visited_variants:
+                        checked += 1
+                        msg = check_parity(scorer, sut.choose_edge, goal, sid, tgt, dist, vis, ps)
+                        if msg:
+                            failures.append(msg)
+                # intent matching and wait flags
+                for text in (goal, ' '.join(str(e.get('click_target') or '') for e in ctx.edges_by_source_id[sid][:1])):
+                    checked += 1
+                    if sut.match_intent_to_edge(text, ctx.edges_by_source_id[sid]) is not scorer.match_intent(text, sid):
+                        failures.append(f"match_intent mismatch screen={sid} text={text!r}")
+                checked += 1
+                if [e for e in ctx.edges_by_source_id[sid] if sut.is_wait_edge(e)] != scorer.wait_edges(sid):
+                    failures.append(f"wait_edges mismatch screen={sid}")
+    for f in failures[:20]:
+        print('MISMATCH', f)
+    print(f"Checked {checked} decisions; mismatches={len(failures)}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Per-run store of text embeddings for link matching.
+
+Preprocess embeds every link text the simulations compare against (the
+candidate strings built from click_target, user_intent, element name and
+product meta) in batched requests and writes, next to the enriched links:
+- embeddings.npy: float32 (N, D) matrix of L2-normalized vectors
+- embeddings.json: {"version", "model", "dim", "keys"} where keys[i] is the
+  text hash (text_key) of row i
+
+Simulation processes memory-map the matrix, look rows up by text hash and score
+all candidate links of a screen against an intent with one matrix-vector
+product, instead of embedding the same strings again in every subprocess.
+Rebuilding over an existing store only embeds texts it does not have yet.
+
+Usage:
+  python scripts/embedding_store.py --links runs/<id>/preprocess/prototype_links_enriched.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+
+import llm_client
+
+
+STORE_FILE = 'embeddings.npy'
+INDEX_FILE = 'embeddings.json'
+STORE_VERSION = 1
+# Same truncation as single-text embedding in describe_screen_first_person.py
+MAX_TEXT_CHARS = 3000
+
+
+def embed_model_name() -> str:
+    return os.getenv('EMBED_MODEL', 'text-embedding-004')
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1((text or '').strip().encode('utf-8')).hexdigest()
+
+
+def link_texts(row: Dict[str, Any]) -> List[str]:
+    """Candidate strings the journey matcher builds for a link (with and without product meta)."""
+    meta = row.get('meta') if isinstance(row.get('meta'), dict) else {}
+    base = [str(row.get('user_intent') or ''), str(row.get('click_target') or ''), str(row.get('source_element_name') or '')]
+    full = base + [str(meta.get('product_name') or ''), str(meta.get('product_id') or '')]
+    out: List[str] = []
+    for parts in (full, base):
+        text = ' '.join([p for p in parts if p]).strip()
+        if text and text not in out:
+            out.append(text)
+    for field in ('user_intent', 'click_target'):
+        text = str(row.get(field) or '').strip()
+        if text and text not in out:
+            out.append(text)
+    return out
+
+
+def normalize_rows(m: np.ndarray) -> np.ndarray:
+    m = np.asarray(m, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def embed_texts(texts: Sequence[str], model_name: Optional[str] = None, batch_size: Optional[int] = None) -> List[Optional[np.ndarray]]:
+    """Normalized vectors for texts in batched embed requests; None for texts that failed."""
+    model_name = model_name or embed_model_name()
+    if batch_size is None:
+        batch_size = int(os.getenv('EMBED_BATCH', '100'))
+    out: List[Optional[np.ndarray]] = [None] * len(texts)
+    for i in range(0, len(texts), max(1, batch_size)):
+        chunk = [t[:MAX_TEXT_CHARS] for t in texts[i:i + batch_size]]
+        try:
+            resp = llm_client.embed(chunk, model_name=model_name)
+            vecs = (resp.get('embedding') if isinstance(resp, dict) else getattr(resp, 'embedding', None)) or []
+        except Exception as e:
+            print(f'[embedding_store] batch {i // batch_size} failed: {e}', file=sys.stderr)
+            continue
+        if len(vecs) != len(chunk):
+            continue
+        for j, vec in enumerate(vecs):
+            if vec:
+                out[i + j] = normalize_rows(np.asarray(vec, dtype=np.float32))
+    return out
+
+
+class EmbeddingStore:
+    def __init__(self, model: str, keys: List[str], vectors: np.ndarray):
+        self.model = model
+        self.keys = list(keys)
+        self.vectors = vectors
+        self._row: Dict[str, int] = {k: i for i, k in enumerate(self.keys)}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def rows(self, texts: Iterable[str]) -> List[Optional[int]]:
+        return [self._row.get(text_key(t)) if t and t.strip() else None for t in texts]
+
+    def vector(self, text: str) -> Optional[np.ndarray]:
+        row = self.rows([text])[0]
+        return None if row is None else np.asarray(self.vectors[row])
+
+    def save(self, path: pathlib.Path) -> None:
+        """Write embeddings.npy + embeddings.json (matrix first, so a reader never sees an index without rows)."""
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.vectors, dtype=np.float32))
+        os.replace(tmp, path)
+        index_path = path.with_name(INDEX_FILE)
+        tmp = index_path.with_name(index_path.name + '.tmp')
+        dim = int(self.vectors.shape[1]) if self.vectors.ndim == 2 else 0
+        tmp.write_text(json.dumps({'version': STORE_VERSION, 'model': self.model, 'dim': dim, 'keys': self.keys}), encoding='utf-8')
+        os.replace(tmp, index_path)
+
+
+def load_embedding_store(path: pathlib.Path) -> Optional[EmbeddingStore]:
+    """Memory-map a saved store; None when it is missing, stale or inconsistent."""
+    path = pathlib.Path(path)
+    index_path = path.with_name(INDEX_FILE)
+    try:
+        index = json.loads(index_path.read_text(encoding='utf-8'))
+        if int(index.get('version') or 0) != STORE_VERSION:
+            return None
+        vectors = np.load(path, mmap_mode='r')
+        keys = list(index.get('keys') or [])
+        if vectors.ndim != 2 or vectors.shape[0] != len(keys):
+            return None
+        return EmbeddingStore(str(index.get('model') or ''), keys, vectors)
+    except Exception:
+        return None
+
+
+def build_embedding_store(texts: Iterable[str], path: pathlib.Path, model_name: Optional[str] = None) -> EmbeddingStore:
+    """Embed the unique texts not already in the store at path and save the merged store."""
+    model_name = model_name or embed_model_name()
+    existing = load_embedding_store(path)
+    if existing is not None and existing.model != model_name:
+        existing = None
+    keys: List[str] = list(existing.keys) if existing is not None else []
+    known = set(keys)
+    missing: List[str] = []
+    for t in texts:
+        t = (t or '').strip()
+        k = text_key(t)
+        if t and k not in known:
+            known.add(k)
+            missing.append(t)
+    added: List[np.ndarray] = []
+    for t, vec in zip(missing, embed_texts(missing, model_name)):
+        if vec is not None:
+            keys.append(text_key(t))
+            added.append(vec)
+    parts = [np.asarray(existing.vectors, dtype=np.float32)] if existing is not None and len(existing) else []
+    if added:
+        parts.append(np.stack(added))
+    vectors = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+    store = EmbeddingStore(model_name, keys, vectors)
+    store.save(path)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Embed link texts of a run into embeddings.npy (+ embeddings.json index)')
+    parser.add_argument('--links', required=True, help='prototype_links_enriched.json')
+    parser.add_argument('--out', default=None, help=f'Output matrix (default: {STORE_FILE} next to --links)')
+    parser.add_argument('--model', default=None, help='Embedding model (default: EMBED_MODEL or text-embedding-004)')
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
+    links_path = pathlib.Path(args.links)
+    out = pathlib.Path(args.out) if args.out else links_path.parent / STORE_FILE
+    if not api_key:
+        # Matching falls back to lexical similarity; nothing to precompute
+        print('[embedding_store] No GEMINI_API_KEY; skipping embeddings')
+        return
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+
+    rows = json.loads(links_path.read_text(encoding='utf-8')) or []
+    texts: List[str] = []
+    for row in rows:
+        texts.extend(link_texts(row))
+    store = build_embedding_store(texts, out, args.model)
+    print(f'[embedding_store] {len(store)} vectors ({len(set(texts))} link texts) -> {out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,10 @@ It uses the exported screen images in figma_screens/ to help the model infer
 the click target and intent. Requires GEMINI_API_KEY in .env; if missing, a
 deterministic fallback description will be generated.
 
+Each unique screen is summarized at most once, and action descriptions run
+concurrently (ENRICH_CONCURRENCY, default 4) under the shared LLM rate limit;
+the output keeps the input link order.
+
 Usage:
   python scripts/enrich_prototype_links.py \
     --input logs/prototype_links.json \
@@ -21,11 +25,16 @@ import sys
 import json
 import pathlib
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional, Tuple
 
 from dotenv import load_dotenv
 import requests
 
+import llm_client
+from image_variants import encode_image, image_part
+
 ROOT = pathlib.Path(__file__).resolve().parent.parent
 SCREENS_DIR_DEFAULT = ROOT / 'figma_screens'
 LOGS_DIR = ROOT / 'logs'
@@ -173,6 +182,25 @@ def llm_timeout_seconds() -> int:
         return 20
 
 
+_MODELS: Dict[str, Any] = {}
+_MODELS_LOCK = threading.Lock()
+
+
+def get_model():
+    """Configure the SDK once and share one GenerativeModel per model name across calls/threads."""
+    import google.generativeai as genai
+    api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
+    if not api_key:
+        raise RuntimeError('Missing GEMINI_API_KEY/GOOGLE_API_KEY')
+    model_name = os.getenv('MODEL_NAME', 'gemini-2.5-pro')
+    with _MODELS_LOCK:
+        if not _MODELS:
+            genai.configure(api_key=api_key)
+        if model_name not in _MODELS:
+            _MODELS[model_name] = genai.GenerativeModel(model_name)
+        return _MODELS[model_name]
+
+
 
 def find_screen_image(screen_name: str, screens_dir: pathlib.Path) -> Optional[pathlib.Path]:
     if not screens_dir.exists():
@@ -224,9 +252,6 @@ def llm_screen_summary(image_path: Optional[pathlib.Path], desc_hint: Optional[s
             return f"{base} Context: {desc_hint.strip()}"
         return base
     try:
-        import base64
-        import google.generativeai as genai
-
         prompt = (
             "You are a UX assistant. Describe THIS VIEW (not using internal names) from a user's perspective in 3-5 sentences. "
             "Explain the primary goal of the view, key UI elements and where they appear (e.g., top navigation, list, primary button at the bottom), "
@@ -235,14 +260,10 @@ def llm_screen_summary(image_path: Optional[pathlib.Path], desc_hint: Optional[s
         )
         parts: list[dict] = [{"text": prompt}]
         if image_path and image_path.exists():
-            b64 = base64.b64encode(image_path.read_bytes()).decode('utf-8')
-            parts.append({"inline_data": {"mime_type": "image/png", "data": b64}})
+            parts.append(image_part(image_path))
         if desc_hint:
             parts.append({"text": f"Context hint: {desc_hint}"})
-        api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(os.getenv('MODEL_NAME', 'gemini-2.5-pro'))
-        resp = model.generate_content(parts, request_options={"timeout": llm_timeout_seconds()})
+        resp = llm_client.generate(get_model(), parts, timeout_sec=llm_timeout_seconds())
         text = (resp.text or '').strip()
         if text.startswith('```'):
             text = text.strip('`')
@@ -272,22 +293,16 @@ def llm_describe_action(image_path: pathlib.Path, dest_image_path: Optional[path
             "user_intent": compose_user_intent(dest_desc, element_name, label_hint),
         }
     try:
-        import base64
-        import google.generativeai as genai
-
-        with open(image_path, 'rb') as f:
-            src_b64 = base64.b64encode(f.read()).decode('utf-8')
+        src_part = image_part(image_path)
         dst_part = None
         if dest_image_path and dest_image_path.exists():
-            with open(dest_image_path, 'rb') as f:
-                dst_b64 = base64.b64encode(f.read()).decode('utf-8')
-            dst_part = {"inline_data": {"mime_type": "image/png", "data": dst_b64}}
+            dst_part = image_part(dest_image_path)
 
         crop_part = None
         if bbox_hint is not None:
             try:
                 from PIL import Image
-                from io import BytesIO
+                # Crop from the full-resolution original, then encode compactly
                 img = Image.open(image_path).convert('RGBA')
                 W, H = img.size
                 nx = float(bbox_hint.get('x') or 0.0)
@@ -300,26 +315,20 @@ def llm_describe_action(image_path: pathlib.Path, dest_image_path: Optional[path
                 mh = int(nh * H) + 16
                 box = (mx, my, min(W, mx + mw), min(H, my + mh))
                 crop = img.crop(box)
-                buf = BytesIO()
-                crop.save(buf, format='PNG')
-                crop_b64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-                crop_part = {"inline_data": {"mime_type": "image/png", "data": crop_b64}}
+                crop_mime, crop_b64 = encode_image(crop)
+                crop_part = {"inline_data": {"mime_type": crop_mime, "data": crop_b64}}
             except Exception:
                 crop_part = None
 
         prompt = build_prompt(source_screen, element_name, dest_screen, source_desc, dest_desc,
                               elem_type, region_hint, label_hint, bbox_hint)
-        api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
-        if not api_key:
-            raise RuntimeError('Missing GEMINI_API_KEY/GOOGLE_API_KEY')
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(os.getenv('MODEL_NAME', 'gemini-2.5-pro'))
-        parts = [{"text": prompt}, {"inline_data": {"mime_type": "image/png", "data": src_b64}}]
+        model = get_model()
+        parts = [{"text": prompt}, src_part]
         if crop_part is not None:
             parts.append(crop_part)
         if dst_part is not None:
             parts.append(dst_part)
-        resp = model.generate_content(parts, request_options={"timeout": llm_timeout_seconds()})
+        resp = llm_client.generate(model, parts, timeout_sec=llm_timeout_seconds())
         text = (resp.text or '').strip()
         if text.startswith('```'):
             text = text.strip('`')
@@ -398,14 +407,24 @@ def enrich_links(links: List[Dict[str, Any]], screens_dir: pathlib.Path) -> List
             all_ids.append(did)
     geo_map = figma_fetch_nodes_geometry(figma_token, file_key, list(dict.fromkeys(all_ids)))
 
-    enriched: List[Dict[str, Any]] = []
+    # Screen lookups (directory scan + node description) are done once per screen name
+    contexts: Dict[str, Tuple[Optional[pathlib.Path], Optional[str]]] = {}
+
+    def context_of(name: str) -> Tuple[Optional[pathlib.Path], Optional[str]]:
+        if name not in contexts:
+            contexts[name] = get_screen_context(name, nodes_by_name, screens_dir)
+        return contexts[name]
+
+    # Plan every link first, then run the LLM work concurrently and assemble in input order
+    plans: List[Dict[str, Any]] = []
+    summary_keys: List[Tuple[Optional[pathlib.Path], Optional[str]]] = []
     for link in links:
         src_name = link.get('source_screen_name') or 'Screen'
         elem_name = link.get('source_element_name') or 'element'
         dst_name = link.get('destination_screen_name') or 'Next Screen'
 
-        img, src_desc = get_screen_context(src_name, nodes_by_name, screens_dir)
-        dst_img, dst_desc = get_screen_context(dst_name, nodes_by_name, screens_dir)
+        img, src_desc = context_of(src_name)
+        dst_img, dst_desc = context_of(dst_name)
 
         # region/label/bbox lookup using Figma geometry where possible
         source_frame_bb = (geo_map.get(str(link.get('source_screen_id')) or '') or {}).get('absoluteBoundingBox') or {}
@@ -421,15 +440,50 @@ def enrich_links(links: List[Dict[str, Any]], screens_dir: pathlib.Path) -> List
             is_top_left = (nb.get('x', 1) <= 0.15 and nb.get('y', 1) <= 0.18 and nb.get('w', 0) <= 0.15)
         is_back_button = is_backish_name or is_top_left
 
+        plans.append({
+            'link': link, 'src_name': src_name, 'elem_name': elem_name, 'dst_name': dst_name,
+            'img': img, 'src_desc': src_desc, 'dst_img': dst_img, 'dst_desc': dst_desc,
+            'nb': nb, 'region_hint': region_hint, 'is_back_button': is_back_button,
+        })
+        for key in ((img, src_desc), (dst_img, dst_desc)):
+            if not key[1] and key not in summary_keys:
+                summary_keys.append(key)
+
+    def describe(plan: Dict[str, Any]) -> Dict[str, str]:
+        return llm_describe_action(plan['img'], plan['dst_img'], plan['src_name'], plan['elem_name'], plan['dst_name'],
+                                   plan['src_desc'], plan['dst_desc'], None, plan['region_hint'], None, plan['nb'])
+
+    try:
+        workers = max(1, int(os.getenv('ENRICH_CONCURRENCY', '4')))
+    except Exception:
+        workers = 4
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        summary_futs = {key: ex.submit(llm_screen_summary, key[0], key[1]) for key in summary_keys}
+        # Back-button and auto-advance links get fixed wording below, so their action is not described
+        action_futs = [
+            ex.submit(describe, plan)
+            if plan['img'] is not None and not plan['is_back_button'] and not bool(plan['link'].get('is_auto_delay'))
+            else None
+            for plan in plans
+        ]
+        summaries = {key: fut.result() for key, fut in summary_futs.items()}
+        actions = [fut.result() if fut is not None else None for fut in action_futs]
+
+    enriched: List[Dict[str, Any]] = []
+    for plan, llm in zip(plans, actions):
+        link = plan['link']
+        elem_name = plan['elem_name']
+        img, src_desc = plan['img'], plan['src_desc']
+        dst_img, dst_desc = plan['dst_img'], plan['dst_desc']
+        nb, region_hint, is_back_button = plan['nb'], plan['region_hint'], plan['is_back_button']
+
         elem_type = None
-        if img is None:
+        if llm is None:
             details = {
                 'click_target': craft_click_target(elem_name, None, region_hint or "top-left" if is_back_button else (region_hint or "prominent area"), nb, elem_type, src_desc),
                 'user_intent': compose_user_intent(dst_desc, elem_name, None),
             }
         else:
-            llm = llm_describe_action(img, dst_img, src_name, elem_name, dst_name,
-                                      src_desc, dst_desc, elem_type, region_hint, None, nb)
             details = {
                 # ✅ use LLM’s click_target if available
                 'click_target': llm.get('click_target') or craft_click_target(elem_name, None, region_hint, nb, elem_type, src_desc),
@@ -468,8 +522,8 @@ def enrich_links(links: List[Dict[str, Any]], screens_dir: pathlib.Path) -> List
                     new_link['user_intent'] = "I’m progressing to the next step by tapping anywhere."
         except Exception:
             pass
-        new_link['source_screen_description'] = src_desc or llm_screen_summary(img, src_desc)
-        new_link['destination_screen_description'] = dst_desc or llm_screen_summary(dst_img, dst_desc)
+        new_link['source_screen_description'] = src_desc or summaries[(img, src_desc)]
+        new_link['destination_screen_description'] = dst_desc or summaries[(dst_img, dst_desc)]
         enriched.append(new_link)
     return enriched
 
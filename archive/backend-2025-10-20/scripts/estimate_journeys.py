@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo journey estimator for large synthetic populations.
+
+Treats the prototype graph as a persona-parameterized Markov chain and advances
+thousands of users at once in NumPy arrays, without LLM calls or TEA rendering.
+Each step applies the simulator's own decision policy:
+- edges ranked by score_edge (vectorized through EdgeScorer) with per-user
+  compute_persona_scales and visited-history penalties
+- high-openness exploration (2nd option) and high-extraversion CTA preference
+- auto/wait edges taken first
+- compute_dynamic_wait_seconds dwell, update_emotion state, loop guard,
+  max-steps and max-minutes budgets (virtual clock semantics)
+
+So a population of one persona without trait jitter reproduces run_traversal's
+outcome, steps, path and time_sec (exploration is drawn from a seeded RNG instead
+of `random`). Outputs completion probability, path distribution, expected dwell
+per screen and drop-off screens in the same shape as persona_summary.json.
+
+Usage:
+  python scripts/estimate_journeys.py --run-dir runs/<id> --goal "checkout" \
+      --source-id 1 --target-id 5 --users 10000 --persona-json users.json \
+      --trait N=0.85 --trait-jitter 0.05
+"""
+
+import argparse
+import copy
+import json
+import math
+import pathlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import simulate_user_traversal as sut
+
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+_OCEAN_KEYS = ('O', 'C', 'E', 'A', 'N')
+_CTA_WORDS = ['continue', 'start', 'confirm', 'next', 'go', 'proceed', 'submit', 'finish', 'done', 'open']
+_BACK_WORDS = ['back', 'return', 'close', 'cancel']
+_GOALISH = {'continue', 'next', 'submit', 'confirm', 'proceed', 'start', 'finish', 'done', 'go', 'open'}
+_PROMPT_WORDS = ['allow', 'confirm', 'agree', 'permissions', 'accept']
+_LOADING_WORDS = ['loading', 'skeleton', 'processing', 'fetching']
+
+
+# ------------------------
+# Population synthesis
+# ------------------------
+def parse_traits(items: Optional[Sequence[str]]) -> Dict[str, float]:
+    """Parse --trait K=V pairs (K in OCEAN) into a dict."""
+    out: Dict[str, float] = {}
+    for item in items or []:
+        for part in str(item).split(','):
+            if '=' not in part:
+                continue
+            k, v = part.split('=', 1)
+            k = k.strip().upper()
+            if k in _OCEAN_KEYS:
+                out[k] = float(v)
+    return out
+
+
+def synthesize_population(personas: List[Dict[str, Any]], users: int, *, traits: Optional[Dict[str, float]] = None,
+                          jitter: float = 0.0, seed: int = 0) -> List[Dict[str, Any]]:
+    """Draw `users` persona dicts round-robin from `personas`.
+
+    Trait overrides are applied first, then Gaussian jitter on each OCEAN value
+    (clipped to [0, 1]). An empty persona list yields a persona-less population,
+    matching a run without --persona-id.
+    """
+    if not personas:
+        return [None] * int(users)  # type: ignore[list-item]
+    rng = np.random.default_rng(seed)
+    base = []
+    for p in personas:
+        q = copy.deepcopy(p)
+        ocean = q.setdefault('ocean', {})
+        for k, v in (traits or {}).items():
+            ocean.setdefault(k, {})['value'] = float(v)
+        base.append(q)
+    out: List[Dict[str, Any]] = []
+    for i in range(int(users)):
+        p = base[i % len(base)]
+        if jitter > 0:
+            p = copy.deepcopy(p)
+            for k in _OCEAN_KEYS:
+                ent = p['ocean'].setdefault(k, {})
+                try:
+                    v = float(ent.get('value') or 0.0)
+                except Exception:
+                    v = 0.0
+                ent['value'] = float(np.clip(v + rng.normal(0.0, jitter), 0.0, 1.0))
+        out.append(p)
+    return out
+
+
+# ------------------------
+# Vectorized simulator formulas (same operations as the scalar originals)
+# ------------------------
+def init_emotion_batch(ocean: np.ndarray, has_persona: np.ndarray) -> Dict[str, np.ndarray]:
+    """Vectorized init_emotion_state; ocean is (users x 5) in OCEAN order."""
+    u = ocean.shape[0]
+    O, C, E, A, N = (ocean[:, i] for i in range(5))
+    state = {
+        'valence': np.full(u, 0.2),
+        'arousal': np.full(u, 0.5),
+        'stress': np.full(u, 0.2),
+        'frustration': np.full(u, 0.1),
+        'confidence': np.full(u, 0.5),
+    }
+    state['stress'] = np.where(has_persona, np.clip(0.15 + 0.6 * N, 0.0, 1.0), state['stress'])
+    state['confidence'] = np.where(has_persona, np.clip(0.45 + 0.3 * C - 0.2 * N, 0.0, 1.0), state['confidence'])
+    state['valence'] = np.where(has_persona, np.clip(0.25 + 0.2 * (E - N), -1.0, 1.0), state['valence'])
+    return state
+
+
+def update_emotion_batch(state: Dict[str, np.ndarray], *, wait_s: np.ndarray, options_count: np.ndarray, clarity_gap: np.ndarray,
+                         reduces_distance: np.ndarray, auto_wait: np.ndarray, ocean: np.ndarray, has_persona: np.ndarray) -> Dict[str, np.ndarray]:
+    """Vectorized update_emotion."""
+    new = {
+        'valence': state['valence'] * 0.88,
+        'arousal': state['arousal'] * 0.88,
+        'stress': state['stress'] * 0.88,
+        'frustration': state['frustration'] * 0.88,
+        'confidence': state['confidence'] * 0.90,
+    }
+    n_eff = np.where(has_persona, ocean[:, 4], 0.5)
+    o_eff = np.where(has_persona, ocean[:, 0], 0.5)
+    long_wait = wait_s >= 3.0
+    w = np.minimum(1.0, (wait_s - 2.0) / 4.0)
+    new['arousal'] = np.where(long_wait, new['arousal'] + 0.25 * w, new['arousal'])
+    new['stress'] = np.where(long_wait, new['stress'] + (0.15 + 0.35 * n_eff) * w, new['stress'])
+    new['frustration'] = np.where(options_count >= 6, new['frustration'] + (0.15 + 0.15 * o_eff), new['frustration'])
+    new['frustration'] = np.where(clarity_gap < 0.5, new['frustration'] + 0.12, new['frustration'])
+    new['stress'] = np.where(auto_wait, new['stress'] + 0.12, new['stress'])
+    new['frustration'] = np.where(auto_wait, new['frustration'] + 0.08, new['frustration'])
+    new['confidence'] = np.where(reduces_distance, new['confidence'] + 0.18, new['confidence'])
+    new['valence'] = np.where(reduces_distance, new['valence'] + 0.12, new['valence'])
+    new['stress'] = np.where(reduces_distance, new['stress'] - 0.10, new['stress'])
+    new['frustration'] = np.where(reduces_distance, new['frustration'] - 0.06, new['frustration'])
+    new['valence'] = np.clip(new['valence'], -1.0, 1.0)
+    for k in ('arousal', 'stress', 'frustration', 'confidence'):
+        new[k] = np.clip(new[k], 0.0, 1.0)
+    return new
+
+
+def dynamic_wait_batch(*, base: np.ndarray, loading: bool, options_count: int, clarity_gap: np.ndarray, emotion: Dict[str, np.ndarray],
+                       ocean: np.ndarray, has_persona: np.ndarray, auto_wait: np.ndarray) -> np.ndarray:
+    """Vectorized compute_dynamic_wait_seconds for users on one screen."""
+    O = np.where(has_persona, ocean[:, 0], 0.0)
+    C = np.where(has_persona, ocean[:, 1], 0.0)
+    N = np.where(has_persona, ocean[:, 4], 0.0)
+    wait = np.array(base, dtype=np.float64)
+    if loading:
+        wait = wait + 0.6
+    if options_count >= 6:
+        wait = wait + 0.8
+    elif options_count >= 3:
+        wait = wait + 0.3
+    wait = np.where(clarity_gap >= 2.0, wait - 0.4, np.where(clarity_gap <= 0.3, wait + 0.5, wait))
+    wait = wait + 0.4 * np.maximum(0.0, emotion['frustration'] - 0.3)
+    wait = wait + 0.3 * np.maximum(0.0, emotion['stress'] - 0.3)
+    wait = wait - 0.3 * np.maximum(0.0, emotion['valence'] - 0.4)
+    wait = wait - 0.3 * np.maximum(0.0, C - 0.6)
+    wait = wait + 0.3 * np.maximum(0.0, O - 0.6)
+    wait = wait + 0.4 * np.maximum(0.0, N - 0.6)
+    wait = np.where(auto_wait, np.maximum(np.minimum(wait, 2.0), 0.6), wait)
+    # Python round() to stay bit-identical with the scalar version
+    rounded = np.asarray([round(x, 2) for x in wait.tolist()], dtype=np.float64)
+    return np.maximum(0.4, np.minimum(6.0, rounded))
+
+
+# ------------------------
+# Estimator
+# ------------------------
+class _ScreenInfo:
+    """Per-screen constants the population loop needs (computed once)."""
+
+    def __init__(self, ctx: 'sut.TraversalContext', scorer: Any, sid: int, col_of: Dict[int, int]) -> None:
+        self.sid = sid
+        self.a, self.b = scorer.edge_span(sid)
+        self.k = self.b - self.a
+        self.edges = scorer.edges[self.a:self.b]
+        self.dest = scorer.dest_ids[self.a:self.b]
+        self.dest_col = np.asarray([col_of.get(int(d), -1) for d in self.dest.tolist()], dtype=np.int64)
+        self.cta_bonus = np.asarray([sum(1 for t in _CTA_WORDS if t in (e.get('click_target') or '').lower()) for e in self.edges], dtype=np.int64)
+        self.back_or_close = np.asarray([
+            any(tok in f"{e.get('click_target') or ''} {e.get('chosen_user_intent') or e.get('user_intent') or ''}".lower() for tok in _BACK_WORDS)
+            for e in self.edges
+        ], dtype=bool)
+        wait_idx = np.flatnonzero(scorer.wait[self.a:self.b])
+        self.first_wait = int(wait_idx[0]) if len(wait_idx) else -1
+        labels = ' '.join((e.get('click_target') or e.get('user_intent') or e.get('destination_screen_name') or '').strip() for e in self.edges).lower()
+        self.goalish = any(tok in labels for tok in _GOALISH)
+        self.prompts = any(w in labels for w in _PROMPT_WORDS)
+        desc = (ctx.id_to_desc.get(sid, '') or '').lower()
+        self.loading = any(w in desc for w in _LOADING_WORDS)
+
+
+def estimate_population(
+    ctx: 'sut.TraversalContext',
+    *,
+    goal: str,
+    source_id: int,
+    target_id: int,
+    population: List[Optional[Dict[str, Any]]],
+    max_steps: int = 50,
+    max_minutes: float = 15.0,
+    seed: int = 0,
+    top_paths: int = 10,
+) -> Dict[str, Any]:
+    """Simulate every user in `population` in lockstep; returns a persona_summary-shaped dict."""
+    scorer = ctx.scorer
+    if scorer is None:
+        raise RuntimeError('vectorized scoring unavailable (numpy/edge_scoring import failed)')
+    rng = np.random.default_rng(seed)
+    u = len(population)
+    distances = ctx.distances_to(target_id)
+    budget = float(max_minutes) * 60.0
+    short_run = bool(max_minutes and float(max_minutes) <= 2.0)
+
+    # Persona arrays
+    has_persona = np.asarray([bool(p) for p in population], dtype=bool)
+    ocean = np.zeros((u, 5), dtype=np.float64)
+    scales = np.ones((u, 3), dtype=np.float64)
+    for i, p in enumerate(population):
+        if not p:
+            continue
+        po = sut.extract_ocean(p)
+        ocean[i] = [po[k] for k in _OCEAN_KEYS]
+        ps = sut.compute_persona_scales(p)
+        scales[i] = [ps['direct_scale'], ps['back_scale'], ps['distance_scale']]
+    O, C, E, A, N = (ocean[:, j] for j in range(5))
+
+    # Screen columns (for visited masks and dwell tables)
+    node_ids = sorted(set(ctx.id_to_name) | set(ctx.edges_by_source_id) | {int(source_id), int(target_id)}
+                      | {int(d) for d in scorer.dest_ids.tolist() if d >= 0})
+    col_of = {sid: j for j, sid in enumerate(node_ids)}
+    n_cols = len(node_ids)
+    dist_col = np.asarray([float(distances.get(sid, 1e9)) if distances else 1e9 for sid in node_ids], dtype=np.float64)
+    screens: Dict[int, _ScreenInfo] = {}
+
+    cur = np.full(u, int(source_id), dtype=np.int64)
+    steps = np.zeros(u, dtype=np.int64)
+    elapsed = np.zeros(u, dtype=np.float64)
+    done = np.zeros(u, dtype=bool)
+    outcome = np.full(u, 'timeout', dtype=object)
+    visited_mask = np.zeros((u, n_cols), dtype=bool)
+    n_visited = np.zeros(u, dtype=np.int64)
+    last6 = np.full((u, 6), -1, dtype=np.int64)  # ring of the last six visited ids (oldest first)
+    path = np.full((u, max_steps + 1), -1, dtype=np.int64)
+    path[:, 0] = cur
+    dwell = np.zeros((u, n_cols), dtype=np.float64)
+    visits = np.zeros((u, n_cols), dtype=np.int64)
+    back_count = np.zeros(u, dtype=np.int64)
+    auto_any = np.zeros(u, dtype=bool)
+    loop_any = np.zeros(u, dtype=bool)
+    friction_types: Counter = Counter()
+    friction_screens: Counter = Counter()
+    emotion = init_emotion_batch(ocean, has_persona)
+
+    for _ in range(int(max_steps)):
+        # while steps < max_steps and clock < max_end
+        over = ~done & (elapsed >= budget)
+        done |= over
+        active = np.flatnonzero(~done)
+        if len(active) == 0:
+            break
+        steps[active] += 1
+        reached = active[cur[active] == int(target_id)]
+        outcome[reached] = 'reached-target'
+        done[reached] = True
+        active = active[cur[active] != int(target_id)]
+        if len(active) == 0:
+            break
+
+        wait_s = np.zeros(u, dtype=np.float64)
+        auto = np.zeros(u, dtype=bool)
+        gap_emotion = np.ones(u, dtype=np.float64)
+        reduces = np.zeros(u, dtype=bool)
+        options = np.zeros(u, dtype=np.int64)
+        chosen_idx = np.full(u, -1, dtype=np.int64)
+
+        for sid in np.unique(cur[active]).tolist():
+            g = active[cur[active] == sid]
+            info = screens.get(sid)
+            if info is None:
+                info = screens[sid] = _ScreenInfo(ctx, scorer, sid, col_of)
+            k = info.k
+            options[g] = k
+            gp = has_persona[g]
+            # Persona-driven pre-action friction heuristics
+            if k >= 5:
+                _count(friction_types, friction_screens, 'choice_overload_persona', sid, int(np.sum(gp & (O[g] >= 0.7))))
+            if not info.goalish:
+                _count(friction_types, friction_screens, 'unclear_primary_cta_persona', sid, int(np.sum(gp & (C[g] >= 0.7))))
+            _count(friction_types, friction_screens, 'too_many_steps_persona', sid, int(np.sum(gp & (N[g] >= 0.7) & (steps[g] > 6))))
+            if info.prompts:
+                _count(friction_types, friction_screens, 'resistance_to_prompts_persona', sid, int(np.sum(gp & (A[g] <= 0.3))))
+
+            if k:
+                scores = scorer.score_batch(goal, sid, target_id, distances, (), scales[g])
+                # Visited penalties (score_edge): last two visits -8, earlier visits -4
+                valid = info.dest >= 0
+                rec1 = _last_visited(last6[g], n_visited[g], 1)
+                rec2 = _last_visited(last6[g], n_visited[g], 2)
+                recent = valid[None, :] & ((info.dest[None, :] == rec1[:, None]) | (info.dest[None, :] == rec2[:, None]))
+                seen = np.where(info.dest_col[None, :] >= 0, visited_mask[g][:, np.maximum(info.dest_col, 0)], False)
+                earlier = valid[None, :] & seen & ~recent
+                scores = np.where(recent, scores - 8.0, np.where(earlier, scores - 4.0, scores))
+                order = np.argsort(-scores, axis=1, kind='stable')
+                # High openness: 28% pick the 2nd option; otherwise high extraversion prefers CTA wording
+                explore = gp & (O[g] >= 0.7) & (k > 1) & (rng.random(len(g)) < 0.28)
+                cta_pref = gp & ~explore & (E[g] >= 0.7)
+                if np.any(cta_pref):
+                    # sorted(ranked, key=(cta bonus, score), reverse=True) keeps ranked order on ties
+                    rank_pos = np.argsort(order, axis=1)
+                    bonus = np.broadcast_to(info.cta_bonus, scores.shape)
+                    cta_order = np.lexsort((rank_pos, -scores, -bonus), axis=-1)
+                    order = np.where(cta_pref[:, None], cta_order, order)
+                ranked_scores = np.take_along_axis(scores, order, axis=1)
+                top = ranked_scores[:, 0]
+                second = ranked_scores[:, 1] if k > 1 else np.zeros(len(g))
+                predicted = np.where(explore, order[:, 1] if k > 1 else order[:, 0], order[:, 0])
+                gap = top - second
+                gap_emotion[g] = gap
+                pdest = info.dest_col[predicted]
+                if distances:
+                    here = dist_col[col_of[sid]] if sid in col_of else 1e9
+                    reduces[g] = (pdest >= 0) & (np.where(pdest >= 0, dist_col[np.maximum(pdest, 0)], 1e9) < here)
+            else:
+                gap = np.zeros(len(g))
+                gap_emotion[g] = 1.0
+                predicted = np.full(len(g), -1, dtype=np.int64)
+
+            if info.first_wait >= 0:
+                auto[g] = True
+                auto_any[g] = True
+                _count(friction_types, friction_screens, 'auto_wait', sid, len(g))
+                base = np.full(len(g), 0.8 if short_run else 1.2)
+                w = dynamic_wait_batch(base=base, loading=info.loading, options_count=k, clarity_gap=np.ones(len(g)),
+                                       emotion={kk: vv[g] for kk, vv in emotion.items()}, ocean=ocean[g], has_persona=gp, auto_wait=np.ones(len(g), dtype=bool))
+                chosen_idx[g] = info.first_wait
+            else:
+                base = np.full(len(g), 1.2 if short_run else 2.6)
+                w = dynamic_wait_batch(base=base, loading=info.loading, options_count=k, clarity_gap=gap,
+                                       emotion={kk: vv[g] for kk, vv in emotion.items()}, ocean=ocean[g], has_persona=gp, auto_wait=np.zeros(len(g), dtype=bool))
+                _count(friction_types, friction_screens, 'anxiety_wait_persona', sid, int(np.sum(gp & (N[g] >= 0.7) & (w >= 3.5))))
+                chosen_idx[g] = predicted
+            wait_s[g] = w
+            dwell[g, col_of[sid]] += w
+            visits[g, col_of[sid]] += 1
+
+        elapsed[active] += wait_s[active]
+        updated = update_emotion_batch({kk: vv[active] for kk, vv in emotion.items()}, wait_s=wait_s[active], options_count=options[active],
+                                       clarity_gap=gap_emotion[active], reduces_distance=reduces[active], auto_wait=auto[active],
+                                       ocean=ocean[active], has_persona=has_persona[active])
+        for kk in emotion:
+            emotion[kk][active] = updated[kk]
+
+        stuck = active[options[active] == 0]
+        outcome[stuck] = 'no-outgoing'
+        done[stuck] = True
+        movers = active[options[active] > 0]
+        if len(movers) == 0:
+            continue
+
+        # Execute action: record the visit, move along the chosen edge
+        prev = cur[movers].copy()
+        for sid in np.unique(prev).tolist():
+            g = movers[prev == sid]
+            info = screens[sid]
+            ci = chosen_idx[g]
+            dest = info.dest[ci]
+            cur[g] = np.where(dest >= 0, dest, sid)
+            bc = info.back_or_close[ci]
+            back_count[g] += bc
+            _count(friction_types, friction_screens, 'back_or_close', sid, int(np.sum(bc)))
+        visited_mask[movers, np.asarray([col_of[s] for s in prev.tolist()], dtype=np.int64)] = True
+        last6[movers] = np.concatenate([last6[movers][:, 1:], prev[:, None]], axis=1)
+        n_visited[movers] += 1
+        path[movers, n_visited[movers]] = cur[movers]
+
+        # Loop guard: same 2-screen oscillation over the last six visits
+        full = movers[n_visited[movers] >= 6]
+        if len(full):
+            srt = np.sort(last6[full], axis=1)
+            distinct = 1 + np.sum(srt[:, 1:] != srt[:, :-1], axis=1)
+            looped = full[distinct <= 2]
+            outcome[looped] = 'loop-detected'
+            done[looped] = True
+            loop_any[looped] = True
+            for sid, c in Counter(cur[looped].tolist()).items():
+                _count(friction_types, friction_screens, 'loop_detected', sid, c)
+
+    return _summarize(
+        ctx, population=population, goal=goal, source_id=source_id, target_id=target_id,
+        outcome=outcome, steps=steps, elapsed=elapsed, path=path, n_visited=n_visited, last6=last6,
+        dwell=dwell, visits=visits, node_ids=node_ids, back_count=back_count, auto_any=auto_any, loop_any=loop_any,
+        ocean=ocean, has_persona=has_persona, friction_types=friction_types, friction_screens=friction_screens,
+        seed=seed, top_paths=top_paths,
+    )
+
+
+def _count(types: Counter, screens: Counter, ftype: str, sid: int, n: int) -> None:
+    if n:
+        types[ftype] += n
+        screens[sid] += n
+
+
+def _last_visited(last6: np.ndarray, n_visited: np.ndarray, back: int) -> np.ndarray:
+    """The visit `back` positions from the end (1 = last), -2 where the history is shorter."""
+    return np.where(n_visited >= back, last6[:, 6 - back], -2)
+
+
+def _wilson(successes: int, n: int, z: float = 1.96) -> List[float]:
+    if n <= 0:
+        return [0.0, 0.0]
+    p = successes / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return [round(max(0.0, centre - half), 4), round(min(1.0, centre + half), 4)]
+
+
+def _summarize(ctx: 'sut.TraversalContext', *, population, goal, source_id, target_id, outcome, steps, elapsed, path, n_visited, last6,
+               dwell, visits, node_ids, back_count, auto_any, loop_any, ocean, has_persona, friction_types, friction_screens,
+               seed, top_paths) -> Dict[str, Any]:
+    u = len(population)
+    names = ctx.id_to_name
+    completed = outcome == 'reached-target'
+    time_sec = np.round(elapsed, 2)
+    # drop-off screen: last visited screen (user_report drop_off_points), None when nothing was visited
+    drop_screen = np.where(n_visited > 0, last6[:, 5], -1)
+
+    # Feedback heuristics (same rules and wording as run_traversal)
+    feedback: Counter = Counter()
+    for i, p in enumerate(population):
+        if loop_any[i]:
+            feedback['User experienced a loop between screens; consider clearer next-step CTAs to avoid oscillation.'] += 1
+        if back_count[i] >= 1:
+            feedback['User frequently considered going back; make primary actions more prominent.'] += 1
+        if auto_any[i]:
+            feedback['Auto-advancing screens may be confusing; add an explicit affordance or progress indicator.'] += 1
+        if completed[i] and steps[i] > 12:
+            feedback['Path to completion is relatively long; consider reducing steps to completion.'] += 1
+        if has_persona[i]:
+            O, C, E, A, N = ocean[i].tolist()
+            pname = p.get('name') or 'User'
+            pjob = p.get('job') or ''
+            if N >= 0.7:
+                feedback[f"{pname} ({pjob}) shows high sensitivity to uncertainty — reduce ambiguity and waiting; provide progress and reassurance copy."] += 1
+            if C >= 0.7:
+                feedback[f"{pname} ({pjob}) prefers structured flows — streamline steps and highlight the primary next action."] += 1
+            if O >= 0.7:
+                feedback[f"{pname} ({pjob}) enjoys exploring — support exploration but keep CTAs visually dominant to avoid wandering."] += 1
+            if E <= 0.3:
+                feedback[f"{pname} ({pjob}) favors clear, self-guided instructions over social cues or prompts."] += 1
+
+    # Per-persona rows (population members grouped by their source persona)
+    groups: Dict[Any, List[int]] = {}
+    for i, p in enumerate(population):
+        key = (p.get('id'), p.get('name')) if p else (None, None)
+        groups.setdefault(key, []).append(i)
+    results: List[Dict[str, Any]] = []
+    not_completed: List[Dict[str, Any]] = []
+    for (pid, pname), idx in groups.items():
+        ix = np.asarray(idx, dtype=np.int64)
+        n = len(ix)
+        c = int(np.sum(completed[ix]))
+        results.append({
+            'persona_id': pid,
+            'persona_name': pname,
+            'users': n,
+            'completed_total': c,
+            'completion_rate_pct': round(c / n * 100.0, 2) if n else 0.0,
+            'completion_ci95': _wilson(c, n),
+            'avg_steps': round(float(np.mean(steps[ix])), 2) if n else 0.0,
+            'avg_time_sec': round(float(np.mean(time_sec[ix])), 2) if n else 0.0,
+            'outcomes': dict(Counter(outcome[ix].tolist())),
+        })
+        for reason, cnt in Counter(outcome[ix][~completed[ix]].tolist()).most_common():
+            not_completed.append({'persona_id': pid, 'persona_name': pname, 'reason': reason, 'count': cnt})
+
+    # Path distribution
+    path_counts: Counter = Counter()
+    for row, n in zip(path.tolist(), n_visited.tolist()):
+        path_counts[tuple(row[: n + 1])] += 1
+    path_distribution = [
+        {
+            'path': list(pth),
+            'path_names': [names.get(s, '') for s in pth],
+            'actions_path': ' -> '.join(str(s) for s in pth),
+            'count': cnt,
+            'share': round(cnt / u, 4) if u else 0.0,
+        }
+        for pth, cnt in path_counts.most_common(int(top_paths))
+    ]
+
+    # Dwell per screen
+    dwell_by_screen: List[Dict[str, Any]] = []
+    total_visits = visits.sum(axis=0)
+    total_dwell = dwell.sum(axis=0)
+    for j, sid in enumerate(node_ids):
+        if total_visits[j] == 0:
+            continue
+        dwell_by_screen.append({
+            'screen_id': sid,
+            'screen_name': names.get(sid, ''),
+            'visits_per_user': round(float(total_visits[j]) / u, 4),
+            'expected_dwell_sec': round(float(total_dwell[j]) / u, 3),
+            'dwell_per_visit_sec': round(float(total_dwell[j]) / float(total_visits[j]), 3),
+        })
+    dwell_by_screen.sort(key=lambda r: r['expected_dwell_sec'], reverse=True)
+
+    drop_counts = Counter(drop_screen[~completed].tolist())
+    drop_off_by_screen = [
+        {'screen_id': (sid if sid >= 0 else None), 'screen_name': names.get(sid, ''), 'count': cnt, 'share': round(cnt / u, 4) if u else 0.0}
+        for sid, cnt in drop_counts.most_common()
+    ]
+
+    total_completed = int(np.sum(completed))
+    aggregate = {
+        'personas_total': u,
+        'completed_total': total_completed,
+        'completion_rate_pct': round(total_completed / u * 100.0, 2) if u else 0.0,
+        'avg_steps': round(float(np.mean(steps)), 2) if u else 0.0,
+        'avg_time_sec': round(float(np.mean(time_sec)), 2) if u else 0.0,
+        'top_friction_types': [{'type': t, 'count': c} for (t, c) in friction_types.most_common(5)],
+        'top_feedback': [{'text': t, 'count': c} for (t, c) in feedback.most_common(5)],
+        'top_friction_screens': [{'screen_id': sid, 'count': c} for (sid, c) in friction_screens.most_common(5)],
+        'not_completed': not_completed,
+        'estimate': {
+            'goal': goal,
+            'source_id': int(source_id),
+            'target_id': int(target_id),
+            'users': u,
+            'seed': seed,
+            'completion_probability': round(total_completed / u, 4) if u else 0.0,
+            'completion_ci95': _wilson(total_completed, u),
+            'outcomes': dict(Counter(outcome.tolist())),
+            'path_distribution': path_distribution,
+            'dwell_by_screen': dwell_by_screen,
+            'drop_off_by_screen': drop_off_by_screen,
+        },
+    }
+    return {'run_dir': str(ctx.run_dir), 'mode': 'estimate', 'results': results, 'aggregate': aggregate}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate journey outcomes for a large synthetic population (no LLM/TEA)')
+    parser.add_argument('--run-dir', required=True, help='Run folder (runs/<id>) or logs/run_* folder')
+    parser.add_argument('--goal', required=True)
+    parser.add_argument('--source-id', type=int, required=True)
+    parser.add_argument('--target-id', type=int, default=None)
+    parser.add_argument('--target-name', default=None, help='Target screen name (resolved to an id)')
+    parser.add_argument('--users', type=int, default=1000, help='Synthetic users to simulate')
+    parser.add_argument('--persona-json', default=None, help='users.json with base personas (default: persona-less users)')
+    parser.add_argument('--persona-id', type=int, action='append', default=None, help='Restrict to these persona ids (repeatable)')
+    parser.add_argument('--trait', action='append', default=None, help='OCEAN override applied to every user, e.g. N=0.85 (repeatable)')
+    parser.add_argument('--trait-jitter', type=float, default=0.0, help='Std-dev of Gaussian noise added to each OCEAN value')
+    parser.add_argument('--max-steps', type=int, default=50)
+    parser.add_argument('--max-minutes', type=float, default=15.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--top-paths', type=int, default=10)
+    parser.add_argument('--out', default=None, help='Output JSON (default: <run-dir>/tests/estimate_summary.json)')
+    args = parser.parse_args()
+
+    run_dir = pathlib.Path(args.run_dir)
+    if not run_dir.is_absolute() and not run_dir.exists():
+        run_dir = ROOT / run_dir
+    ctx = sut.load_traversal_context(run_dir)
+    target_id = args.target_id
+    if target_id is None and args.target_name:
+        # Same resolution as the simulator CLI: best screen-name match, then its id
+        target_name = sut.find_screen_name_match(ctx.screen_names, args.target_name)
+        if target_name:
+            target_id = ctx.name_to_id.get(target_name) or ctx.alias_to_id.get(sut.normalize(target_name))
+    if target_id is None:
+        raise SystemExit('A resolvable --target-id or --target-name is required')
+
+    personas = sut.load_personas(pathlib.Path(args.persona_json)) if args.persona_json else []
+    if args.persona_id:
+        wanted = {int(x) for x in args.persona_id}
+        personas = [p for pid in sorted(wanted) for p in [sut.find_persona(personas, pid)] if p]
+        if not personas:
+            raise SystemExit(f'No personas matched ids {sorted(wanted)}')
+    traits = parse_traits(args.trait)
+    if traits and not personas:
+        personas = [{'id': None, 'name': 'Synthetic', 'ocean': {}}]
+    population = synthesize_population(personas, args.users, traits=traits, jitter=args.trait_jitter, seed=args.seed)
+
+    summary = estimate_population(
+        ctx, goal=args.goal, source_id=args.source_id, target_id=int(target_id), population=population,
+        max_steps=args.max_steps, max_minutes=args.max_minutes, seed=args.seed, top_paths=args.top_paths,
+    )
+    out = pathlib.Path(args.out) if args.out else (run_dir / 'tests' / 'estimate_summary.json')
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding='utf-8')
+    agg = summary['aggregate']
+    print(f"[estimate] users={agg['personas_total']} completion={agg['completion_rate_pct']}% "
+          f"ci95={agg['estimate']['completion_ci95']} avg_steps={agg['avg_steps']} avg_time={agg['avg_time_sec']}s → {out}")
+
+
+if __name__ == '__main__':
+    main()
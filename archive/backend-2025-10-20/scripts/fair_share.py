@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Host-wide fair-share scheduling of persona-user simulations across test runs.
+
+Every run_persona_inplace process registers its run in one SQLite database under
+RUNS (runs/.fair_share.sqlite3) and takes a lease before starting each job. A lease
+is granted only when:
+- the host has a free slot (TESTS_HOST_SLOTS, default 16)
+- the run is under its quota (TESTS_RUN_QUOTA, default 16)
+- the run's owner is under the owner quota (TESTS_OWNER_QUOTA, default 16)
+- the run is the fair pick among runs currently asking for a slot: interactive
+  before bulk, then the owner holding fewest leases, then the run holding fewest,
+  then the oldest registration
+
+Leases of processes that died are reaped by pid. Completed jobs feed a moving
+average of job duration, used by estimate() to give new submissions an
+admission ETA.
+"""
+
+import contextlib
+import os
+import pathlib
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+
+DB_FILE = '.fair_share.sqlite3'
+PRIORITIES = {'interactive': 0, 'bulk': 1}
+# A run counts as asking for a slot if it polled within this window and has not
+# been granted a lease since
+WANT_WINDOW_SEC = 3.0
+
+_SCHEMA = '''
+create table if not exists runs (
+    run_id text primary key,
+    owner text not null default '',
+    priority integer not null default 0,
+    total integer not null default 0,
+    done integer not null default 0,
+    pid integer not null default 0,
+    registered_at real not null,
+    want_at real not null default 0
+);
+create table if not exists leases (
+    id integer primary key autoincrement,
+    run_id text not null,
+    pid integer not null,
+    started_at real not null
+);
+create table if not exists stats (
+    key text primary key,
+    value real not null
+);
+'''
+
+
+def priority_rank(priority: Optional[str]) -> int:
+    return PRIORITIES.get(str(priority or 'interactive').strip().lower(), PRIORITIES['bulk'])
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class FairShareScheduler:
+    def __init__(
+        self,
+        runs_root: pathlib.Path,
+        *,
+        host_slots: Optional[int] = None,
+        run_quota: Optional[int] = None,
+        owner_quota: Optional[int] = None,
+    ):
+        self.db_path = pathlib.Path(runs_root) / DB_FILE
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.host_slots = int(host_slots if host_slots is not None else os.getenv('TESTS_HOST_SLOTS', '16'))
+        self.run_quota = int(run_quota if run_quota is not None else os.getenv('TESTS_RUN_QUOTA', '16'))
+        self.owner_quota = int(owner_quota if owner_quota is not None else os.getenv('TESTS_OWNER_QUOTA', '16'))
+        db = sqlite3.connect(str(self.db_path), timeout=30.0)
+        try:
+            db.execute('pragma journal_mode=wal')
+            db.executescript(_SCHEMA)
+        finally:
+            db.close()
+
+    @contextlib.contextmanager
+    def _tx(self):
+        db = sqlite3.connect(str(self.db_path), timeout=30.0, isolation_level=None)
+        try:
+            db.execute('begin immediate')
+            try:
+                yield db
+                db.execute('commit')
+            except BaseException:
+                db.execute('rollback')
+                raise
+        finally:
+            db.close()
+
+    def _reap(self, db: sqlite3.Connection) -> None:
+        for (pid,) in db.execute('select distinct pid from runs union select distinct pid from leases').fetchall():
+            if not _pid_alive(int(pid)):
+                db.execute('delete from leases where pid=?', (pid,))
+                db.execute('delete from runs where pid=?', (pid,))
+
+    def register(self, run_id: str, *, owner: str = '', priority: Optional[str] = None, total: int = 0) -> None:
+        with self._tx() as db:
+            db.execute(
+                'insert or replace into runs (run_id, owner, priority, total, done, pid, registered_at, want_at) values (?,?,?,?,0,?,?,0)',
+                (run_id, owner or '', priority_rank(priority), int(total), os.getpid(), time.time()),
+            )
+
+    def unregister(self, run_id: str) -> None:
+        with self._tx() as db:
+            db.execute('delete from leases where run_id=?', (run_id,))
+            db.execute('delete from runs where run_id=?', (run_id,))
+
+    def try_acquire(self, run_id: str) -> Optional[int]:
+        """Lease id when run_id may start one more job now, else None (poll again)."""
+        now = time.time()
+        with self._tx() as db:
+            db.execute('update runs set want_at=? where run_id=?', (now, run_id))
+            self._reap(db)
+            if db.execute('select count(*) from leases').fetchone()[0] >= self.host_slots:
+                return None
+            rows = db.execute(
+                '''select r.run_id, r.owner, r.priority, r.registered_at,
+                          (select count(*) from leases l where l.run_id = r.run_id) as held,
+                          (select count(*) from leases l join runs o on o.run_id = l.run_id where o.owner = r.owner) as owner_held
+                   from runs r
+                   where r.want_at >= ? and r.total - r.done > (select count(*) from leases l where l.run_id = r.run_id)''',
+                (now - WANT_WINDOW_SEC,),
+            ).fetchall()
+            eligible = [r for r in rows if r[4] < self.run_quota and r[5] < self.owner_quota]
+            if not eligible:
+                return None
+            pick = min(eligible, key=lambda r: (r[2], r[5], r[4], r[3]))
+            if pick[0] != run_id:
+                return None
+            cur = db.execute('insert into leases (run_id, pid, started_at) values (?,?,?)', (run_id, os.getpid(), now))
+            # Granted: the run stops counting as asking until it polls again, so a run
+            # that reached its local target cannot win picks and starve the others
+            db.execute('update runs set want_at=0 where run_id=?', (run_id,))
+            return int(cur.lastrowid)
+
+    def release(self, lease_id: int, *, duration_sec: Optional[float] = None) -> None:
+        with self._tx() as db:
+            row = db.execute('select run_id from leases where id=?', (lease_id,)).fetchone()
+            db.execute('delete from leases where id=?', (lease_id,))
+            if row:
+                db.execute('update runs set done = done + 1 where run_id=?', (row[0],))
+            if duration_sec is not None and duration_sec >= 0:
+                prev = db.execute("select value from stats where key='avg_job_sec'").fetchone()
+                avg = float(duration_sec) if prev is None else 0.8 * float(prev[0]) + 0.2 * float(duration_sec)
+                db.execute("insert or replace into stats (key, value) values ('avg_job_sec', ?)", (avg,))
+
+    def estimate(self, *, priority: Optional[str] = None, jobs: int = 0) -> Dict[str, Any]:
+        """Admission estimate for a new run: work queued ahead of it and when it should start."""
+        rank = priority_rank(priority)
+        with self._tx() as db:
+            self._reap(db)
+            running = db.execute('select count(*) from leases').fetchone()[0]
+            ahead = db.execute(
+                '''select coalesce(sum(max(r.total - r.done - (select count(*) from leases l where l.run_id = r.run_id), 0)), 0), count(*)
+                   from runs r where r.priority <= ?''',
+                (rank,),
+            ).fetchone()
+            avg_row = db.execute("select value from stats where key='avg_job_sec'").fetchone()
+        avg_job_sec = float(avg_row[0]) if avg_row else None
+        queued_ahead = int(ahead[0] or 0)
+        free_now = max(0, self.host_slots - int(running))
+        waves = 0 if free_now > 0 and queued_ahead < free_now else (queued_ahead - free_now) // max(1, self.host_slots) + 1
+        eta_sec = round(waves * avg_job_sec, 1) if avg_job_sec is not None else None
+        return {
+            'priority': 'interactive' if rank == 0 else 'bulk',
+            'host_slots': self.host_slots,
+            'running': int(running),
+            'runs_ahead': int(ahead[1] or 0),
+            'queued_ahead': queued_ahead,
+            'jobs': int(jobs),
+            'avg_job_sec': round(avg_job_sec, 2) if avg_job_sec is not None else None,
+            'eta_sec': eta_sec,
+            'estimated_start_at': (time.time() + eta_sec) if eta_sec is not None else None,
+        }
+
+
+class FairShareGate:
+    """Lease gate for AdaptiveScheduler: one host-wide lease per running job."""
+
+    def __init__(self, scheduler: FairShareScheduler, run_id: str):
+        self.scheduler = scheduler
+        self.run_id = run_id
+
+    def try_acquire(self) -> Optional[int]:
+        try:
+            return self.scheduler.try_acquire(self.run_id)
+        except sqlite3.Error:
+            # A broken/locked database must not stall tests; run ungated
+            return -1
+
+    def release(self, lease: Optional[int], duration_sec: Optional[float] = None) -> None:
+        if lease is None or lease < 0:
+            return
+        try:
+            self.scheduler.release(lease, duration_sec=duration_sec)
+        except sqlite3.Error:
+            pass
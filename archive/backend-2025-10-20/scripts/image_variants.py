@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Model-ready variants of screen images for vision prompts.
+
+Figma exports are 2x PNGs; sending them as-is costs upload bytes, tokens and
+latency on every call. A variant is the image resized to a long edge of
+LLM_IMAGE_MAX_EDGE (1024) px, re-encoded as LLM_IMAGE_FORMAT (jpeg|webp|png,
+default jpeg, quality LLM_IMAGE_QUALITY 85) and stored as base64 text in a
+`.llm/` folder next to the original:
+
+  screens/Home.png -> screens/.llm/Home.png.1024.jpeg.q85.b64
+
+Preprocess writes variants for all screens (this script); image_part() and
+encode_image() read them (creating a missing or stale variant on the fly) so
+every LLM call site sends the same compact payload. LLM_IMAGE_VARIANTS=0 sends
+the original PNG bytes instead.
+
+Usage:
+  python scripts/image_variants.py --screens-dir runs/<id>/preprocess/screens
+"""
+
+import argparse
+import base64
+import io
+import os
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+
+VARIANT_DIR = '.llm'
+IMAGE_EXTS = {'.png', '.jpg', '.jpeg', '.webp'}
+_MIME = {'jpeg': 'image/jpeg', 'webp': 'image/webp', 'png': 'image/png'}
+
+_MEMO: Dict[Tuple[str, int, int, str, int], Tuple[str, str]] = {}
+_MEMO_LOCK = threading.Lock()
+
+
+def variants_enabled() -> bool:
+    return os.getenv('LLM_IMAGE_VARIANTS', '1').strip().lower() not in {'0', 'false', 'no', 'off'}
+
+
+def variant_params() -> Tuple[int, str, int]:
+    """(max long edge, format, quality) from the environment."""
+    fmt = os.getenv('LLM_IMAGE_FORMAT', 'jpeg').strip().lower()
+    fmt = 'jpeg' if fmt == 'jpg' else fmt
+    if fmt not in _MIME:
+        fmt = 'jpeg'
+    return int(os.getenv('LLM_IMAGE_MAX_EDGE', '1024')), fmt, int(os.getenv('LLM_IMAGE_QUALITY', '85'))
+
+
+def variant_path(image_path: pathlib.Path, max_edge: int, fmt: str, quality: int) -> pathlib.Path:
+    image_path = pathlib.Path(image_path)
+    return image_path.parent / VARIANT_DIR / f'{image_path.name}.{max_edge}.{fmt}.q{quality}.b64'
+
+
+def encode_image(img: Image.Image, max_edge: Optional[int] = None, fmt: Optional[str] = None, quality: Optional[int] = None) -> Tuple[str, str]:
+    """(mime type, base64) of a PIL image downscaled to max_edge and encoded as fmt."""
+    d_edge, d_fmt, d_quality = variant_params()
+    max_edge = d_edge if max_edge is None else max_edge
+    fmt = fmt or d_fmt
+    quality = d_quality if quality is None else quality
+    if max_edge > 0 and max(img.size) > max_edge:
+        scale = max_edge / float(max(img.size))
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+    if fmt == 'jpeg':
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # Flatten transparency onto white (screens are opaque in practice)
+            rgba = img.convert('RGBA')
+            flat = Image.new('RGB', rgba.size, (255, 255, 255))
+            flat.paste(rgba, mask=rgba.split()[-1])
+            img = flat
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+    buf = io.BytesIO()
+    if fmt == 'png':
+        img.save(buf, format='PNG', optimize=True)
+    else:
+        img.save(buf, format=fmt.upper(), quality=quality)
+    return _MIME[fmt], base64.b64encode(buf.getvalue()).decode('ascii')
+
+
+def write_variant(image_path: pathlib.Path) -> Tuple[str, str]:
+    """Create (or refresh) the stored variant of image_path; returns (mime type, base64)."""
+    max_edge, fmt, quality = variant_params()
+    with Image.open(image_path) as img:
+        img.load()
+        mime, b64 = encode_image(img, max_edge, fmt, quality)
+    out = variant_path(image_path, max_edge, fmt, quality)
+    try:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out.with_name(f'.{out.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp.write_text(b64, encoding='ascii')
+        os.replace(tmp, out)
+    except OSError:
+        pass
+    return mime, b64
+
+
+def image_payload(image_path: pathlib.Path) -> Tuple[str, str]:
+    """(mime type, base64) to send for image_path: its stored variant, or the original bytes when disabled."""
+    image_path = pathlib.Path(image_path)
+    if not variants_enabled():
+        return 'image/png', base64.b64encode(image_path.read_bytes()).decode('ascii')
+    max_edge, fmt, quality = variant_params()
+    st = image_path.stat()
+    key = (str(image_path.resolve()), st.st_mtime_ns, max_edge, fmt, quality)
+    with _MEMO_LOCK:
+        hit = _MEMO.get(key)
+    if hit is not None:
+        return hit
+    out = variant_path(image_path, max_edge, fmt, quality)
+    try:
+        # Stale when older than the original (re-export)
+        if out.stat().st_mtime_ns >= st.st_mtime_ns:
+            payload = (_MIME[fmt], out.read_text(encoding='ascii'))
+        else:
+            payload = write_variant(image_path)
+    except OSError:
+        payload = write_variant(image_path)
+    with _MEMO_LOCK:
+        _MEMO[key] = payload
+    return payload
+
+
+def image_part(image_path: pathlib.Path) -> dict:
+    """Gemini inline_data part for image_path."""
+    mime, b64 = image_payload(image_path)
+    return {"inline_data": {"mime_type": mime, "data": b64}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write downscaled, base64-ready LLM variants of screen images')
+    parser.add_argument('--screens-dir', required=True, help='Directory of exported screen images')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    screens_dir = pathlib.Path(args.screens_dir)
+    images = sorted(p for p in screens_dir.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_EXTS)
+    max_edge, fmt, quality = variant_params()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        encoded = list(ex.map(write_variant, images))
+    before = sum(p.stat().st_size for p in images)
+    after = sum(len(b64) * 3 // 4 for _, b64 in encoded)
+    print(f'[image_variants] {len(images)} screens -> {screens_dir / VARIANT_DIR} ({fmt}, long edge {max_edge}, q{quality}): '
+          f'{before / 1e6:.1f} MB -> {after / 1e6:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
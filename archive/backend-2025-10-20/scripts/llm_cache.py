@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Content-addressed, on-disk cache of LLM responses and embeddings.
+
+Entries live in one SQLite file shared by all runs on the host
+(LLM_CACHE_PATH, default runs/.llm_cache.sqlite3). The key is a SHA-256 over
+the call kind, model name and request parts, where text parts contribute their
+text and inline images their MIME type and data digest, so identical prompts
+over identical screens hit regardless of run, process or file name on disk.
+
+- LLM_CACHE=0 disables the cache
+- LLM_CACHE_BYPASS=1 skips lookups but still stores fresh responses (refresh)
+- LLM_CACHE_TTL_DAYS (30): older entries are misses and get dropped
+- LLM_CACHE_MAX_MB (256): least recently used entries are evicted beyond this
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+import time
+from typing import Any, Optional
+
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+_SCHEMA = '''
+create table if not exists entries (
+    key text primary key,
+    kind text not null,
+    model text not null,
+    value text not null,
+    size integer not null,
+    created_at real not null,
+    accessed_at real not null
+);
+create index if not exists entries_accessed on entries (accessed_at);
+'''
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() not in {'0', 'false', 'no', 'off', ''}
+
+
+def cache_enabled() -> bool:
+    return _flag('LLM_CACHE', '1')
+
+
+def cache_bypassed() -> bool:
+    return _flag('LLM_CACHE_BYPASS', '0')
+
+
+def _digest_part(part: Any) -> Any:
+    if isinstance(part, dict):
+        inline = part.get('inline_data')
+        if isinstance(inline, dict):
+            data = inline.get('data') or b''
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            return {'inline_data': {'mime_type': inline.get('mime_type'), 'sha256': hashlib.sha256(data).hexdigest()}}
+        return {k: _digest_part(v) for k, v in sorted(part.items())}
+    if isinstance(part, (list, tuple)):
+        return [_digest_part(p) for p in part]
+    return part if isinstance(part, (str, int, float, bool)) or part is None else str(part)
+
+
+def cache_key(kind: str, model: str, parts: Any) -> str:
+    canonical = json.dumps({'kind': kind, 'model': model, 'parts': _digest_part(parts)}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: Optional[pathlib.Path] = None):
+        self.path = pathlib.Path(path or os.getenv('LLM_CACHE_PATH') or ROOT / 'runs' / '.llm_cache.sqlite3')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_sec = float(os.getenv('LLM_CACHE_TTL_DAYS', '30')) * 86400
+        self.max_bytes = int(float(os.getenv('LLM_CACHE_MAX_MB', '256')) * 1024 * 1024)
+        db = sqlite3.connect(str(self.path), timeout=30.0)
+        try:
+            db.execute('pragma journal_mode=wal')
+            db.executescript(_SCHEMA)
+        finally:
+            db.close()
+
+    @contextlib.contextmanager
+    def _db(self):
+        db = sqlite3.connect(str(self.path), timeout=30.0, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._db() as db:
+            row = db.execute('select value, created_at from entries where key=?', (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl_sec > 0 and now - float(row[1]) > self.ttl_sec:
+                db.execute('delete from entries where key=?', (key,))
+                return None
+            db.execute('update entries set accessed_at=? where key=?', (now, key))
+        return json.loads(row[0])
+
+    def put(self, key: str, kind: str, model: str, value: Any) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._db() as db:
+            db.execute('begin immediate')
+            try:
+                db.execute(
+                    'insert or replace into entries (key, kind, model, value, size, created_at, accessed_at) values (?,?,?,?,?,?,?)',
+                    (key, kind, model, payload, len(payload.encode('utf-8')), now, now),
+                )
+                self._evict(db)
+                db.execute('commit')
+            except BaseException:
+                db.execute('rollback')
+                raise
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        if self.ttl_sec > 0:
+            db.execute('delete from entries where created_at < ?', (time.time() - self.ttl_sec,))
+        total = db.execute('select coalesce(sum(size), 0) from entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        doomed = []
+        for key, size in db.execute('select key, size from entries order by accessed_at'):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        db.executemany('delete from entries where key=?', doomed)
+
+    def stats(self) -> dict:
+        with self._db() as db:
+            n, size = db.execute('select count(*), coalesce(sum(size), 0) from entries').fetchone()
+        return {'entries': int(n), 'bytes': int(size), 'max_bytes': self.max_bytes}
+
+
+_CACHE: Optional[LLMCache] = None
+
+
+def get_cache() -> Optional[LLMCache]:
+    """Process-wide cache, or None when disabled or the store cannot be opened."""
+    global _CACHE
+    if not cache_enabled():
+        return None
+    if _CACHE is None:
+        try:
+            _CACHE = LLMCache()
+        except Exception:
+            return None
+    return _CACHE
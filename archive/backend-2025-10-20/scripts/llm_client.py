@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Single entry point for Gemini calls.
+
+generate() and embed() take a token from the host-wide budget of their model
+(llm_limiter.py) before every attempt, retry rate-limit/transient errors with
+jittered exponential backoff and count calls, so every call site shares one
+limit and one set of stats. LLM_MAX_RETRIES (4) and LLM_RETRY_BASE_SEC (0.5)
+tune the retries.
+
+Responses are served from and stored in the persistent cache (llm_cache.py)
+keyed by model, prompt text and image digests, so re-processing an unchanged
+file makes no model calls; only the response text (or embedding) is kept.
+
+Every call, cached or not, is recorded to the run's telemetry file
+(llm_telemetry.py) with its latency, payload size, tokens, retries, limiter
+wait, backoff and cache hit.
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Optional
+
+import llm_cache
+import llm_limiter
+import llm_telemetry
+
+
+_STATS_LOCK = threading.Lock()
+# Process-wide call counters; the persona runner's scheduler backs off on rate_limited
+_STATS = {'calls': 0, 'rate_limited': 0, 'limiter_wait_sec': 0.0, 'cache_hits': 0, 'cache_misses': 0}
+
+
+class CachedResponse:
+    """Stands in for a generate_content response replayed from the cache."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def llm_call_stats() -> dict:
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+
+def _count(key: str, amount: float = 1) -> None:
+    with _STATS_LOCK:
+        _STATS[key] += amount
+
+
+def model_name_of(model: Any) -> str:
+    name = str(getattr(model, 'model_name', '') or os.getenv('MODEL_NAME', 'gemini-2.5-pro'))
+    return name[len('models/'):] if name.startswith('models/') else name
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    msg = str(exc).lower()
+    return ('429' in msg) or ('rate' in msg) or ('resource exhausted' in msg) or ('quota' in msg)
+
+
+def _retriable(exc: BaseException) -> bool:
+    msg = str(exc).lower()
+    return ('429' in msg) or ('rate' in msg) or ('temporarily unavailable' in msg) or ('timeout' in msg) or ('503' in msg) or ('500' in msg)
+
+
+def _with_retries(kind: str, name: str, call, max_retries: Optional[int], trace: Optional[dict] = None):
+    """call() with limiter + retries; trace (if given) receives retries, rate_limited,
+    limiter_wait_sec and backoff_sec of this call."""
+    if max_retries is None:
+        max_retries = int(os.getenv('LLM_MAX_RETRIES', '4'))
+    base_sleep = float(os.getenv('LLM_RETRY_BASE_SEC', '0.5'))
+    trace = trace if trace is not None else {}
+    trace.update({'retries': 0, 'rate_limited': 0, 'limiter_wait_sec': 0.0, 'backoff_sec': 0.0})
+    for attempt in range(max_retries + 1):
+        trace['retries'] = attempt
+        waited = llm_limiter.acquire(kind, name)
+        if waited:
+            _count('limiter_wait_sec', waited)
+            trace['limiter_wait_sec'] += waited
+        _count('calls')
+        try:
+            return call()
+        except Exception as e:
+            if is_rate_limited(e):
+                _count('rate_limited')
+                trace['rate_limited'] += 1
+            if attempt >= max_retries or not _retriable(e):
+                raise
+            sleep = min((base_sleep * (2 ** attempt)) * (1.0 + 0.2 * random.random()), 8.0)
+            trace['backoff_sec'] += sleep
+            time.sleep(sleep)
+
+
+def _request_bytes(content: Any) -> int:
+    """Approximate upload size of a request: text and inline (base64) data."""
+    if isinstance(content, str):
+        return len(content.encode('utf-8'))
+    if isinstance(content, bytes):
+        return len(content)
+    if isinstance(content, dict):
+        return sum(_request_bytes(v) for v in content.values())
+    if isinstance(content, (list, tuple)):
+        return sum(_request_bytes(v) for v in content)
+    return 0
+
+
+def _usage(resp: Any) -> dict:
+    usage = getattr(resp, 'usage_metadata', None)
+    if usage is None:
+        return {}
+    out = {}
+    for key, attr in (('prompt_tokens', 'prompt_token_count'), ('output_tokens', 'candidates_token_count'), ('total_tokens', 'total_token_count')):
+        try:
+            val = getattr(usage, attr, None)
+            if val is not None:
+                out[key] = int(val)
+        except Exception:
+            pass
+    return out
+
+
+def _record(kind: str, name: str, started: float, content: Any, trace: dict, *, cache_hit: bool, resp: Any = None, error: Optional[BaseException] = None) -> None:
+    rec = {
+        'kind': kind,
+        'model': name,
+        'latency_sec': round(time.perf_counter() - started, 4),
+        'request_bytes': _request_bytes(content),
+        'cache_hit': cache_hit,
+        'ok': error is None,
+    }
+    rec.update({k: (round(v, 4) if isinstance(v, float) else v) for k, v in trace.items()})
+    if resp is not None:
+        rec.update(_usage(resp))
+    if error is not None:
+        rec['error'] = str(error)[:300]
+    llm_telemetry.record(rec)
+
+
+def _cache_lookup(kind: str, name: str, parts: Any):
+    """(cache, key, cached value); cache is None when caching is off."""
+    cache = llm_cache.get_cache()
+    if cache is None:
+        return None, None, None
+    key = llm_cache.cache_key(kind, name, parts)
+    value = None
+    if not llm_cache.cache_bypassed():
+        try:
+            value = cache.get(key)
+        except Exception:
+            value = None
+    _count('cache_hits' if value is not None else 'cache_misses')
+    return cache, key, value
+
+
+def _cache_store(cache, key: str, kind: str, name: str, value: Any) -> None:
+    try:
+        cache.put(key, kind, name, value)
+    except Exception:
+        pass
+
+
+def generate(model: Any, parts_or_prompt: Any, *, timeout_sec: int = 30, max_retries: Optional[int] = None, cache: bool = True):
+    """model.generate_content under the model's host-wide budget; text prompts are wrapped as one part.
+    Identical requests are answered from the persistent cache unless cache=False."""
+    parts = parts_or_prompt if isinstance(parts_or_prompt, list) else [{'text': str(parts_or_prompt)}]
+    name = model_name_of(model)
+    started = time.perf_counter()
+    trace: dict = {}
+    store, key, cached = _cache_lookup('generate', name, parts) if cache else (None, None, None)
+    if cached is not None:
+        _record('generate', name, started, parts, trace, cache_hit=True)
+        return CachedResponse(str(cached))
+    try:
+        resp = _with_retries(
+            'model', name,
+            lambda: model.generate_content(parts, request_options={'timeout': timeout_sec}),
+            max_retries,
+            trace,
+        )
+    except Exception as e:
+        _record('generate', name, started, parts, trace, cache_hit=False, error=e)
+        raise
+    _record('generate', name, started, parts, trace, cache_hit=False, resp=resp)
+    if store is not None:
+        try:
+            text = resp.text
+        except Exception:
+            # Blocked/empty candidates: nothing worth replaying
+            text = None
+        if text:
+            _cache_store(store, key, 'generate', name, text)
+    return resp
+
+
+def embed(content: Any, *, model_name: Optional[str] = None, max_retries: Optional[int] = None, cache: bool = True):
+    """genai.embed_content under the embedding budget; cached like generate()."""
+    import google.generativeai as genai
+    model_name = model_name or os.getenv('EMBED_MODEL', 'text-embedding-004')
+    started = time.perf_counter()
+    trace: dict = {}
+    store, key, cached = _cache_lookup('embed', model_name, content) if cache else (None, None, None)
+    if cached is not None:
+        _record('embed', model_name, started, content, trace, cache_hit=True)
+        return {'embedding': cached}
+    try:
+        resp = _with_retries('embed', model_name, lambda: genai.embed_content(model=model_name, content=content), max_retries, trace)
+    except Exception as e:
+        _record('embed', model_name, started, content, trace, cache_hit=False, error=e)
+        raise
+    _record('embed', model_name, started, content, trace, cache_hit=False, resp=resp)
+    if store is not None:
+        vec = resp.get('embedding') if isinstance(resp, dict) else getattr(resp, 'embedding', None)
+        if vec:
+            _cache_store(store, key, 'embed', model_name, list(vec))
+    return resp
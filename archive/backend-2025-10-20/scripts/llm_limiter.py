@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Host-wide token buckets for LLM and embedding calls.
+
+Every process on the host (API, preprocess stages, persona runners, subprocess
+simulations) shares one bucket per budget, so LLM_QPS is a host limit rather
+than a per-process one. A bucket is a 16-byte file (tokens, timestamp) under
+LLM_LIMITER_DIR (default <tmp>/llm_limiter) updated under an exclusive flock.
+
+acquire() reserves the next token and sleeps until it is due: the bucket may go
+negative, which queues callers in arrival order without a thundering herd of
+retries. Budgets:
+- model:<name>  LLM_QPS_<NAME> (name upper-cased, non-alphanumerics as _), else LLM_QPS (8)
+- embed:<name>  EMBED_QPS (20)
+Bursts up to LLM_BURST / EMBED_BURST tokens (default: one second's worth).
+A rate <= 0 disables the budget. Without fcntl (non-POSIX) buckets are per process.
+"""
+
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from typing import Dict, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+
+_STATE = struct.Struct('<dd')
+_LOCAL_LOCK = threading.Lock()
+_LOCAL_BUCKETS: Dict[str, Tuple[float, float]] = {}
+
+
+def limiter_dir() -> str:
+    return os.getenv('LLM_LIMITER_DIR') or os.path.join(tempfile.gettempdir(), 'llm_limiter')
+
+
+def _env_name(name: str) -> str:
+    return re.sub(r'[^A-Z0-9]+', '_', name.upper()).strip('_')
+
+
+def budget_for(kind: str, name: str) -> Tuple[float, float]:
+    """(rate per second, burst) of a budget from the environment."""
+    if kind == 'embed':
+        rate = float(os.getenv('EMBED_QPS', '20'))
+        burst = os.getenv('EMBED_BURST')
+    else:
+        rate = float(os.getenv(f'LLM_QPS_{_env_name(name)}') or os.getenv('LLM_QPS', '8'))
+        burst = os.getenv('LLM_BURST')
+    return rate, max(1.0, float(burst) if burst else rate)
+
+
+def _take(tokens: float, ts: float, now: float, rate: float, burst: float) -> Tuple[float, float, float]:
+    """Refill, reserve one token; returns (tokens, ts, seconds until the token is due)."""
+    if ts <= 0 or ts > now:
+        tokens, ts = burst, now
+    tokens = min(burst, tokens + (now - ts) * rate) - 1.0
+    return tokens, now, (max(0.0, -tokens / rate))
+
+
+def reserve(kind: str, name: str) -> float:
+    """Reserve a token from the kind:name budget; returns how long the caller must wait."""
+    rate, burst = budget_for(kind, name)
+    if rate <= 0:
+        return 0.0
+    key = f'{kind}_{_env_name(name) or "default"}'
+    now = time.time()
+    if fcntl is not None:
+        try:
+            d = limiter_dir()
+            os.makedirs(d, exist_ok=True)
+            fd = os.open(os.path.join(d, key + '.bucket'), os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                raw = os.pread(fd, _STATE.size, 0)
+                tokens, ts = _STATE.unpack(raw) if len(raw) == _STATE.size else (burst, 0.0)
+                tokens, ts, wait = _take(tokens, ts, now, rate, burst)
+                os.pwrite(fd, _STATE.pack(tokens, ts), 0)
+                return wait
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+    with _LOCAL_LOCK:
+        tokens, ts = _LOCAL_BUCKETS.get(key, (burst, 0.0))
+        tokens, ts, wait = _take(tokens, ts, now, rate, burst)
+        _LOCAL_BUCKETS[key] = (tokens, ts)
+        return wait
+
+
+def acquire(kind: str, name: str) -> float:
+    """Block until a call under the kind:name budget may start; returns seconds waited."""
+    wait = reserve(kind, name)
+    if wait > 0:
+        time.sleep(wait)
+    return wait
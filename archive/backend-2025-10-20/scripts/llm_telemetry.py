@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Per-run telemetry of LLM and embedding calls.
+
+llm_client.generate()/embed() emit one JSON line per call to
+LLM_TELEMETRY_PATH, set by the runners: preprocess stages write
+runs/<id>/telemetry/llm.jsonl, and each test run writes its own
+runs/<id>/telemetry/tests_<test_run_id>.jsonl (a project's test runs share its
+run folder):
+
+  {"ts", "stage", "pid", "kind" (generate|embed), "model", "latency_sec",
+   "request_bytes", "prompt_tokens", "output_tokens", "total_tokens",
+   "retries", "rate_limited", "limiter_wait_sec", "backoff_sec",
+   "cache_hit", "ok", "error"}
+
+stage is LLM_STAGE (the runner's stage label, 'tests' for simulations), else the
+script name. Each record is a single O_APPEND write, so concurrent processes and
+threads can share the file. Without LLM_TELEMETRY_PATH (or LLM_TELEMETRY=0)
+nothing is recorded. summarize() aggregates one file, or several (a whole run:
+run_telemetry_files), per stage and per model.
+
+Usage:
+  python scripts/llm_telemetry.py --run-dir runs/<id>
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+
+TELEMETRY_DIR = 'telemetry'
+TELEMETRY_FILE = 'llm.jsonl'
+
+
+def telemetry_path(run_dir: pathlib.Path) -> pathlib.Path:
+    return pathlib.Path(run_dir) / TELEMETRY_DIR / TELEMETRY_FILE
+
+
+def tests_telemetry_path(run_dir: pathlib.Path, test_run_id: str) -> pathlib.Path:
+    """Telemetry file of one test run over run_dir."""
+    return pathlib.Path(run_dir) / TELEMETRY_DIR / f'tests_{test_run_id}.jsonl'
+
+
+def run_telemetry_files(run_dir: pathlib.Path) -> List[pathlib.Path]:
+    """All telemetry files of a run: preprocess first, then test runs by name."""
+    folder = pathlib.Path(run_dir) / TELEMETRY_DIR
+    main = folder / TELEMETRY_FILE
+    tests = sorted(folder.glob('tests_*.jsonl')) if folder.exists() else []
+    return ([main] if main.exists() else []) + tests
+
+
+def _destination() -> Optional[str]:
+    if os.getenv('LLM_TELEMETRY', '1').strip().lower() in {'0', 'false', 'no', 'off'}:
+        return None
+    return os.getenv('LLM_TELEMETRY_PATH') or None
+
+
+def current_stage() -> str:
+    return os.getenv('LLM_STAGE') or pathlib.Path(sys.argv[0] or 'python').stem or 'python'
+
+
+def record(rec: Dict[str, Any]) -> None:
+    """Append one call record (best effort; telemetry never fails a call)."""
+    path = _destination()
+    if not path:
+        return
+    line = dict({'ts': round(time.time(), 3), 'stage': current_stage(), 'pid': os.getpid()}, **rec)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(line, ensure_ascii=False) + '\n').encode('utf-8'))
+        finally:
+            os.close(fd)
+    except Exception:
+        pass
+
+
+def read_records(path: pathlib.Path) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    out.append(json.loads(line))
+                except Exception:
+                    # Torn last line of a still-running writer
+                    continue
+    except FileNotFoundError:
+        pass
+    return out
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[int(q) - 1]
+
+
+def _aggregate(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    recs = list(records)
+    live = [r for r in recs if not r.get('cache_hit')]
+    lat = sorted(float(r.get('latency_sec') or 0.0) for r in live)
+    ts = [float(r.get('ts') or 0.0) for r in recs]
+    calls = len(recs)
+    hits = calls - len(live)
+
+    def total(key: str) -> float:
+        return sum(float(r.get(key) or 0.0) for r in recs)
+
+    return {
+        'calls': calls,
+        'model_calls': len(live),
+        'errors': sum(1 for r in recs if r.get('ok') is False),
+        'cache_hits': hits,
+        'cache_hit_rate': round(hits / calls, 3) if calls else 0.0,
+        'latency_sec_total': round(sum(lat), 3),
+        'latency_sec_p50': round(_percentile(lat, 50), 3),
+        'latency_sec_p95': round(_percentile(lat, 95), 3),
+        'latency_sec_max': round(lat[-1], 3) if lat else 0.0,
+        'retries': int(total('retries')),
+        'rate_limited': int(total('rate_limited')),
+        'limiter_wait_sec': round(total('limiter_wait_sec'), 3),
+        'backoff_sec': round(total('backoff_sec'), 3),
+        'request_bytes': int(total('request_bytes')),
+        'prompt_tokens': int(total('prompt_tokens')),
+        'output_tokens': int(total('output_tokens')),
+        # First call start to last call end: wall time the stage spent with LLM work in flight
+        'span_sec': round(max(ts) - min(t - float(r.get('latency_sec') or 0.0) for t, r in zip(ts, recs)), 3) if recs else 0.0,
+    }
+
+
+def summarize(paths: Union[pathlib.Path, Sequence[pathlib.Path]]) -> Dict[str, Any]:
+    """Totals, per-stage and per-model aggregates of one or more telemetry files."""
+    recs: List[Dict[str, Any]] = []
+    for path in ([paths] if isinstance(paths, (str, pathlib.Path)) else paths):
+        recs.extend(read_records(pathlib.Path(path)))
+    by_stage: Dict[str, List[Dict[str, Any]]] = {}
+    by_model: Dict[str, List[Dict[str, Any]]] = {}
+    for r in recs:
+        by_stage.setdefault(str(r.get('stage') or ''), []).append(r)
+        by_model.setdefault(f"{r.get('kind') or 'generate'}:{r.get('model') or ''}", []).append(r)
+    return {
+        'total': _aggregate(recs),
+        'by_stage': {k: _aggregate(v) for k, v in sorted(by_stage.items())},
+        'by_model': {k: _aggregate(v) for k, v in sorted(by_model.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a run's LLM call telemetry")
+    parser.add_argument('--run-dir', default=None, help='runs/<run_id> folder')
+    parser.add_argument('--path', default=None, help='One telemetry file (default: every file under <run-dir>/telemetry)')
+    args = parser.parse_args()
+    if not args.path and not args.run_dir:
+        parser.error('--run-dir or --path is required')
+    paths = [pathlib.Path(args.path)] if args.path else run_telemetry_files(pathlib.Path(args.run_dir))
+    print(json.dumps(summarize(paths), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Compile a run's screen graph into one memory-mappable file.
+
+Output (default: <run-dir>/preprocess/run_graph.bin):
+- integer-indexed screens (node_ids) with name/file/description
+- CSR adjacency over screen indices (indptr, edge_dst) with resolved _dest_ids
+- alias/name/screen_id maps used to resolve edges
+- pre-tokenized edge text (score/match/wait token sets) over a shared vocabulary
+- every edge dict as (key, value) field records into a deduplicated string table
+
+Edges are resolved exactly like simulate_user_traversal.index_edges_by_source_id,
+so consumers (simulator, ingest, estimators) get identical graphs without
+re-reading screen_nodes.json and prototype_links_enriched.json.
+
+File layout: MAGIC | u32 version | u32 reserved | u64 header_len | header JSON |
+padding to 8 bytes | little-endian arrays (offsets recorded in the header).
+The header only holds source stamps and the array layout. All strings (names,
+descriptions, vocabulary, edge field keys and values) live once in the
+str_ptr/str_blob table, so loading is an mmap plus a few array views; maps,
+vocabulary and edge dicts are decoded on first access.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import pathlib
+import struct
+import threading
+from collections import deque
+from collections.abc import Mapping, Sequence
+from functools import cached_property
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+GRAPH_FILE = 'run_graph.bin'
+GRAPH_VERSION = 2
+MAGIC = b'RUNGRAPH'
+_PREFIX = struct.Struct('<8sIIQ')
+# edge_field_kind: value stored as the string itself, or as its JSON encoding
+FIELD_STR = 0
+FIELD_JSON = 1
+
+
+def _source_stamp(path: pathlib.Path) -> Dict[str, Any]:
+    try:
+        st = path.stat()
+        return {'size': int(st.st_size), 'mtime_ns': int(st.st_mtime_ns)}
+    except Exception:
+        return {}
+
+
+def _csr(token_sets: List[List[int]]) -> tuple:
+    ptr = np.zeros(len(token_sets) + 1, dtype=np.int32)
+    flat: List[int] = []
+    for i, toks in enumerate(token_sets):
+        flat.extend(toks)
+        ptr[i + 1] = len(flat)
+    return ptr, np.asarray(flat, dtype=np.int32)
+
+
+class _StringTable:
+    """Deduplicating builder for the str_ptr/str_blob arrays."""
+
+    def __init__(self) -> None:
+        self._index: Dict[str, int] = {}
+        self._chunks: List[bytes] = []
+
+    def add(self, text: Any) -> int:
+        text = str(text)
+        i = self._index.get(text)
+        if i is None:
+            i = self._index[text] = len(self._chunks)
+            self._chunks.append(text.encode('utf-8'))
+        return i
+
+    def opt(self, text: Any) -> int:
+        """Index of a non-empty string, -1 for empty/None."""
+        return self.add(text) if text else -1
+
+    def arrays(self) -> tuple:
+        ptr = np.zeros(len(self._chunks) + 1, dtype=np.uint64)
+        ptr[1:] = np.cumsum([len(c) for c in self._chunks], dtype=np.uint64)
+        return ptr, np.frombuffer(b''.join(self._chunks), dtype=np.uint8)
+
+
+def compile_run_graph(nodes_path: pathlib.Path, links_path: pathlib.Path, out_path: pathlib.Path) -> pathlib.Path:
+    # Imported lazily: the simulator itself imports this module to load compiled graphs
+    import simulate_user_traversal as sut
+
+    name_to_id, id_to_name, id_to_file, screenid_to_id = sut.build_node_maps(nodes_path)
+    id_to_desc: Dict[int, str] = dict(getattr(sut.build_node_maps, '_id_to_desc', {}))  # type: ignore[attr-defined]
+    alias_to_id = sut.build_alias_to_id(nodes_path)
+    links: List[Dict[str, Any]] = sut.load_json(links_path)
+    edges_by_source_id = sut.index_edges_by_source_id(links, alias_to_id, screenid_to_id, name_to_id)
+
+    node_ids = sorted(set(id_to_name) | set(id_to_file) | set(screenid_to_id.values()) | set(edges_by_source_id))
+    index_of = {nid: i for i, nid in enumerate(node_ids)}
+
+    vocab: Dict[str, int] = {}
+
+    def term_ids(*texts: Any) -> List[int]:
+        out = set()
+        for t in texts:
+            for w in sut.tokenize(str(t or '')):
+                if w not in vocab:
+                    vocab[w] = len(vocab)
+                out.add(vocab[w])
+        return sorted(out)
+
+    strings = _StringTable()
+    edge_count = 0
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int32)
+    edge_src: List[int] = []
+    edge_dst: List[int] = []
+    edge_dest_id: List[int] = []
+    score_sets: List[List[int]] = []
+    match_sets: List[List[int]] = []
+    wait_flags: List[int] = []
+    field_ptr: List[int] = [0]
+    field_key: List[int] = []
+    field_val: List[int] = []
+    field_kind: List[int] = []
+    for i, nid in enumerate(node_ids):
+        for e in edges_by_source_id.get(nid, []):
+            did = e.get('_dest_id') if isinstance(e.get('_dest_id'), int) else None
+            edge_count += 1
+            edge_src.append(i)
+            edge_dst.append(index_of.get(did, -1) if isinstance(did, int) else -1)
+            edge_dest_id.append(did if isinstance(did, int) else -1)
+            # Same fields as score_edge / match_intent_to_edge / is_wait_edge
+            score_sets.append(term_ids(e.get('user_intent'), e.get('click_target'), e.get('destination_screen_description'), e.get('destination_screen_name')))
+            match_sets.append(term_ids(e.get('click_target'), e.get('user_intent'), e.get('destination_screen_name')))
+            wait_flags.append(1 if sut.is_wait_edge(e) else 0)
+            for k, v in e.items():
+                field_key.append(strings.add(k))
+                if isinstance(v, str):
+                    field_val.append(strings.add(v))
+                    field_kind.append(FIELD_STR)
+                else:
+                    field_val.append(strings.add(json.dumps(v, ensure_ascii=False, separators=(',', ':'))))
+                    field_kind.append(FIELD_JSON)
+            field_ptr.append(len(field_key))
+        indptr[i + 1] = edge_count
+
+    def map_arrays(m: Dict[str, int]) -> tuple:
+        items = list(m.items())
+        return np.asarray([strings.add(k) for k, _ in items], dtype=np.int32), np.asarray([int(v) for _, v in items], dtype=np.int32)
+
+    name_key, name_val = map_arrays(name_to_id)
+    screenid_key, screenid_val = map_arrays(screenid_to_id)
+    alias_key, alias_val = map_arrays(alias_to_id)
+    screen_names = sorted({str(l.get('source_screen_name') or '') for l in links}.union({str(l.get('destination_screen_name') or '') for l in links}))
+
+    score_ptr, score_ids = _csr(score_sets)
+    match_ptr, match_ids = _csr(match_sets)
+    arrays = {
+        'node_ids': np.asarray(node_ids, dtype=np.int32),
+        'node_name': np.asarray([strings.opt(id_to_name.get(nid)) for nid in node_ids], dtype=np.int32),
+        'node_file': np.asarray([strings.opt(id_to_file.get(nid)) for nid in node_ids], dtype=np.int32),
+        'node_desc': np.asarray([strings.opt(id_to_desc.get(nid)) for nid in node_ids], dtype=np.int32),
+        'indptr': indptr,
+        'edge_src': np.asarray(edge_src, dtype=np.int32),
+        'edge_dst': np.asarray(edge_dst, dtype=np.int32),
+        'edge_dest_id': np.asarray(edge_dest_id, dtype=np.int32),
+        'score_tok_ptr': score_ptr,
+        'score_tok_ids': score_ids,
+        'match_tok_ptr': match_ptr,
+        'match_tok_ids': match_ids,
+        'wait_flag': np.asarray(wait_flags, dtype=np.uint8),
+        'edge_field_ptr': np.asarray(field_ptr, dtype=np.int32),
+        'edge_field_key': np.asarray(field_key, dtype=np.int32),
+        'edge_field_val': np.asarray(field_val, dtype=np.int32),
+        'edge_field_kind': np.asarray(field_kind, dtype=np.uint8),
+        'name_key': name_key,
+        'name_val': name_val,
+        'screenid_key': screenid_key,
+        'screenid_val': screenid_val,
+        'alias_key': alias_key,
+        'alias_val': alias_val,
+        'vocab_ids': np.asarray([strings.add(w) for w in sorted(vocab, key=lambda w: vocab[w])], dtype=np.int32),
+        'screen_name_ids': np.asarray([strings.add(n) for n in screen_names], dtype=np.int32),
+    }
+    # String table last: every index above is assigned by now
+    arrays['str_ptr'], arrays['str_blob'] = strings.arrays()
+
+    # Lay arrays out after the header, each 8-byte aligned
+    layout: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder('<'))
+        arrays[name] = arr
+        layout[name] = {'dtype': arr.dtype.str, 'count': int(arr.size), 'offset': offset}
+        offset += arr.nbytes
+        offset += (-offset) % 8
+
+    header = {
+        'version': GRAPH_VERSION,
+        'sources': {'screen_nodes': _source_stamp(nodes_path), 'links': _source_stamp(links_path)},
+        'arrays': layout,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    data_start = _PREFIX.size + len(header_bytes)
+    pad = (-data_start) % 8
+
+    out_path = pathlib.Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_suffix(out_path.suffix + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, GRAPH_VERSION, 0, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b'\0' * pad)
+        pos = 0
+        for name, arr in arrays.items():
+            want = layout[name]['offset']
+            if want > pos:
+                f.write(b'\0' * (want - pos))
+                pos = want
+            f.write(arr.tobytes())
+            pos += arr.nbytes
+    os.replace(tmp, out_path)
+    return out_path
+
+
+class _EdgeList(Sequence):
+    """Edge dicts in CSR order, decoded from the string table on first access.
+
+    Each edge decodes to one dict object that is reused afterwards, so identity
+    checks (e.g. the scorer parity sweep) behave as with a plain list.
+    """
+
+    def __init__(self, graph: 'RunGraph') -> None:
+        self._graph = graph
+        self._cache: List[Optional[Dict[str, Any]]] = [None] * (len(graph.edge_field_ptr) - 1)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        e = self._cache[i]
+        if e is None:
+            decoded = self._graph.decode_edge(i)
+            with self._lock:
+                if self._cache[i] is None:
+                    self._cache[i] = decoded
+                e = self._cache[i]
+        return e
+
+
+class _EdgeIndex(Mapping):
+    """Read-only source id -> outgoing edges mapping (only sources with edges)."""
+
+    def __init__(self, graph: 'RunGraph') -> None:
+        self._graph = graph
+        ids = graph.node_ids.tolist()
+        ptr = graph.indptr.tolist()
+        self._span: Dict[int, tuple] = {int(nid): (ptr[i], ptr[i + 1]) for i, nid in enumerate(ids) if ptr[i + 1] > ptr[i]}
+        self._lists: Dict[int, List[Dict[str, Any]]] = {}
+
+    def __getitem__(self, node_id: int) -> List[Dict[str, Any]]:
+        out = self._lists.get(node_id)
+        if out is None:
+            a, b = self._span[node_id]
+            out = self._lists.setdefault(node_id, self._graph.edges[a:b])
+        return out
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._span)
+
+    def __len__(self) -> int:
+        return len(self._span)
+
+    def __contains__(self, node_id: object) -> bool:
+        return node_id in self._span
+
+
+class RunGraph:
+    """Read-only view over a compiled run graph. Arrays are zero-copy views into an mmap;
+    maps, vocabulary and edge dicts are decoded from the string table when first used."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = pathlib.Path(path)
+        with open(self.path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _reserved, header_len = _PREFIX.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f'not a run graph file: {self.path}')
+        if version != GRAPH_VERSION:
+            raise ValueError(f'unsupported run graph version {version} (expected {GRAPH_VERSION})')
+        header = json.loads(self._mm[_PREFIX.size:_PREFIX.size + header_len].decode('utf-8'))
+        data_start = _PREFIX.size + header_len
+        data_start += (-data_start) % 8
+        self.version = int(header.get('version') or 0)
+        self.sources: Dict[str, Any] = header.get('sources') or {}
+        for name, spec in (header.get('arrays') or {}).items():
+            arr = np.frombuffer(self._mm, dtype=np.dtype(spec['dtype']), count=int(spec['count']), offset=data_start + int(spec['offset']))
+            setattr(self, name, arr)
+        self._strings: Dict[int, str] = {}
+        self.index_of: Dict[int, int] = {int(nid): i for i, nid in enumerate(self.node_ids.tolist())}
+
+    # --- string table ---
+    def string(self, i: int) -> str:
+        i = int(i)
+        s = self._strings.get(i)
+        if s is None:
+            lo, hi = int(self.str_ptr[i]), int(self.str_ptr[i + 1])
+            s = self._strings.setdefault(i, bytes(self.str_blob[lo:hi]).decode('utf-8'))
+        return s
+
+    def _string_list(self, idx: np.ndarray) -> List[str]:
+        return [self.string(i) for i in idx.tolist()]
+
+    def _node_strings(self, idx: np.ndarray) -> Dict[int, str]:
+        return {int(nid): self.string(i) for nid, i in zip(self.node_ids.tolist(), idx.tolist()) if i >= 0}
+
+    def _string_map(self, keys: np.ndarray, vals: np.ndarray) -> Dict[str, int]:
+        return {self.string(k): int(v) for k, v in zip(keys.tolist(), vals.tolist())}
+
+    @cached_property
+    def id_to_name(self) -> Dict[int, str]:
+        return self._node_strings(self.node_name)
+
+    @cached_property
+    def id_to_file(self) -> Dict[int, str]:
+        return self._node_strings(self.node_file)
+
+    @cached_property
+    def id_to_desc(self) -> Dict[int, str]:
+        return self._node_strings(self.node_desc)
+
+    @cached_property
+    def name_to_id(self) -> Dict[str, int]:
+        return self._string_map(self.name_key, self.name_val)
+
+    @cached_property
+    def screenid_to_id(self) -> Dict[str, int]:
+        return self._string_map(self.screenid_key, self.screenid_val)
+
+    @cached_property
+    def alias_to_id(self) -> Dict[str, int]:
+        return self._string_map(self.alias_key, self.alias_val)
+
+    @cached_property
+    def vocab(self) -> List[str]:
+        return self._string_list(self.vocab_ids)
+
+    @cached_property
+    def screen_names(self) -> List[str]:
+        return self._string_list(self.screen_name_ids)
+
+    # --- edges ---
+    def decode_edge(self, edge_index: int) -> Dict[str, Any]:
+        lo, hi = int(self.edge_field_ptr[edge_index]), int(self.edge_field_ptr[edge_index + 1])
+        out: Dict[str, Any] = {}
+        for k, v, kind in zip(self.edge_field_key[lo:hi].tolist(), self.edge_field_val[lo:hi].tolist(), self.edge_field_kind[lo:hi].tolist()):
+            text = self.string(v)
+            out[self.string(k)] = text if kind == FIELD_STR else json.loads(text)
+        return out
+
+    @cached_property
+    def edges(self) -> _EdgeList:
+        return _EdgeList(self)
+
+    # --- adjacency ---
+    def edge_range(self, node_id: int) -> range:
+        i = self.index_of.get(int(node_id))
+        if i is None:
+            return range(0)
+        return range(int(self.indptr[i]), int(self.indptr[i + 1]))
+
+    def edges_by_source_id(self) -> Mapping:
+        """Same shape as simulate_user_traversal.index_edges_by_source_id (only sources with edges);
+        a read-only mapping whose edge lists are decoded per source on first lookup."""
+        return _EdgeIndex(self)
+
+    def distances_to(self, target_id: Optional[int]) -> Dict[int, int]:
+        """Reverse BFS hop counts to target_id (mirrors compute_distances_to_target)."""
+        if target_id is None:
+            return {}
+        rev: Dict[int, List[int]] = {}
+        ids = self.node_ids.tolist()
+        for s, d in zip(self.edge_src.tolist(), self.edge_dst.tolist()):
+            if d >= 0:
+                rev.setdefault(ids[d], []).append(ids[s])
+        dist: Dict[int, int] = {int(target_id): 0}
+        dq = deque([int(target_id)])
+        while dq:
+            u = dq.popleft()
+            for v in rev.get(u, []):
+                if v not in dist:
+                    dist[v] = dist[u] + 1
+                    dq.append(v)
+        return dist
+
+    def shortest_path_len(self, source_id: int, target_id: int) -> Optional[int]:
+        """Forward BFS hop count from source to target, or None when unreachable."""
+        src = self.index_of.get(int(source_id))
+        tgt = self.index_of.get(int(target_id))
+        if src is None or tgt is None:
+            return None
+        ptr = self.indptr
+        dst = self.edge_dst
+        seen = {src}
+        dq = deque([(src, 0)])
+        while dq:
+            u, d = dq.popleft()
+            if u == tgt:
+                return d
+            for v in dst[ptr[u]:ptr[u + 1]].tolist():
+                if v >= 0 and v not in seen:
+                    seen.add(v)
+                    dq.append((v, d + 1))
+        return None
+
+    # --- tokens ---
+    def score_terms(self, edge_index: int) -> np.ndarray:
+        return self.score_tok_ids[self.score_tok_ptr[edge_index]:self.score_tok_ptr[edge_index + 1]]
+
+    def match_terms(self, edge_index: int) -> np.ndarray:
+        return self.match_tok_ids[self.match_tok_ptr[edge_index]:self.match_tok_ptr[edge_index + 1]]
+
+
+def load_run_graph(path: pathlib.Path) -> RunGraph:
+    return RunGraph(path)
+
+
+def load_run_graph_for(run_dir: pathlib.Path) -> Optional[RunGraph]:
+    """Load <run_dir>/preprocess/run_graph.bin if present and built from the current
+    screen_nodes.json / prototype_links_enriched.json; otherwise None."""
+    pre = pathlib.Path(run_dir) / 'preprocess'
+    path = pre / GRAPH_FILE
+    if not path.exists():
+        return None
+    try:
+        g = RunGraph(path)
+    except Exception:
+        return None
+    if g.sources.get('screen_nodes') != _source_stamp(pre / 'screen_nodes.json'):
+        return None
+    if g.sources.get('links') != _source_stamp(pre / 'prototype_links_enriched.json'):
+        return None
+    return g
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile screen_nodes.json + prototype_links_enriched.json into run_graph.bin')
+    parser.add_argument('--run-dir', default=None, help='runs/<run_id> folder (uses its preprocess/ artifacts)')
+    parser.add_argument('--screen-nodes', default=None)
+    parser.add_argument('--links', default=None)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+
+    pre = pathlib.Path(args.run_dir) / 'preprocess' if args.run_dir else None
+    nodes_path = pathlib.Path(args.screen_nodes) if args.screen_nodes else (pre / 'screen_nodes.json' if pre else None)
+    links_path = pathlib.Path(args.links) if args.links else (pre / 'prototype_links_enriched.json' if pre else None)
+    if not nodes_path or not links_path:
+        raise SystemExit('Pass --run-dir or both --screen-nodes and --links')
+    out_path = pathlib.Path(args.out) if args.out else nodes_path.parent / GRAPH_FILE
+    out = compile_run_graph(nodes_path, links_path, out_path)
+    g = load_run_graph(out)
+    print(f"Wrote {out} (screens={len(g.node_ids)}, edges={len(g.edges)}, vocab={len(g.vocab)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -15,18 +15,28 @@ SCREENS_DIR = ROOT / 'figma_screens'
 
 from typing import List, Dict, Optional
 
+from warm_pool import WarmPool
+
+# Stages fork from pre-warmed interpreters (scripts/warm_pool.py); set in main()
+_warm_pool: Optional[WarmPool] = None
+
 
 def run(cmd: List[str], env: Optional[Dict] = None, verbose: bool = False, label: Optional[str] = None) -> None:
     if verbose:
         print(f"[runner] START {label or cmd[0]}:\n  cmd: {' '.join(cmd)}", flush=True)
+    if label:
+        # LLM telemetry records are attributed to the stage
+        env = dict(env if env is not None else os.environ, LLM_STAGE=label)
     t0 = time.perf_counter()
-    proc = subprocess.run(cmd, cwd=str(ROOT), env=env)
+    rc = _warm_pool.run(cmd, cwd=str(ROOT), env=env, label=label) if _warm_pool is not None else None
+    if rc is None:
+        rc = subprocess.run(cmd, cwd=str(ROOT), env=env).returncode
     dt = time.perf_counter() - t0
     if verbose:
         print(f"[runner] END   {label or cmd[0]} (took {dt:.2f}s)\n", flush=True)
-    if proc.returncode != 0:
-        print(f"[runner] ERROR: command failed with exit code {proc.returncode}")
-        sys.exit(proc.returncode)
+    if rc != 0:
+        print(f"[runner] ERROR: command failed with exit code {rc}")
+        sys.exit(rc)
 
 
 def copy_page_screens(page_name: str, out_screens_dir: pathlib.Path) -> int:
@@ -58,6 +68,7 @@ def purge_old_runs(days: int = 3, verbose: bool = False) -> int:
 
 
 def main():
+    global _warm_pool
     parser = argparse.ArgumentParser(description='One-step: export screens, nodes, links, enriched outputs into a run folder')
     parser.add_argument('--page', required=True, help='Exact Figma page name, e.g., "Arrows 2 - Interaction"')
     parser.add_argument('--figma-url', required=True, help='Figma file URL to process')
@@ -95,14 +106,16 @@ def main():
         print(f"[runner] ERROR: lock exists at {lock_path}. Another job may be using this run_dir.")
         sys.exit(1)
     lock_path.write_text(json.dumps({'pid': os.getpid(), 'created_at': time.time()}), encoding='utf-8')
+    _warm_pool = WarmPool(label='[runner] warm_pool')
 
     try:
         # 1) Export screens for the page
         env = os.environ.copy()
         env['PYTHONUNBUFFERED'] = '1'
         env['FIGMA_PAGE'] = args.page
+        env['LLM_TELEMETRY_PATH'] = str(run_dir / 'telemetry' / 'llm.jsonl')
         if verbose:
-            print('[runner] Step 1/7 - Export Figma screens', flush=True)
+            print('[runner] Step 1/11 - Export Figma screens', flush=True)
             print('  file: scripts/export_figma_screens.py', flush=True)
             print('  desc: Downloads PNGs for all top-level frames on the specified Figma page.', flush=True)
         python_cmd = os.environ.get('PYTHON', sys.executable)
@@ -118,9 +131,16 @@ def main():
         if copied == 0:
             copied = copy_page_screens(args.page, screens_out)
 
-        # 2) Analyze screens to build screen_nodes.json (writes to logs/) then copy into the run
+        # 2) Downscaled, base64-ready screen variants for every vision prompt
+        if verbose:
+            print('[runner] Step 2/11 - Prepare LLM image variants', flush=True)
+            print('  file: scripts/image_variants.py', flush=True)
+            print('  desc: Resizes and re-encodes screens into screens/.llm/ so LLM calls upload compact payloads.', flush=True)
+        run([python_cmd, 'scripts/image_variants.py', '--screens-dir', str(screens_out)], env, verbose, label='image_variants')
+
+        # 3) Analyze screens to build screen_nodes.json (writes to logs/) then copy into the run
         if verbose:
-            print('[runner] Step 2/7 - Generate screen nodes (descriptions)', flush=True)
+            print('[runner] Step 3/11 - Generate screen nodes (descriptions)', flush=True)
             print('  file: scripts/analyze_screens_generate_nodes.py', flush=True)
             print('  desc: Creates screen_nodes.json by describing each exported screen (LLM-based).', flush=True)
         run([python_cmd, 'scripts/analyze_screens_generate_nodes.py', '--screens-dir', str(screens_out), '--out', str(preprocess_dir / 'screen_nodes.json')], env, verbose, label='analyze_screens_generate_nodes')
@@ -129,9 +149,9 @@ def main():
         if not nodes_dst.exists():
             raise SystemExit('screen_nodes.json not generated by analyzer')
 
-        # 3) Extract prototype links into the run folder (preprocess)
+        # 4) Extract prototype links into the run folder (preprocess)
         if verbose:
-            print('[runner] Step 3/7 - Extract prototype links', flush=True)
+            print('[runner] Step 4/11 - Extract prototype links', flush=True)
             print('  file: scripts/extract_links.py', flush=True)
             print('  desc: Reads Figma nodes API for the page to find element→screen prototype links and deduplicates them.', flush=True)
         run([
@@ -142,11 +162,11 @@ def main():
             '--verbose'
         ], env, verbose, label='extract_links')
 
-        # 4) Enrich links using this run's nodes file and screens folder
+        # 5) Enrich links using this run's nodes file and screens folder
         protos = preprocess_dir / 'prototype_links.json'
         enriched = preprocess_dir / 'prototype_links_enriched.json'
         if verbose:
-            print('[runner] Step 4/7 - Enrich links', flush=True)
+            print('[runner] Step 5/11 - Enrich links', flush=True)
             print('  file: scripts/enrich_prototype_links.py', flush=True)
             print('  desc: Adds click_target and user_intent; uses screen images and nodes for context.', flush=True)
         run([
@@ -157,9 +177,9 @@ def main():
             '--verbose'
         ], env, verbose, label='enrich_prototype_links')
 
-        # 5) Sort and add linkId
+        # 6) Sort and add linkId
         if verbose:
-            print('[runner] Step 5/7 - Assign sorted link IDs', flush=True)
+            print('[runner] Step 6/11 - Assign sorted link IDs', flush=True)
             print('  file: scripts/sort_and_add_link_ids.py', flush=True)
             print('  desc: Sorts links deterministically and adds incremental linkId for stable referencing.', flush=True)
         run([
@@ -168,10 +188,10 @@ def main():
             '--out', str(enriched),
         ], env, verbose, label='sort_and_add_link_ids')
 
-        # 6) Annotate click targets onto screen images
+        # 7) Annotate click targets onto screen images
         annot_dir = preprocess_dir / 'annotated'
         if verbose:
-            print('[runner] Step 6/7 - Annotate screens', flush=True)
+            print('[runner] Step 7/11 - Annotate screens', flush=True)
             print('  file: scripts/annotate_click_targets.py', flush=True)
             print('  desc: Draws red dots (or blue border for wait actions) to mark click targets.', flush=True)
         run([
@@ -182,10 +202,10 @@ def main():
             '--nodes-json', str(nodes_dst),
         ], env, verbose, label='annotate_click_targets')
 
-        # 7) Build graph (image + PDF) at the end
+        # 8) Build graph (image + PDF) at the end
         graph_png = graphs_dir / 'graph_radial_colored_ids_typed_start.png'
         if verbose:
-            print('[runner] Step 7/7 - Build graph image and PDF', flush=True)
+            print('[runner] Step 8/11 - Build graph image and PDF', flush=True)
             print('  file: scripts/build_graph.py', flush=True)
             print('  desc: Generates a radial colored graph with START highlights and exports PNG+PDF.', flush=True)
         run([
@@ -199,6 +219,44 @@ def main():
         pycode = f"from PIL import Image; p=r'{graph_png}'; Image.open(p).convert('RGB').save(p.replace('.png','.pdf'), 'PDF')"
         run([python_cmd, '-c', pycode], env, verbose, label='graph_png_to_pdf')
 
+        # 9) Compile the run graph consumed by simulations and ingest
+        run_graph_path = preprocess_dir / 'run_graph.bin'
+        if verbose:
+            print('[runner] Step 9/11 - Compile run graph', flush=True)
+            print('  file: scripts/run_graph.py', flush=True)
+            print('  desc: Writes a memory-mappable graph (CSR adjacency, resolved ids, tokenized edge text).', flush=True)
+        run([
+            python_cmd, 'scripts/run_graph.py',
+            '--screen-nodes', str(nodes_dst),
+            '--links', str(enriched),
+            '--out', str(run_graph_path),
+        ], env, verbose, label='run_graph')
+
+        # 10) Perceptual-hash index for image-based source/target resolution
+        screen_hash_path = preprocess_dir / 'screen_hash.npz'
+        if verbose:
+            print('[runner] Step 10/11 - Index screen hashes', flush=True)
+            print('  file: scripts/screen_hash.py', flush=True)
+            print('  desc: Writes versioned perceptual hashes of every screen for uploaded-image matching.', flush=True)
+        run([
+            python_cmd, 'scripts/screen_hash.py',
+            '--screen-nodes', str(nodes_dst),
+            '--screens-dir', str(screens_out),
+            '--out', str(screen_hash_path),
+        ], env, verbose, label='screen_hash')
+
+        # 11) Embed link texts once for every simulation of this run
+        embeddings_path = preprocess_dir / 'embeddings.npy'
+        if verbose:
+            print('[runner] Step 11/11 - Embed link texts', flush=True)
+            print('  file: scripts/embedding_store.py', flush=True)
+            print('  desc: Batch-embeds click targets/intents into a memory-mappable matrix with a text-hash index.', flush=True)
+        run([
+            python_cmd, 'scripts/embedding_store.py',
+            '--links', str(enriched),
+            '--out', str(embeddings_path),
+        ], env, verbose, label='embedding_store')
+
         # meta + summary
         meta = {
             'page': args.page,
@@ -220,12 +278,19 @@ def main():
                 'annotated_dir': str(annot_dir),
                 'graph_png': str(graph_png),
                 'graph_pdf': str(graph_png).replace('.png', '.pdf'),
+                'run_graph': str(run_graph_path),
+                'screen_hash': str(screen_hash_path),
+                'embeddings': str(embeddings_path),
+                'llm_telemetry': str(run_dir / 'telemetry' / 'llm.jsonl'),
             }
         }
+        if _warm_pool.measure:
+            summary['warm_pool'] = _warm_pool.report()
         print(json.dumps(summary, indent=2))
         if verbose:
             print('[runner] One-step extraction complete', flush=True)
     finally:
+        _warm_pool.close()
         try:
             if lock_path.exists():
                 lock_path.unlink()
@@ -5,17 +5,23 @@ import pathlib
 import subprocess
 import os
 import sys
-import csv
+import functools
 import time
 import shutil
-from collections import Counter
 from typing import Dict, Tuple, Optional, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-from PIL import Image
 
 ROOT = pathlib.Path(__file__).resolve().parent.parent
 RUNS = ROOT / 'runs'
+# Sibling scripts are imported as libraries for in-process simulations
+if str(ROOT / 'scripts') not in sys.path:
+    sys.path.insert(0, str(ROOT / 'scripts'))
+
+from adaptive_scheduler import AdaptiveScheduler
+from fair_share import FairShareGate, FairShareScheduler
+from llm_telemetry import tests_telemetry_path
+from screen_hash import screen_hash_index_for
+from summary_aggregator import StreamingSummary, result_row
+from warm_pool import WarmPool
 
 
 # Ensure reasonable defaults for LLM calls and concurrency when not provided
@@ -26,18 +32,56 @@ def load_json(path: pathlib.Path):
     return json.loads(path.read_text(encoding='utf-8'))
 
 
-def actions_to_path(actions):
-    if not actions:
-        return ''
-    seq = []
-    first = actions[0].get('from_id')
-    if isinstance(first, int):
-        seq.append(str(first))
-    for a in actions:
-        toid = a.get('to_id')
-        if isinstance(toid, int):
-            seq.append(str(toid))
-    return ' -> '.join(seq)
+# Placeholder identity for equivalence-class template runs; fan_out_simulation
+# swaps each member's own id/name/job back in.
+PLACEHOLDER_ID = '@@persona_id@@'
+PLACEHOLDER_NAME = '@@persona_name@@'
+PLACEHOLDER_JOB = '@@persona_job@@'
+
+
+def placeholder_persona(persona: Optional[dict]) -> Optional[dict]:
+    if not persona:
+        return persona
+    out = dict(persona)
+    out['id'] = PLACEHOLDER_ID
+    if persona.get('name'):
+        out['name'] = PLACEHOLDER_NAME
+    if persona.get('job'):
+        out['job'] = PLACEHOLDER_JOB
+    return out
+
+
+def fan_out_simulation(template_dir: pathlib.Path, sim_dir: pathlib.Path, persona: Optional[dict]) -> None:
+    """Copy a placeholder-persona simulation into sim_dir as if persona had run it.
+
+    The report thoughts are sampled at random per run, so each member draws its own
+    instead of sharing the template's sample.
+    """
+    import simulate_user_traversal as sut
+    member = persona
+    persona = persona or {}
+    pid = persona.get('id')
+    name = str(persona.get('name') or '')
+    job = str(persona.get('job') or '')
+    sim_dir.mkdir(parents=True, exist_ok=True)
+    for src in sorted(template_dir.iterdir()):
+        if not src.is_file():
+            continue
+        text = src.read_text(encoding='utf-8')
+        if src.suffix in ('.json', '.jsonl'):
+            text = text.replace(f'"{PLACEHOLDER_ID}"', json.dumps(pid))
+            name_s = json.dumps(name, ensure_ascii=False)[1:-1]
+            job_s = json.dumps(job, ensure_ascii=False)[1:-1]
+        else:
+            name_s, job_s = name, job
+        text = text.replace(PLACEHOLDER_ID, str(pid)).replace(PLACEHOLDER_NAME, name_s).replace(PLACEHOLDER_JOB, job_s)
+        (sim_dir / src.name).write_text(text, encoding='utf-8')
+    report_path = sim_dir / 'user_report.json'
+    if report_path.exists():
+        report = load_json(report_path)
+        report['thoughts'] = sut.collect_thoughts(sim_dir / 'traversal_log.jsonl', member)
+        report_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        sut.write_user_report_txt(sim_dir / 'user_report.txt', report)
 
 
 def purge_old_runs(days: int = 3, verbose: bool = True) -> int:
@@ -57,25 +101,7 @@ def purge_old_runs(days: int = 3, verbose: bool = True) -> int:
     return removed
 
 
-# --- Helpers for image → screen id resolution (perceptual hash) ---
-def average_hash(path: pathlib.Path, size: int = 8) -> Optional[int]:
-    try:
-        with Image.open(path) as im:
-            im = im.convert('L').resize((size, size))
-            pixels = list(im.getdata())
-            avg = sum(pixels) / len(pixels)
-            bits = 0
-            for p in pixels:
-                bits = (bits << 1) | (1 if p >= avg else 0)
-            return bits
-    except Exception:
-        return None
-
-
-def hamming_distance(a: int, b: int) -> int:
-    return bin((a ^ b) & ((1 << 64) - 1)).count('1')
-
-
+# --- Helpers for image → screen id resolution (perceptual hash index: scripts/screen_hash.py) ---
 def build_id_to_file_maps(nodes_path: pathlib.Path) -> Tuple[Dict[int, str], Dict[str, int]]:
     """Return (id_to_file, figma_screenid_str_to_local_id)."""
     id_to_file: Dict[int, str] = {}
@@ -95,33 +121,6 @@ def build_id_to_file_maps(nodes_path: pathlib.Path) -> Tuple[Dict[int, str], Dic
     return id_to_file, figma_to_local
 
 
-def build_id_to_hash_map(screens_dir: pathlib.Path, id_to_file: Dict[int, str]) -> Dict[int, int]:
-    out: Dict[int, int] = {}
-    for sid, fname in id_to_file.items():
-        p = screens_dir / fname
-        if p.exists():
-            ah = average_hash(p)
-            if isinstance(ah, int):
-                out[int(sid)] = ah
-    return out
-
-
-def resolve_image_to_id(img_path: pathlib.Path, id_to_hash: Dict[int, int]) -> Optional[int]:
-    if not img_path or not img_path.exists():
-        return None
-    ah = average_hash(img_path)
-    if not isinstance(ah, int) or not id_to_hash:
-        return None
-    best_sid = None
-    best_d = 1 << 30
-    for sid, h in id_to_hash.items():
-        d = hamming_distance(ah, h)
-        if d < best_d:
-            best_d = d
-            best_sid = sid
-    return best_sid
-
-
 def main():
     p = argparse.ArgumentParser(description='Run all personas in-place under a base run folder and write persona_summary.json/csv')
     p.add_argument('--run-dir', required=True, help='Base runs/<run_id> folder')
@@ -135,13 +134,25 @@ def main():
     p.add_argument('--target-image', required=False)
     p.add_argument('--goal', required=True)
     p.add_argument('--max-minutes', default='2')
+    p.add_argument('--virtual-clock', action='store_true', help='Run simulations on a virtual clock (no real sleeps for dwell/wait pauses)')
+    p.add_argument('--owner', default=os.getenv('TESTS_OWNER', ''), help='Owner id for host-wide fair-share quotas')
+    p.add_argument('--priority', default=os.getenv('TESTS_PRIORITY', 'interactive'), choices=['interactive', 'bulk'], help='Fair-share priority class')
+    p.add_argument('--test-run-id', default=None, help='Id of this test run; names its LLM telemetry file (default: start timestamp)')
     args = p.parse_args()
 
+    if args.virtual_clock:
+        # Propagates to simulate_user_traversal.py children
+        os.environ['SIM_VIRTUAL_CLOCK'] = '1'
+
     purge_old_runs(days=3, verbose=True)
 
     run_dir = pathlib.Path(args.run_dir)
     tests_root = run_dir / 'tests'
     tests_root.mkdir(parents=True, exist_ok=True)
+    # LLM calls of in-process journeys and subprocess simulations go to this test run's own
+    # telemetry file (test runs of a project share run_dir with preprocess and each other)
+    os.environ['LLM_TELEMETRY_PATH'] = str(tests_telemetry_path(run_dir, args.test_run_id or time.strftime('%Y%m%d_%H%M%S')))
+    os.environ.setdefault('LLM_STAGE', 'tests')
     personas = load_json(pathlib.Path(args.persona_json))
     plan = None
     if args.persona_plan:
@@ -157,7 +168,6 @@ def main():
         sys.exit(2)
 
     # If a resolved server-side plan exists, iterate that; else fall back to persona.json ids
-    results = []
     # Require explicit persona plan; if empty or missing, fail fast (no fallback)
     if args.persona_plan:
         if not plan or not isinstance(plan.get('personas'), list) or len(plan.get('personas') or []) == 0:
@@ -178,12 +188,16 @@ def main():
             print('Missing preprocess artifacts (screen_nodes.json, prototype_links_enriched.json, screens/) in run_dir', file=sys.stderr)
             sys.exit(2)
         id_to_file, figma_to_local = build_id_to_file_maps(nodes_path)
-        id_to_hash = build_id_to_hash_map(screens_dir, id_to_file)
-        # Resolve source/target numeric ids from uploaded images
-        src_id_resolved = resolve_image_to_id(pathlib.Path(args.source_image), id_to_hash)
-        tgt_id_resolved = resolve_image_to_id(pathlib.Path(args.target_image), id_to_hash)
+        screen_hashes = screen_hash_index_for(run_dir, id_to_file)
+        # Resolve source/target numeric ids from uploaded images; far-off or ambiguous
+        # matches fail here with their candidates rather than running the whole batch
+        src_match = screen_hashes.match(pathlib.Path(args.source_image))
+        tgt_match = screen_hashes.match(pathlib.Path(args.target_image))
+        src_id_resolved = src_match.get('screen_id')
+        tgt_id_resolved = tgt_match.get('screen_id')
         if not isinstance(src_id_resolved, int) or not isinstance(tgt_id_resolved, int):
             print('Could not resolve source/target images to known screens', file=sys.stderr)
+            print(json.dumps({'source': src_match, 'target': tgt_match}, ensure_ascii=False, indent=2), file=sys.stderr)
             sys.exit(2)
 
     # Global parallelization across all personas
@@ -221,12 +235,6 @@ def main():
         persona_folder.mkdir(parents=True, exist_ok=True)
         sims_root = persona_folder / 'simulations'
         sims_root.mkdir(parents=True, exist_ok=True)
-        before_set = set()
-        try:
-            if sims_root.exists():
-                before_set = {d.name for d in sims_root.iterdir() if d.is_dir()}
-        except Exception:
-            before_set = set()
         user_ids: list[int] = []
         try:
             for rp in (resolved.get('personas') or []):
@@ -239,29 +247,77 @@ def main():
         for i in range(run_count):
             resolved_uid = (user_ids[i] if i < len(user_ids) else None)
             jobs.append((pid, name, i, resolved_uid))
-        persona_meta[pid] = {'name': name, 'folder': persona_folder, 'sims_root': sims_root, 'before_set': before_set}
+        persona_meta[pid] = {'name': name, 'folder': persona_folder, 'sims_root': sims_root}
+
+    # In-process mode (default): load the run graph, personas and model clients once and run
+    # every persona-user as a thread in this process instead of one interpreter per user.
+    # TESTS_IN_PROCESS=0 restores one subprocess per simulation.
+    journey_ctx = None
+    traversal_ctx = None
+    dsf = None
+    sut = None
+    users_path = ROOT / 'users' / 'users.json'
+    model_name = os.getenv('MODEL_NAME', 'gemini-2.5-pro')
+    if os.getenv('TESTS_IN_PROCESS', '1').strip().lower() not in {'0', 'false', 'no', 'off'}:
+        try:
+            if use_images:
+                import describe_screen_first_person as dsf
+                dsf.load_dotenv()
+                journey_ctx = dsf.load_journey_context(nodes_path, links_path, screens_dir)
+            else:
+                import simulate_user_traversal as sut
+                traversal_ctx = sut.load_traversal_context(run_dir)
+        except (Exception, SystemExit) as e:
+            print(f'[persona_runner] In-process mode unavailable, using subprocesses: {e}', file=sys.stderr)
+            journey_ctx = None
+            traversal_ctx = None
+
+    # Subprocess mode: fork simulations from pre-warmed interpreters where possible
+    warm_pool = WarmPool(label='[persona_runner] warm_pool') if journey_ctx is None and traversal_ctx is None else None
+
+    def _run_cmd(cmd: List[str], label: str) -> None:
+        rc = warm_pool.run(cmd, cwd=os.getcwd(), label=label) if warm_pool is not None else None
+        if rc is None:
+            subprocess.run(cmd, check=True)
+        elif rc != 0:
+            raise subprocess.CalledProcessError(rc, cmd)
 
-    def _run_one_global(pid: int, name: str, index: int, resolved_uid_inner: Optional[int]) -> None:
+    def _run_one_global(pid: int, name: str, index: int, resolved_uid_inner: Optional[int]) -> List[tuple]:
         persona_id_for_sim = int(resolved_uid_inner) if isinstance(resolved_uid_inner, int) else int(pid)
         sims_root_local = persona_meta[pid]['sims_root']
         sim_dir_local = sims_root_local / f"{time.strftime('%Y%m%d_%H%M%S')}_{pid}_{index:02d}"
         sim_dir_local.mkdir(parents=True, exist_ok=True)
         if use_images:
             out_path = sim_dir_local / 'journey.json'
-            cmd = [
-                sys.executable, str(ROOT / 'scripts' / 'describe_screen_first_person.py'),
-                '--source-screen-id', str(src_id_resolved),
-                '--target-screen-id', str(tgt_id_resolved),
-                '--screen-nodes', str(nodes_path),
-                '--screens-dir', str(screens_dir),
-                '--links-json', str(links_path),
-                '--user-id', str(persona_id_for_sim),
-                '--goal', args.goal,
-                '--out', str(out_path),
-            ]
-            print('Running:', ' '.join(cmd))
-            subprocess.run(cmd, check=True)
-            j = load_json(out_path)
+            if journey_ctx is not None:
+                persona_user = dsf.load_user_by_id(users_path, persona_id_for_sim)
+                j = dsf.run_journey(
+                    journey_ctx,
+                    source_screen_id=int(src_id_resolved),
+                    target_screen_id=int(tgt_id_resolved),
+                    goal=args.goal,
+                    persona_user=persona_user,
+                    model_name=model_name,
+                    stream_log=sim_dir_local / 'journey.jsonl',
+                )
+                if persona_user:
+                    j['persona_user'] = persona_user
+                out_path.write_text(json.dumps(j, ensure_ascii=False, indent=2), encoding='utf-8')
+            else:
+                cmd = [
+                    sys.executable, str(ROOT / 'scripts' / 'describe_screen_first_person.py'),
+                    '--source-screen-id', str(src_id_resolved),
+                    '--target-screen-id', str(tgt_id_resolved),
+                    '--screen-nodes', str(nodes_path),
+                    '--screens-dir', str(screens_dir),
+                    '--links-json', str(links_path),
+                    '--user-id', str(persona_id_for_sim),
+                    '--goal', args.goal,
+                    '--out', str(out_path),
+                ]
+                print('Running:', ' '.join(cmd))
+                _run_cmd(cmd, sim_dir_local.name)
+                j = load_json(out_path)
             steps_local: List[dict] = list(j.get('journey') or [])
 
             # Build traversal_log.jsonl with typed events and timestamps synthesized from time_on_screen
@@ -353,6 +409,17 @@ def main():
             }
             (sim_dir_local / 'user_report.json').write_text(json.dumps(report_local, ensure_ascii=False, indent=2), encoding='utf-8')
             (sim_dir_local / 'path.json').write_text(json.dumps({'screens': path_ids_local}, ensure_ascii=False, indent=2), encoding='utf-8')
+            return [(pid, result_row(pid, name, sim_dir_local, report_local))]
+        elif traversal_ctx is not None:
+            sut.run_traversal(
+                traversal_ctx,
+                sim_dir=sim_dir_local,
+                goal=args.goal,
+                source_id=int(args.source_id),
+                target_id=int(args.target_id),
+                persona=sut.find_persona(personas, persona_id_for_sim),
+                max_minutes=float(args.max_minutes),
+            )
         else:
             cmd = [
                 sys.executable, str(ROOT / 'scripts' / 'simulate_user_traversal.py'),
@@ -361,27 +428,111 @@ def main():
                 '--persona-json', str(pathlib.Path(args.persona_json)),
                 '--persona-id', str(persona_id_for_sim),
                 '--persona-folder-name', f'tests/persona_{pid}',
+                '--sim-dir', str(sim_dir_local),
                 '--max-minutes', str(args.max_minutes),
                 '--append',
                 '--source-id', str(args.source_id), '--target-id', str(args.target_id)
             ]
             print('Running:', ' '.join(cmd))
-            subprocess.run(cmd, check=True)
+            _run_cmd(cmd, sim_dir_local.name)
+        return [(pid, result_row(pid, name, sim_dir_local))]
 
-    # Execute all persona-user jobs globally
-    # Respect TESTS_MAX_WORKERS for accuracy‑neutral speedups; default higher to improve throughput
-    max_workers = int(os.getenv('TESTS_MAX_WORKERS', '16'))
+    def _run_class(class_idx: int, members: List[tuple]) -> List[tuple]:
+        # Simulate once under a placeholder identity, then give every member its own copy
+        staging = tests_root / f'.equivalence_{class_idx:04d}'
+        shutil.rmtree(staging, ignore_errors=True)
+        try:
+            sut.run_traversal(
+                traversal_ctx,
+                sim_dir=staging,
+                goal=args.goal,
+                source_id=int(args.source_id),
+                target_id=int(args.target_id),
+                persona=placeholder_persona(members[0][1]),
+                max_minutes=float(args.max_minutes),
+            )
+            rows = []
+            for (pid, name, index, _uid), persona_member in members:
+                sim_dir_local = persona_meta[pid]['sims_root'] / f"{time.strftime('%Y%m%d_%H%M%S')}_{pid}_{index:02d}"
+                fan_out_simulation(staging, sim_dir_local, persona_member)
+                rows.append((pid, result_row(pid, name, sim_dir_local)))
+            return rows
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    # Equivalence classes (in-process id mode): every job shares goal, source, target and
+    # max_minutes, so persona-users with the same persona_equivalence_key walk identical
+    # traversals. Each class runs once and fans out; singletons and exploring personas
+    # (random edge choice) run individually. TESTS_EQUIVALENCE_CLASSES=0 disables this.
+    singles: List[tuple] = list(jobs)
+    classes: Dict[tuple, List[tuple]] = {}
+    if traversal_ctx is not None and os.getenv('TESTS_EQUIVALENCE_CLASSES', '1').strip().lower() not in {'0', 'false', 'no', 'off'}:
+        singles = []
+        for job in jobs:
+            persona_job = sut.find_persona(personas, int(job[3]) if isinstance(job[3], int) else int(job[0]))
+            key = sut.persona_equivalence_key(persona_job)
+            if key is None:
+                singles.append(job)
+            else:
+                classes.setdefault(key, []).append((job, persona_job))
+        for key in [k for k, members in classes.items() if len(members) == 1]:
+            singles.append(classes.pop(key)[0][0])
+        if classes:
+            print(f"[persona_runner] {sum(len(m) for m in classes.values())} users in {len(classes)} equivalence classes, {len(singles)} run individually")
+
+    # Execute all persona-user jobs globally, interleaved across persona slots (user 0 of
+    # every slot first, then user 1, ...) so each persona gets partial results early.
+    # Concurrency adapts to CPU load, free memory and LLM 429s (scripts/adaptive_scheduler.py).
+    slot_order = {int(pr.get('id')): n for n, pr in enumerate(persona_iter)}
+    units: List[tuple] = []
+    for job in singles:
+        units.append(((job[2], slot_order.get(job[0], 0)), [job], functools.partial(_run_one_global, *job)))
+    for class_idx, members in enumerate(classes.values()):
+        class_jobs = [job for job, _ in members]
+        units.append((min((j[2], slot_order.get(j[0], 0)) for j in class_jobs), class_jobs, functools.partial(_run_class, class_idx, members)))
+    units.sort(key=lambda u: u[0])
+    rate_limit_probe = (lambda: dsf.llm_call_stats().get('rate_limited', 0)) if journey_ctx is not None else None
+    # Host-wide fair share (scripts/fair_share.py): every job takes a lease shared with other
+    # concurrent test runs; TESTS_FAIR_SHARE=0 runs ungated.
+    fair_share = None
+    gate = None
+    fair_run_id = f"{run_dir.name}:{os.getpid()}"
+    if os.getenv('TESTS_FAIR_SHARE', '1').strip().lower() not in {'0', 'false', 'no', 'off'}:
+        try:
+            fair_share = FairShareScheduler(RUNS)
+            fair_share.register(fair_run_id, owner=args.owner, priority=args.priority, total=len(units))
+            gate = FairShareGate(fair_share, fair_run_id)
+        except Exception as e:
+            print(f'[persona_runner] Fair-share scheduling unavailable, running ungated: {e}', file=sys.stderr)
+            fair_share = None
+    scheduler = AdaptiveScheduler.from_env(rate_limit_probe=rate_limit_probe, label='[persona_runner]', gate=gate)
+    print(f"[persona_runner] {len(units)} jobs, starting with {scheduler.target} workers (max {scheduler.max_workers})")
+    # Finished jobs stream their result rows into the summaries (rewritten atomically while running)
+    summary = StreamingSummary(
+        run_dir, tests_root, [(pid, meta['name']) for pid, meta in persona_meta.items()],
+        source_id=(args.source_id if not use_images else ''),
+        target_id=(args.target_id if not use_images else ''),
+        expected=len(jobs),
+    )
     errors: list[tuple[tuple[int,str,int,Optional[int]], BaseException]] = []
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        futs = {ex.submit(_run_one_global, pid, name, idx, uid): (pid, name, idx, uid) for (pid, name, idx, uid) in jobs}
-        for fut in as_completed(futs):
-            exc = fut.exception()
+    try:
+        for unit_jobs, rows, exc in scheduler.run((u[1], u[2]) for u in units):
             if exc:
                 # collect but do not abort other jobs
-                errors.append((futs[fut], exc))
-                print(f"Job failed but continuing pid={futs[fut][0]} idx={futs[fut][2]}: {exc}", file=sys.stderr)
-
-    # After all jobs complete, build persona-level summaries and results
+                for job in unit_jobs:
+                    errors.append((job, exc))
+                    print(f"Job failed but continuing pid={job[0]} idx={job[2]}: {exc}", file=sys.stderr)
+                continue
+            for pid_done, row in rows or []:
+                summary.add(pid_done, row)
+    finally:
+        if fair_share is not None:
+            try:
+                fair_share.unregister(fair_run_id)
+            except Exception:
+                pass
+
+    # After all jobs complete, record failures and write the final summaries
     if errors:
         # Log a summary of failures; overall process continues to write summaries for successes
         try:
@@ -391,167 +542,13 @@ def main():
             ], ensure_ascii=False, indent=2), encoding='utf-8')
         except Exception:
             pass
-    results: List[dict] = []
-    for pid, meta in persona_meta.items():
-        name = meta['name']
-        sims_root = meta['sims_root']
-        before_set = meta['before_set']
-        new_dirs = []
-        try:
-            current = {d.name for d in sims_root.iterdir() if d.is_dir()}
-            new_dirs = [sims_root / d for d in sorted(current - before_set)]
-        except Exception:
-            new_dirs = []
-        persona_results: List[dict] = []
-        for simdir in new_dirs:
-            rpt = simdir / 'user_report.json'
-            if rpt.exists():
-                data = load_json(rpt)
-                rpt_path = simdir / 'user_report.txt'
-                if rpt_path.exists():
-                    try:
-                        data['user_report_text'] = rpt_path.read_text(encoding='utf-8')
-                    except Exception:
-                        data['user_report_text'] = ''
-                data['sim_dir'] = str(simdir)
-                sim_persona = (data.get('persona') or {}) if isinstance(data.get('persona'), dict) else {}
-                user_id = sim_persona.get('id') if sim_persona else None
-                row = {'persona_id': pid, 'persona_name': name, 'user_id': user_id, **data}
-                persona_results.append(row)
-                results.append(row)
-        try:
-            p_total = len(persona_results)
-            p_completed = sum(1 for r in persona_results if r.get('status') == 'completed')
-            p_completion_rate = round((p_completed / p_total) * 100.0, 2) if p_total else 0.0
-            p_avg_steps = round(sum(r.get('steps') or 0 for r in persona_results) / p_total, 2) if p_total else 0.0
-            p_summary = {
-                'persona_id': pid,
-                'persona_name': name,
-                'runs': persona_results,
-                'aggregate': {
-                    'completed_total': p_completed,
-                    'total': p_total,
-                    'completion_rate_pct': p_completion_rate,
-                    'avg_steps': p_avg_steps,
-                }
-            }
-            (tests_root / f'persona_{pid}' / 'summary.json').write_text(json.dumps(p_summary, ensure_ascii=False, indent=2), encoding='utf-8')
-        except Exception:
-            pass
-
-    # Aggregate summary
-    total = len(results)
-    completed = sum(1 for r in results if r.get('status') == 'completed')
-    completion_rate = round((completed / total) * 100.0, 2) if total else 0.0
-    avg_steps = round(sum(r.get('steps') or 0 for r in results) / total, 2) if total else 0.0
-    avg_time = round(sum(r.get('time_sec') or 0.0 for r in results) / total, 2) if total else 0.0
-
-    friction_counter = Counter()
-    screen_counter = Counter()
-    feedback_counter = Counter()
-    not_completed = []
-
-    for r in results:
-        for fp in (r.get('friction_points') or []):
-            ftype = fp.get('type') or 'unknown'
-            friction_counter[ftype] += 1
-            sid = fp.get('screen_id')
-            if isinstance(sid, int):
-                screen_counter[sid] += 1
-        for fb in (r.get('feedback') or []):
-            feedback_counter[fb] += 1
-        if r.get('status') != 'completed':
-            reason = (r.get('drop_off_points') or [{}])[-1].get('reason') if (r.get('drop_off_points') or []) else 'unknown'
-            not_completed.append({'persona_id': r.get('persona_id'), 'persona_name': r.get('persona_name'), 'reason': reason})
-
-    top_friction = friction_counter.most_common(5)
-    top_feedback = feedback_counter.most_common(5)
-    top_screens = screen_counter.most_common(5)
-
-    aggregate = {
-        'personas_total': total,
-        'completed_total': completed,
-        'completion_rate_pct': completion_rate,
-        'avg_steps': avg_steps,
-        'avg_time_sec': avg_time,
-        'top_friction_types': [{'type': t, 'count': c} for (t, c) in top_friction],
-        'top_feedback': [{'text': t, 'count': c} for (t, c) in top_feedback],
-        'top_friction_screens': [{'screen_id': sid, 'count': c} for (sid, c) in top_screens],
-        'not_completed': not_completed,
-        'major_findings': {
-            'crux': 'Focus on clarifying primary CTAs, reducing ambiguity and auto-advance confusion, and avoiding loops; consider progress cues and shorter paths.',
-            'themes': [
-                'Make primary next actions visually dominant and consistently labeled',
-                'Provide progress indicators / reduce auto-advance ambiguity',
-                'Prevent loops via clearer hierarchy and guardrails',
-                'Shorten the critical path where possible'
-            ]
-        }
-    }
-
-    # write persona_summary.json at tests root
+    summary.finish()
+    if warm_pool is not None:
+        if warm_pool.measure:
+            warm_pool.report()
+        warm_pool.close()
     summary_json = tests_root / 'persona_summary.json'
-    summary = {'run_dir': str(run_dir), 'results': results, 'aggregate': aggregate}
-    summary_json.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding='utf-8')
-
-    # write persona_summary.csv at tests root
     csv_path = tests_root / 'persona_summary.csv'
-    fieldnames = [
-        'persona_id', 'persona_name', 'status', 'steps', 'time_sec', 'source_id', 'target_id',
-        'friction_count', 'dropoff_count', 'feedback_count', 'friction_types', 'dropoff_reasons', 'actions_path', 'user_report_text', 'sim_dir'
-    ]
-    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        for r in results:
-            frictions = r.get('friction_points') or []
-            friction_types = sorted({fp.get('type') or 'unknown' for fp in frictions})
-            dropoffs = r.get('drop_off_points') or []
-            drop_reasons = sorted({dp.get('reason') or '' for dp in dropoffs if dp})
-            path_seq = actions_to_path(r.get('actions') or [])
-            row = {
-                'persona_id': r.get('persona_id') or (r.get('persona') or {}).get('id'),
-                'persona_name': r.get('persona_name') or (r.get('persona') or {}).get('name'),
-                'status': r.get('status'),
-                'steps': r.get('steps'),
-                'time_sec': r.get('time_sec'),
-                'source_id': r.get('source_id'),
-                'target_id': r.get('target_id'),
-                'friction_count': len(frictions),
-                'dropoff_count': len(dropoffs),
-                'feedback_count': len(r.get('feedback') or []),
-                'friction_types': '; '.join(friction_types),
-                'dropoff_reasons': '; '.join(drop_reasons),
-                'actions_path': path_seq,
-                'user_report_text': r.get('user_report_text') or '',
-                'sim_dir': r.get('sim_dir') or '',
-            }
-            w.writerow(row)
-        summary_text = (
-            f"Completion: {completed}/{total} ({completion_rate}%). "
-            f"Avg steps: {avg_steps}, Avg time: {avg_time}s. "
-            f"Top frictions: " + ', '.join(f"{t}:{c}" for (t, c) in top_friction) + ". "
-            f"Top feedback: " + ' | '.join(f"{t}:{c}" for (t, c) in top_feedback) + ". "
-            f"Themes: " + ' | '.join(aggregate.get('major_findings', {}).get('themes', []))
-        )
-        w.writerow({
-            'persona_id': 'ALL',
-            'persona_name': 'SUMMARY',
-            'status': f'{completed}/{total} completed ({completion_rate}%)',
-            'steps': avg_steps,
-            'time_sec': avg_time,
-            'source_id': args.source_id if not use_images else '',
-            'target_id': args.target_id if not use_images else '',
-            'friction_count': sum(len(r.get('friction_points') or []) for r in results),
-            'dropoff_count': sum(len(r.get('drop_off_points') or []) for r in results),
-            'feedback_count': sum(len(r.get('feedback') or []) for r in results),
-            'friction_types': '; '.join(f"{t}:{c}" for (t, c) in top_friction),
-            'dropoff_reasons': '; '.join(sorted({(r.get('drop_off_points') or [{}])[-1].get('reason') or '' for r in results if (r.get('drop_off_points') or [])})),
-            'actions_path': '',
-            'user_report_text': summary_text,
-            'sim_dir': 'TopScreens: ' + ' | '.join(f"{sid}:{c}" for (sid, c) in top_screens),
-        })
-
     print('Wrote:', summary_json)
     print('Wrote:', csv_path)
 
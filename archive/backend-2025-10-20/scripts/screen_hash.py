@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Perceptual-hash index of a run's screens, used to resolve uploaded source/target
+images to screen ids.
+
+Output (default: <run-dir>/preprocess/screen_hash.npz), a NumPy archive with:
+- version: HASH_VERSION of the hash definitions below
+- ids / files: screen ids and their PNG file names (screens/)
+- size / mtime_ns: file stamps used to detect stale entries
+- ahash / dhash / phash: uint64 perceptual hashes
+
+Canonical hashes (grayscale, bilinear resize, row-major, first bit = MSB):
+- aHash: 8x8, pixel >= mean
+- dHash: 9x8, pixel > its left neighbour
+- pHash: 32x32 DCT-II, top-left 8x8 coefficients > their median (DC excluded)
+
+Matching uses the sum of the three Hamming distances (0..192), which is a metric,
+so the index is searched with a BK-tree. A match carries top-k candidates and a
+confidence from the margin between the best and second-best distance; uploads
+that are far from every screen or close to several are reported as ambiguous
+instead of silently resolving to the nearest screen.
+"""
+
+import argparse
+import heapq
+import json
+import os
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+HASH_FILE = 'screen_hash.npz'
+HASH_VERSION = 2
+HASH_BITS = 64
+MAX_COMBINED_DISTANCE = 3 * HASH_BITS
+
+# Acceptance thresholds for a unique match (env overrides)
+MAX_MATCH_DISTANCE = int(os.getenv('SCREEN_MATCH_MAX_DISTANCE', '48'))
+MIN_MATCH_CONFIDENCE = float(os.getenv('SCREEN_MATCH_MIN_CONFIDENCE', '0.2'))
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0, :] = np.sqrt(1.0 / n)
+    return m
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    """(N, 64) booleans -> (N,) uint64, first bit most significant."""
+    packed = np.packbits(bits.reshape(bits.shape[0], HASH_BITS).astype(np.uint8), axis=1)
+    return packed.view('>u8').ravel().astype(np.uint64)
+
+
+def _load_planes(path: pathlib.Path) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    try:
+        with Image.open(path) as im:
+            g = im.convert('L')
+            return (
+                np.asarray(g.resize((8, 8), Image.BILINEAR), dtype=np.float64),
+                np.asarray(g.resize((9, 8), Image.BILINEAR), dtype=np.float64),
+                np.asarray(g.resize((32, 32), Image.BILINEAR), dtype=np.float64),
+            )
+    except Exception:
+        return None
+
+
+def hash_planes(a8: np.ndarray, d9: np.ndarray, p32: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized (aHash, dHash, pHash) over stacks of (N,8,8), (N,8,9) and (N,32,32) planes."""
+    n = a8.shape[0]
+    ah = _pack(a8.reshape(n, -1) >= a8.reshape(n, -1).mean(axis=1, keepdims=True))
+    dh = _pack(d9[:, :, 1:] > d9[:, :, :-1])
+    low = (_DCT32 @ p32 @ _DCT32.T)[:, :8, :8].reshape(n, -1)
+    ph = _pack(low > np.median(low[:, 1:], axis=1, keepdims=True))
+    return ah, dh, ph
+
+
+def image_hashes(path: pathlib.Path) -> Optional[Tuple[int, int, int]]:
+    """(aHash, dHash, pHash) of an image file; None when it cannot be read."""
+    planes = _load_planes(pathlib.Path(path))
+    if planes is None:
+        return None
+    ah, dh, ph = hash_planes(*(p[None] for p in planes))
+    return int(ah[0]), int(dh[0]), int(ph[0])
+
+
+def combined_distance(a: Tuple[int, int, int], b: Tuple[int, int, int]) -> int:
+    return (a[0] ^ b[0]).bit_count() + (a[1] ^ b[1]).bit_count() + (a[2] ^ b[2]).bit_count()
+
+
+class BKTree:
+    """BK-tree over hash triples under combined_distance; nodes are row indices."""
+
+    def __init__(self, keys: List[Tuple[int, int, int]]):
+        self.keys = keys
+        self.children: List[Dict[int, int]] = [{} for _ in keys]
+        for i in range(1, len(keys)):
+            node = 0
+            while True:
+                d = combined_distance(keys[i], keys[node])
+                nxt = self.children[node].get(d)
+                if nxt is None:
+                    self.children[node][d] = i
+                    break
+                node = nxt
+
+    def nearest(self, key: Tuple[int, int, int], k: int = 5) -> List[Tuple[int, int]]:
+        """k closest rows as (distance, row), ties broken by lower row."""
+        if not self.keys or k <= 0:
+            return []
+        best: List[Tuple[int, int]] = []  # max-heap of (-distance, -row)
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            d = combined_distance(key, self.keys[node])
+            if len(best) < k:
+                heapq.heappush(best, (-d, -node))
+            elif (d, node) < (-best[0][0], -best[0][1]):
+                heapq.heapreplace(best, (-d, -node))
+            radius = -best[0][0] if len(best) == k else MAX_COMBINED_DISTANCE
+            for edge, child in self.children[node].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        return sorted((-nd, -nr) for nd, nr in best)
+
+
+def _stamp(path: pathlib.Path) -> Tuple[int, int]:
+    try:
+        st = path.stat()
+        return int(st.st_size), int(st.st_mtime_ns)
+    except Exception:
+        return -1, -1
+
+
+class ScreenHashIndex:
+    def __init__(self, ids: np.ndarray, files: List[str], ahash: np.ndarray, dhash: np.ndarray, phash: np.ndarray, size: np.ndarray, mtime_ns: np.ndarray):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.files = list(files)
+        self.ahash = np.asarray(ahash, dtype=np.uint64)
+        self.dhash = np.asarray(dhash, dtype=np.uint64)
+        self.phash = np.asarray(phash, dtype=np.uint64)
+        self.size = np.asarray(size, dtype=np.int64)
+        self.mtime_ns = np.asarray(mtime_ns, dtype=np.int64)
+        self._tree: Optional[BKTree] = None
+
+    def __len__(self) -> int:
+        return int(self.ids.size)
+
+    @property
+    def tree(self) -> BKTree:
+        if self._tree is None:
+            self._tree = BKTree(list(zip(self.ahash.tolist(), self.dhash.tolist(), self.phash.tolist())))
+        return self._tree
+
+    def match_hashes(self, key: Tuple[int, int, int], k: int = 5) -> Dict[str, Any]:
+        """Top-k candidates for a hash triple plus the accepted screen id, if any.
+
+        confidence = (d2 - d1) / (d2 + d1) for best/second-best distances (1.0 when
+        the best is exact and unique, 0.0 when two screens tie); 0.0 beyond
+        MAX_MATCH_DISTANCE. screen_id is set only when confidence >= MIN_MATCH_CONFIDENCE.
+        """
+        hits = self.tree.nearest(key, max(2, k))
+        candidates = [
+            {
+                'screen_id': int(self.ids[row]),
+                'file': self.files[row],
+                'distance': int(d),
+                'similarity': round(1.0 - d / MAX_COMBINED_DISTANCE, 4),
+            }
+            for d, row in hits
+        ]
+        if not candidates:
+            return {'screen_id': None, 'distance': None, 'confidence': 0.0, 'ambiguous': False, 'candidates': []}
+        d1 = candidates[0]['distance']
+        d2 = candidates[1]['distance'] if len(candidates) > 1 else MAX_COMBINED_DISTANCE
+        confidence = 0.0
+        if d1 <= MAX_MATCH_DISTANCE:
+            confidence = (d2 - d1) / float(d2 + d1 or 1)
+        accepted = confidence >= MIN_MATCH_CONFIDENCE
+        return {
+            'screen_id': candidates[0]['screen_id'] if accepted else None,
+            'distance': d1,
+            'confidence': round(confidence, 4),
+            'ambiguous': not accepted,
+            'candidates': candidates[:k],
+        }
+
+    def match(self, image_path: pathlib.Path, k: int = 5) -> Dict[str, Any]:
+        key = image_hashes(image_path) if pathlib.Path(image_path).exists() else None
+        if key is None:
+            return {'screen_id': None, 'distance': None, 'confidence': 0.0, 'ambiguous': False, 'candidates': [], 'error': 'unreadable image'}
+        return self.match_hashes(key, k)
+
+    def match_image(self, image_path: pathlib.Path) -> Optional[int]:
+        """Screen id of a confident match; None when unreadable, far off or ambiguous."""
+        return self.match(image_path)['screen_id']
+
+    def is_current(self, screens_dir: pathlib.Path, id_to_file: Dict[int, str]) -> bool:
+        """True when the index covers exactly the hashable screens of id_to_file, unchanged on disk."""
+        indexed = dict(zip(self.ids.tolist(), self.files))
+        for sid, fname in id_to_file.items():
+            if int(sid) not in indexed and (screens_dir / fname).exists():
+                return False
+        for i, sid in enumerate(self.ids.tolist()):
+            if id_to_file.get(sid) != self.files[i]:
+                return False
+            if _stamp(screens_dir / self.files[i]) != (int(self.size[i]), int(self.mtime_ns[i])):
+                return False
+        return True
+
+    def save(self, path: pathlib.Path) -> pathlib.Path:
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f,
+                version=np.int64(HASH_VERSION),
+                ids=self.ids,
+                files=np.asarray(self.files, dtype=str),
+                size=self.size,
+                mtime_ns=self.mtime_ns,
+                ahash=self.ahash,
+                dhash=self.dhash,
+                phash=self.phash,
+            )
+        os.replace(tmp, path)
+        return path
+
+
+def build_screen_hash_index(screens_dir: pathlib.Path, id_to_file: Dict[int, str], max_workers: int = 8) -> ScreenHashIndex:
+    """Hash every existing screen of id_to_file: decode/resize in threads (PIL releases
+    the GIL), then compute all three hashes over the stacked planes at once."""
+    screens_dir = pathlib.Path(screens_dir)
+    items = sorted((int(sid), str(fname)) for sid, fname in id_to_file.items() if fname and (screens_dir / fname).exists())
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as ex:
+        planes = list(ex.map(lambda it: _load_planes(screens_dir / it[1]), items))
+    keep = [(it, pl) for it, pl in zip(items, planes) if pl is not None]
+    if keep:
+        ah, dh, ph = hash_planes(*(np.stack([pl[j] for _, pl in keep]) for j in range(3)))
+    else:
+        ah = dh = ph = np.zeros(0, dtype=np.uint64)
+    stamps = [_stamp(screens_dir / it[1]) for it, _ in keep]
+    return ScreenHashIndex(
+        ids=np.array([it[0] for it, _ in keep], dtype=np.int64),
+        files=[it[1] for it, _ in keep],
+        ahash=ah,
+        dhash=dh,
+        phash=ph,
+        size=np.array([s for s, _ in stamps], dtype=np.int64),
+        mtime_ns=np.array([m for _, m in stamps], dtype=np.int64),
+    )
+
+
+def load_screen_hash_index(path: pathlib.Path) -> ScreenHashIndex:
+    with np.load(pathlib.Path(path), allow_pickle=False) as z:
+        version = int(z['version'])
+        if version != HASH_VERSION:
+            raise ValueError(f'unsupported screen hash version {version} (expected {HASH_VERSION})')
+        return ScreenHashIndex(z['ids'], [str(f) for f in z['files'].tolist()], z['ahash'], z['dhash'], z['phash'], z['size'], z['mtime_ns'])
+
+
+def id_to_file_from_nodes(nodes_path: pathlib.Path) -> Dict[int, str]:
+    out: Dict[int, str] = {}
+    for n in json.loads(pathlib.Path(nodes_path).read_text(encoding='utf-8')) or []:
+        try:
+            sid = int(n.get('id'))
+        except Exception:
+            continue
+        fname = str(n.get('file') or '')
+        if fname:
+            out[sid] = fname
+    return out
+
+
+def screen_hash_index_for(run_dir: pathlib.Path, id_to_file: Optional[Dict[int, str]] = None) -> ScreenHashIndex:
+    """Load <run_dir>/preprocess/screen_hash.npz when current; otherwise rebuild and
+    persist it (best effort) so later workers can load it."""
+    pre = pathlib.Path(run_dir) / 'preprocess'
+    screens_dir = pre / 'screens'
+    path = pre / HASH_FILE
+    if id_to_file is None:
+        id_to_file = id_to_file_from_nodes(pre / 'screen_nodes.json')
+    if path.exists():
+        try:
+            idx = load_screen_hash_index(path)
+            if idx.is_current(screens_dir, id_to_file):
+                return idx
+        except Exception:
+            pass
+    idx = build_screen_hash_index(screens_dir, id_to_file)
+    try:
+        idx.save(path)
+    except Exception:
+        pass
+    return idx
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the perceptual-hash index (screen_hash.npz) for a run\'s screens, or match images against it')
+    parser.add_argument('--run-dir', default=None, help='runs/<run_id> folder (uses its preprocess/ artifacts)')
+    parser.add_argument('--screen-nodes', default=None)
+    parser.add_argument('--screens-dir', default=None)
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--match', nargs='*', default=None, help='With --run-dir: print top-k matches for these images instead of writing')
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.match is not None:
+        if not args.run_dir:
+            raise SystemExit('--match requires --run-dir')
+        idx = screen_hash_index_for(pathlib.Path(args.run_dir))
+        print(json.dumps({p: idx.match(pathlib.Path(p), args.top_k) for p in args.match}, ensure_ascii=False, indent=2))
+        return
+
+    pre = pathlib.Path(args.run_dir) / 'preprocess' if args.run_dir else None
+    nodes_path = pathlib.Path(args.screen_nodes) if args.screen_nodes else (pre / 'screen_nodes.json' if pre else None)
+    screens_dir = pathlib.Path(args.screens_dir) if args.screens_dir else (pre / 'screens' if pre else None)
+    if not nodes_path or not screens_dir:
+        raise SystemExit('Pass --run-dir or both --screen-nodes and --screens-dir')
+    out_path = pathlib.Path(args.out) if args.out else nodes_path.parent / HASH_FILE
+    idx = build_screen_hash_index(screens_dir, id_to_file_from_nodes(nodes_path))
+    idx.save(out_path)
+    print(f"Wrote {out_path} (screens={len(idx)}, version={HASH_VERSION})")
+
+
+if __name__ == '__main__':
+    main()
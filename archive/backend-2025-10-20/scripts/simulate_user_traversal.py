@@ -15,57 +15,33 @@ Behavior:
 - Move along the chosen edge if available; otherwise list all available actions.
 - Stop when reaching the target screen (by name or screen_nodes id), or after
   15 minutes (or max steps), logging the outcome.
+- With --virtual-clock (or SIM_VIRTUAL_CLOCK=1), dwell/wait pauses advance a
+  simulated clock instead of sleeping; timestamps, time_sec and the
+  --max-minutes budget follow that clock.
 
 Outputs (under run-dir/simulations/<timestamp>/):
 - traversal_log.jsonl: one JSON object per event/step
 - path.json: final path summary (screens, linkIds)
 - transcript.txt: human-readable trace
+- tea.jsonl: one structured TEA record per step (TEA mode)
 """
 
 import argparse
+import contextlib
 import json
 import os
 import re
 import time
 import pathlib
 import shutil
+import sys
 import random
+import weakref
 from typing import Dict, Any, List, Tuple, Optional
 
 
 ROOT = pathlib.Path(__file__).resolve().parent.parent
 
-# --- Image hashing helpers for source/target image matching ---
-from PIL import Image
-
-def average_hash(path: pathlib.Path, size: int = 8) -> Optional[int]:
-    try:
-        with Image.open(path) as im:
-            im = im.convert('L').resize((size, size), Image.BILINEAR)
-            pixels = list(im.getdata())
-            avg = sum(pixels) / float(len(pixels)) if pixels else 0.0
-            bits = 0
-            for idx, p in enumerate(pixels):
-                if p >= avg:
-                    bits |= (1 << idx)
-            return bits
-    except Exception:
-        return None
-
-def hamming_distance(a: int, b: int) -> int:
-    return bin((a ^ b) & ((1 << 64) - 1)).count('1')
-
-def build_id_to_hash_map(screens_dir: pathlib.Path, id_to_file: Dict[int, str]) -> Dict[int, int]:
-    out: Dict[int, int] = {}
-    for sid, fname in id_to_file.items():
-        p = screens_dir / fname
-        if p.exists():
-            ah = average_hash(p)
-            if isinstance(ah, int):
-                out[int(sid)] = ah
-    return out
-# --- end image hashing helpers ---
-
 
 def list_run_dirs(logs_dir: pathlib.Path) -> List[pathlib.Path]:
     if not logs_dir.exists():
@@ -147,6 +123,34 @@ def compute_persona_scales(persona: Dict[str, Any]) -> Dict[str, float]:
     return {'direct_scale': direct_scale, 'back_scale': back_scale, 'distance_scale': distance_scale}
 
 
+# Raw persona fields run_traversal reads besides OCEAN (edge scales, thought templates)
+PERSONA_TRAVERSAL_FIELDS = ('experience_level', 'risk_appetite', 'communication_style', 'age')
+
+
+def persona_equivalence_key(persona: Optional[Dict[str, Any]]) -> Optional[Tuple[Any, ...]]:
+    """Canonical key of the persona inputs run_traversal depends on.
+
+    Personas with equal keys walk the same path with the same emotions, waits and
+    frictions; only their id/name/job text and the randomly sampled report thoughts
+    differ (fan-out re-samples those per member with collect_thoughts). Returns None
+    for personas that take the random exploration branch (O >= 0.7), whose runs are
+    not repeatable.
+    """
+    if not persona:
+        return ('none',)
+    ocean = extract_ocean(persona)
+    if ocean.get('O', 0.0) >= 0.7:
+        return None
+    scales = compute_persona_scales(persona)
+    return (
+        tuple(ocean[k] for k in ('O', 'C', 'E', 'A', 'N')),
+        tuple(sorted(scales.items())),
+        tuple(json.dumps(persona.get(f), sort_keys=True, default=str) for f in PERSONA_TRAVERSAL_FIELDS),
+        bool(persona.get('name')),
+        bool(persona.get('job')),
+    )
+
+
 def dominant_trait(ocean: Dict[str, float]) -> str:
     if not ocean:
         return ''
@@ -310,6 +314,10 @@ STOPWORDS = set(
 )
 
 
+GENERIC_CTA_TOKENS = {'continue','next','submit','confirm','proceed','start','finish','done','ok','go','open'}
+BACK_TOKENS = {'back', 'return', 'close', 'cancel'}
+
+
 def tokenize(s: str) -> List[str]:
     return [w for w in re.findall(r"[a-zA-Z0-9']+", (s or '').lower()) if w and w not in STOPWORDS]
 
@@ -329,14 +337,12 @@ def score_edge(goal: str, edge: Dict[str, Any], target_id: Optional[int] = None,
     overlap = goal_toks.intersection(edge_toks)
     score = float(len(overlap))
     # Optional light bonus for generic CTA language
-    generic_cta = {'continue','next','submit','confirm','proceed','start','finish','done','ok','go','open'}
-    if edge_toks.intersection(generic_cta):
+    if edge_toks.intersection(GENERIC_CTA_TOKENS):
         score += 0.3
     # Persona scales
     ps = persona_scales or {'direct_scale': 1.0, 'back_scale': 1.0, 'distance_scale': 1.0}
     # Penalize back/return/close actions when pursuing a goal
-    back_tokens = {'back', 'return', 'close', 'cancel'}
-    if any(bt in edge_toks for bt in back_tokens):
+    if any(bt in edge_toks for bt in BACK_TOKENS):
         score -= 6.0 * ps['back_scale']
     # Strongly prefer direct transition to the target id if known
     if target_id is not None:
@@ -627,6 +633,31 @@ def generate_diverse_thought(available_actions, persona, event):
     return None
 
 
+def collect_thoughts(log_path: pathlib.Path, persona: Optional[Dict[str, Any]]) -> List[str]:
+    """One sampled thought per pre_action_thought event of a traversal log (report 'thoughts')."""
+    thoughts: List[str] = []
+    try:
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line.strip())
+                    if event.get('type') == 'pre_action_thought':
+                        # Extract thought content from available actions
+                        available_actions = event.get('available_actions', [])
+                        if available_actions:
+                            # Generate diverse, persona-aware thoughts
+                            thought = generate_diverse_thought(available_actions, persona, event)
+                            if thought:
+                                thoughts.append(thought)
+                except json.JSONDecodeError:
+                    continue
+    except Exception:
+        pass
+    return thoughts
+
+
 # ------------------------
 # TEA + UX Audit helpers
 # ------------------------
@@ -895,7 +926,7 @@ def generate_ux_summary(screen_name: str, state: SessionState) -> Dict[str, str]
     }
 
 
-def render_tea_block_full(
+def build_tea_record(
     *,
     tea_idx: int,
     screen_name: str,
@@ -936,109 +967,173 @@ def render_tea_block_full(
     friction_points_mapped: List[Dict[str, Any]],
     positive_moments: List[str],
     suggestions: List[str],
-) -> str:
-    po = extract_ocean(persona) if persona else {}
+    link_id: Any = None,
+    outcome_to_id: Optional[int] = None,
+    action_intent: str = '',
+) -> Dict[str, Any]:
+    """Structured TEA record for one step.
+
+    This is what the simulator keeps while it runs: transcript.txt, tea.jsonl and the
+    smart condensed log are all rendered from these records, so nothing downstream
+    has to parse the transcript prose back.
+    """
+    persona_view = None
+    if persona:
+        persona_view = {'id': persona.get('id'), 'name': persona.get('name'), 'ocean': extract_ocean(persona)}
+    return {
+        'step': tea_idx,
+        'screen': screen_name,
+        'screen_id': screen_id,
+        'goal': goal,
+        'persona': persona_view,
+        'image': image_name,
+        'time_spent': time_spent,
+        'interaction': interaction_type,
+        'goal_progress': goal_progress,
+        'loop_detected': bool(loop_detected),
+        'confidence_delta': confidence_delta,
+        'friction_score': friction_score,
+        'perception': perception_text,
+        'interpretation': interpretation_text,
+        'observed_ux_notes': list(observed_ux_notes or []),
+        'emotion': pre_emotion_label,
+        'cognitive_state': {k: pre_emotion_state.get(k, 0.0) for k in ('valence', 'arousal', 'confidence', 'stress', 'frustration')},
+        'internal_thought': internal_thought,
+        'first_decision': first_decision_thought,
+        'expected_action': expected_action_text,
+        'hesitation': hesitation_seconds >= 2.5,
+        'hesitation_seconds': hesitation_seconds,
+        'first_action': first_action_performed,
+        'first_outcome_to': first_outcome_to,
+        'first_immediate_emotion': first_immediate_emotion,
+        'first_immediate_reaction': first_immediate_reaction,
+        'ux_feedback_during': list(ux_feedback_during or []),
+        'reflection': reflection_text,
+        'mismatch_observation': mismatch_observation,
+        'mismatch_emotion': mismatch_emotion,
+        'mismatch_ux_defect': mismatch_ux_defect,
+        'options': [{'linkId': ob.get('linkId'), 'to': ob.get('to'), 'to_id': ob.get('to_id')} for ob in (options_brief or [])],
+        'second_decision': second_decision_thought,
+        'second_action': second_action_text,
+        'second_outcome_to': second_outcome_to,
+        'second_emotion': second_emotion,
+        'friction_points': [{'problem': m.get('problem', ''), 'heuristic': m.get('heuristic', '')} for m in (friction_points_mapped or [])],
+        'positive_moments': list(positive_moments or []),
+        'suggestions': list(suggestions or []),
+        'link_id': link_id,
+        'outcome_to_id': outcome_to_id,
+        'action_intent': action_intent,
+    }
+
+
+def render_tea_record(rec: Dict[str, Any]) -> str:
+    """Render a TEA record as its transcript block."""
+    persona = rec.get('persona')
+    po = (persona or {}).get('ocean') or {}
     persona_bits = f"O={po.get('O',0):.2f} C={po.get('C',0):.2f} E={po.get('E',0):.2f} A={po.get('A',0):.2f} N={po.get('N',0):.2f}"
-    v = pre_emotion_state.get('valence', 0.0)
-    a = pre_emotion_state.get('arousal', 0.0)
-    c = pre_emotion_state.get('confidence', 0.0)
-    s = pre_emotion_state.get('stress', 0.0)
-    f = pre_emotion_state.get('frustration', 0.0)
-    hes = hesitation_seconds >= 2.5
+    cs = rec.get('cognitive_state') or {}
+    v = cs.get('valence', 0.0)
+    a = cs.get('arousal', 0.0)
+    c = cs.get('confidence', 0.0)
+    s = cs.get('stress', 0.0)
+    f = cs.get('frustration', 0.0)
+    hes = rec['hesitation']
+    hesitation_seconds = rec['hesitation_seconds']
+    pre_emotion_label = rec['emotion']
     # Compose
     lines: List[str] = []
-    lines.append(f"### === TEA LOG ({tea_idx}) ===\n")
-    lines.append(f"Screen: {screen_name} (id={screen_id})\n")
-    lines.append(f"Goal: {goal}\n")
+    lines.append(f"### === TEA LOG ({rec['step']}) ===\n")
+    lines.append(f"Screen: {rec['screen']} (id={rec['screen_id']})\n")
+    lines.append(f"Goal: {rec['goal']}\n")
     # compact metadata line
     lines.append(
-        f"time_spent: {time_spent:.1f}s | interaction: {interaction_type} | goal_progress: {goal_progress:.2f} | loop_detected: {str(loop_detected)} | confidence_delta: {confidence_delta:+.2f} | friction_score: {friction_score:.2f}\n"
+        f"time_spent: {rec['time_spent']:.1f}s | interaction: {rec['interaction']} | goal_progress: {rec['goal_progress']:.2f} | loop_detected: {str(rec['loop_detected'])} | confidence_delta: {rec['confidence_delta']:+.2f} | friction_score: {rec['friction_score']:.2f}\n"
     )
     if persona:
         lines.append(f"Persona: {persona.get('name')} | OCEAN {persona_bits}\n")
-    if image_name:
-        lines.append(f"Image: {image_name}\n\n")
+    if rec.get('image'):
+        lines.append(f"Image: {rec['image']}\n\n")
 
     # 1) Observation
     lines.append("1️⃣ Observation (Before Any Action)\n\n")
-    if perception_text:
-        lines.append(f"Perception: {perception_text}\n\n")
-    if interpretation_text:
-        lines.append(f"Interpretation: {interpretation_text}\n\n")
-    if observed_ux_notes:
+    if rec.get('perception'):
+        lines.append(f"Perception: {rec['perception']}\n\n")
+    if rec.get('interpretation'):
+        lines.append(f"Interpretation: {rec['interpretation']}\n\n")
+    if rec.get('observed_ux_notes'):
         lines.append("UX Audit (Observed):\n")
-        for n in observed_ux_notes[:6]:
+        for n in rec['observed_ux_notes'][:6]:
             lines.append(f"- {n}\n")
         lines.append("\n")
     lines.append(f"Emotion: {pre_emotion_label}\n\n")
     lines.append(f"Cognitive State: valence {v:+.2f}, arousal {a:.2f}, confidence {c:.2f}, stress {s:.2f}, frustration {f:.2f}\n\n")
-    if internal_thought:
-        lines.append(f"Internal Thought: {internal_thought}\n\n")
+    if rec.get('internal_thought'):
+        lines.append(f"Internal Thought: {rec['internal_thought']}\n\n")
 
     # 2) First Action Decision
     lines.append("2️⃣ First Action Decision (Before Knowing Links)\n\n")
-    lines.append(f"Thought: {first_decision_thought}\n\n")
-    if expected_action_text:
-        lines.append(f"Expected Action: {expected_action_text}\n\n")
+    lines.append(f"Thought: {rec['first_decision']}\n\n")
+    if rec.get('expected_action'):
+        lines.append(f"Expected Action: {rec['expected_action']}\n\n")
     lines.append(f"Emotion: {pre_emotion_label}\n\n")
     lines.append(f"Hesitation: {str(hes)} ({hesitation_seconds:.1f}s)\n\n")
     lines.append(f"Internal Question: Will this action move me forward efficiently?\n\n")
 
     # 3) First Actual Action (if any)
-    if first_action_performed and first_outcome_to:
+    if rec.get('first_action') and rec.get('first_outcome_to'):
         lines.append("3️⃣ First Actual Action (If Link Exists)\n\n")
-        lines.append(f"Action Performed: {first_action_performed}\n\n")
-        lines.append(f"Outcome: Proceeds to {first_outcome_to}\n\n")
-        if first_immediate_emotion:
-            lines.append(f"Immediate Reaction: {first_immediate_emotion}\n\n")
-        if ux_feedback_during:
+        lines.append(f"Action Performed: {rec['first_action']}\n\n")
+        lines.append(f"Outcome: Proceeds to {rec['first_outcome_to']}\n\n")
+        if rec.get('first_immediate_emotion'):
+            lines.append(f"Immediate Reaction: {rec['first_immediate_emotion']}\n\n")
+        if rec.get('ux_feedback_during'):
             lines.append("UX Feedback (During Action):\n")
-            for u in ux_feedback_during[:4]:
+            for u in rec['ux_feedback_during'][:4]:
                 lines.append(f"- {u}\n")
             lines.append("\n")
-        if reflection_text:
-            lines.append(f"Reflection: {reflection_text}\n\n")
+        if rec.get('reflection'):
+            lines.append(f"Reflection: {rec['reflection']}\n\n")
 
     # 4) Action Mismatch
-    if mismatch_observation:
+    if rec.get('mismatch_observation'):
         lines.append("4️⃣ Action Mismatch (If No Link Found)\n\n")
-        lines.append(f"Observation: {mismatch_observation}\n\n")
-        if mismatch_emotion:
-            lines.append(f"Emotion: {mismatch_emotion}\n\n")
-        if mismatch_ux_defect:
-            lines.append(f"UX Defect: {mismatch_ux_defect}\n\n")
+        lines.append(f"Observation: {rec['mismatch_observation']}\n\n")
+        if rec.get('mismatch_emotion'):
+            lines.append(f"Emotion: {rec['mismatch_emotion']}\n\n")
+        if rec.get('mismatch_ux_defect'):
+            lines.append(f"UX Defect: {rec['mismatch_ux_defect']}\n\n")
         lines.append("Note: Revealing available links and deciding again.\n\n")
 
     # 5) Second Action Decision
-    if options_brief and second_decision_thought:
+    if rec.get('options') and rec.get('second_decision'):
         lines.append("5️⃣ Second Action Decision (After Revealing Links)\n\n")
         lines.append("Available Options:\n")
-        for ob in options_brief[:8]:
+        for ob in rec['options'][:8]:
             lines.append(f"- linkId {ob.get('linkId')} → {ob.get('to')}\n")
         lines.append("\n")
-        lines.append(f"Thought: {second_decision_thought}\n\n")
-        if second_action_text:
-            lines.append(f"Action: {second_action_text}\n\n")
-        if second_outcome_to:
-            lines.append(f"Outcome: Proceeds to {second_outcome_to}\n\n")
-        if second_emotion:
-            lines.append(f"Emotion: {second_emotion}\n\n")
+        lines.append(f"Thought: {rec['second_decision']}\n\n")
+        if rec.get('second_action'):
+            lines.append(f"Action: {rec['second_action']}\n\n")
+        if rec.get('second_outcome_to'):
+            lines.append(f"Outcome: Proceeds to {rec['second_outcome_to']}\n\n")
+        if rec.get('second_emotion'):
+            lines.append(f"Emotion: {rec['second_emotion']}\n\n")
 
     # 6) UX Summary (Per Screen)
     lines.append("6️⃣ UX Summary (Per Screen)\n\n")
-    if friction_points_mapped:
+    if rec.get('friction_points'):
         lines.append("Friction Points:\n")
-        for m in friction_points_mapped[:6]:
+        for m in rec['friction_points'][:6]:
             lines.append(f"- {m.get('problem','')} (heuristic: {m.get('heuristic','')})\n")
         lines.append("\n")
-    if positive_moments:
+    if rec.get('positive_moments'):
         lines.append("Positive Moments:\n")
-        for p in positive_moments[:4]:
+        for p in rec['positive_moments'][:4]:
             lines.append(f"- {p}\n")
         lines.append("\n")
-    if suggestions:
+    if rec.get('suggestions'):
         lines.append("Suggestions:\n")
-        for sgg in suggestions[:6]:
+        for sgg in rec['suggestions'][:6]:
             lines.append(f"- {sgg}\n")
         lines.append("\n")
 
@@ -1046,6 +1141,10 @@ def render_tea_block_full(
     return ''.join(lines)
 
 
+def render_tea_block_full(**kwargs: Any) -> str:
+    return render_tea_record(build_tea_record(**kwargs))
+
+
 # ------------------------
 # Condensed TEA generator (post-processing)
 # ------------------------
@@ -1130,6 +1229,59 @@ def _parse_tea_blocks_from_transcript(transcript_path: pathlib.Path) -> List[Dic
     return blocks
 
 
+def _first_line(text: Any) -> str:
+    lines = str(text or '').splitlines()
+    return lines[0].strip() if lines else ''
+
+
+def tea_block_fields(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """Project a TEA record onto the block fields the condensed log works from.
+
+    Yields the same values _parse_tea_blocks_from_transcript recovers from the
+    rendered block (first Emotion/Reflection wins, last Thought/Outcome wins,
+    metadata as strings) without a round trip through the transcript text.
+    """
+    hes_secs = float(rec.get('hesitation_seconds') or 0.0)
+    cs = rec.get('cognitive_state') or {}
+    section3 = bool(rec.get('first_action') and rec.get('first_outcome_to'))
+    section5 = bool(rec.get('options') and rec.get('second_decision'))
+    thought = rec.get('first_decision')
+    outcome = f"Proceeds to {rec.get('first_outcome_to')}" if section3 else ''
+    if section5:
+        thought = rec.get('second_decision')
+        if rec.get('second_outcome_to'):
+            outcome = f"Proceeds to {rec.get('second_outcome_to')}"
+    return {
+        'Screen': _first_line(f"{rec.get('screen')} (id={rec.get('screen_id')})"),
+        'Image': _first_line(rec.get('image')),
+        'Goal': _first_line(rec.get('goal')),
+        'Perception': _first_line(rec.get('perception')),
+        'Interpretation': _first_line(rec.get('interpretation')),
+        'Emotion': _first_line(rec.get('emotion')),
+        'Cognitive': (
+            f"valence {cs.get('valence', 0.0):+.2f}, arousal {cs.get('arousal', 0.0):.2f}, confidence {cs.get('confidence', 0.0):.2f}, "
+            f"stress {cs.get('stress', 0.0):.2f}, frustration {cs.get('frustration', 0.0):.2f}"
+        ),
+        'Internal Thought': _first_line(rec.get('internal_thought')),
+        'Thought': _first_line(thought),
+        'Expected Action': _first_line(rec.get('expected_action')),
+        'Hesitation': f"{str(bool(rec.get('hesitation')))} ({hes_secs:.1f}s)",
+        'Action Performed': _first_line(rec.get('first_action')) if section3 else '',
+        'Outcome': _first_line(outcome),
+        'Immediate Reaction': _first_line(rec.get('first_immediate_emotion')) if section3 else '',
+        'Reflection': _first_line(rec.get('reflection')) if section3 else '',
+        'Friction Points': [], 'Positive Moments': [], 'Suggestions': [],
+        'meta': {
+            'time_spent': f"{float(rec.get('time_spent') or 0.0):.1f}s",
+            'interaction': str(rec.get('interaction') or ''),
+            'goal_progress': f"{float(rec.get('goal_progress') or 0.0):.2f}",
+            'loop_detected': str(bool(rec.get('loop_detected'))),
+            'confidence_delta': f"{float(rec.get('confidence_delta') or 0.0):+.2f}",
+            'friction_score': f"{float(rec.get('friction_score') or 0.0):.2f}",
+        },
+    }
+
+
 def _label_from_emotion_text(text: str) -> str:
     tl = (text or '').lower()
     if 'frustrat' in tl:
@@ -1145,8 +1297,13 @@ def _label_from_emotion_text(text: str) -> str:
     return 'Neutral'
 
 
-def write_smart_condensed_log(transcript_path: pathlib.Path, output_path: pathlib.Path) -> None:
-    blocks = _parse_tea_blocks_from_transcript(transcript_path)
+def write_smart_condensed_log(transcript_path: pathlib.Path, output_path: pathlib.Path, records: Optional[List[Dict[str, Any]]] = None) -> None:
+    """Write the condensed TEA log. Uses the simulator's TEA records when given and
+    only falls back to parsing transcript.txt for older runs."""
+    if records is not None:
+        blocks = [tea_block_fields(r) for r in records]
+    else:
+        blocks = _parse_tea_blocks_from_transcript(transcript_path)
     out_lines: List[str] = []
 
     # Humanization helpers
@@ -1574,105 +1731,408 @@ def match_intent_to_edge(decision_text: str, edges: List[Dict[str, Any]]) -> Opt
     return best
 
 
-def main():
-    parser = argparse.ArgumentParser(description='Simulate user traversal over the graph to reach a target screen (supports persona-based runs)')
-    parser.add_argument('--run-dir', default=None, help='Path to logs/run_* folder (defaults to latest)')
-    parser.add_argument('--source', required=False, help='Source screen name (human)')
-    parser.add_argument('--source-id', type=int, default=None, help='Source screen_nodes integer ID (preferred)')
-    parser.add_argument('--target-name', default=None, help='Target screen name (human)')
-    parser.add_argument('--target-id', type=int, default=None, help='Target screen_nodes integer ID (if known)')
-    parser.add_argument('--goal', required=True, help='User goal description')
-    parser.add_argument('--max-minutes', type=float, default=15.0, help='Max simulation time in minutes (default: 15)')
-    parser.add_argument('--max-steps', type=int, default=50, help='Max steps (default: 50)')
-    parser.add_argument('--verbose', action='store_true')
-    parser.add_argument('--persona-json', default=str(ROOT / 'users' / 'users.json'), help='Path to personas JSON list')
-    parser.add_argument('--persona-id', type=int, default=None, help='Single persona id to run; if omitted, no persona bias')
-    parser.add_argument('--persona-folder-name', default=None, help='If set, place simulations under run_dir/<persona-folder-name>/simulations')
-    parser.add_argument('--append', action='store_true', help='Append to existing simulations instead of purging the folder')
-    parser.add_argument('--resolved-user-id', type=int, default=None, help='Concrete resolved user id for this simulation (if any)')
-    parser.add_argument('--source-image', default=None, help='Path to source screen image (e.g., source.png)')
-    parser.add_argument('--target-image', default=None, help='Path to target screen image (e.g., target.png)')
-    parser.add_argument('--tea', dest='tea', action='store_true', default=True, help='Emit TEA logs per step in transcript and report (default: on)')
-    parser.add_argument('--no-tea', dest='tea', action='store_false', help='Disable TEA logs')
-    parser.add_argument('--ux-audit', dest='ux_audit', action='store_true', default=True, help='Include UX audit issues in report (default: on)')
-    parser.add_argument('--no-ux-audit', dest='ux_audit', action='store_false', help='Disable UX audit issues')
-    args = parser.parse_args()
+# ------------------------
+# Simulation clock
+# ------------------------
+class SimClock:
+    """Clock used for dwell/wait pauses, event timestamps and the time budget.
 
-    logs_dir = ROOT / 'logs'
-    run_dir = pathlib.Path(args.run_dir) if args.run_dir else (list_run_dirs(logs_dir)[0] if list_run_dirs(logs_dir) else None)
-    if not run_dir or not run_dir.exists():
-        raise SystemExit('Could not resolve run-dir; please pass --run-dir')
+    Wall mode sleeps for real. Virtual mode never sleeps: pauses advance an offset
+    on top of the real elapsed time, so a run is bounded by actual work (LLM calls,
+    I/O) while timestamps and time_sec still reflect the simulated user's pace.
+    """
 
-    nodes_path = run_dir / 'preprocess' / 'screen_nodes.json'
-    links_path = run_dir /  'preprocess' / 'prototype_links_enriched.json'
-    screens_dir = run_dir /  'preprocess' / 'screens'
+    def __init__(self, virtual: bool = False) -> None:
+        self.virtual = bool(virtual)
+        self._offset = 0.0
 
-    if not nodes_path.exists() or not links_path.exists():
-        raise SystemExit('Missing required run artifacts: screen_nodes.json and prototype_links_enriched.json')
+    def time(self) -> float:
+        return time.time() + self._offset
 
-    # Load artifacts
-    name_to_id, id_to_name, id_to_file, screenid_to_id = build_node_maps(nodes_path)
-    alias_to_id = build_alias_to_id(nodes_path)
-    links: List[Dict[str, Any]] = load_json(links_path)
-    edges_by_source_id = index_edges_by_source_id(links, alias_to_id, screenid_to_id, name_to_id)
-    # Precompute image hashes for matching if needed
-    id_to_hash: Dict[int, int] = {}
-    if args.source_image or args.target_image:
-        id_to_hash = build_id_to_hash_map(screens_dir, id_to_file)
-    # Precompute heuristic distances to target to bias choices
-    distances = compute_distances_to_target(edges_by_source_id, list(edges_by_source_id.keys()), args.target_id)
+    def sleep(self, seconds: float) -> None:
+        """Reflection/dwell pause: sleeps in wall mode, advances virtual time otherwise."""
+        s = max(0.0, float(seconds or 0.0))
+        if self.virtual:
+            self._offset += s
+        elif s > 0:
+            time.sleep(s)
 
-    # Collect all screen names present in edges
-    screen_names = sorted({str(l.get('source_screen_name') or '') for l in links}.union({str(l.get('destination_screen_name') or '') for l in links}))
+    def advance(self, seconds: float) -> None:
+        """Account for a pause the wall-clock simulator does not sleep through (auto-wait).
+        Only virtual time moves; wall mode keeps its historical behavior."""
+        if self.virtual:
+            self._offset += max(0.0, float(seconds or 0.0))
 
-    # Resolve source
-    source_name = find_screen_name_match(screen_names, args.source) if args.source else None
-    # Resolve target
-    target_name: Optional[str] = None
-    if args.target_id is not None:
-        target_name = id_to_name.get(int(args.target_id))
-    if not target_name and args.target_name:
-        target_name = find_screen_name_match(screen_names, args.target_name)
-    if not target_name:
-        # As a fallback, pick the best match to the goal terms among screen names
-        target_name = find_screen_name_match(screen_names, args.target_name or '') or args.target_name or ''
 
-    # Personas
-    personas = load_personas(pathlib.Path(args.persona_json))
-    if args.persona_id is not None:
-        personas = [p for p in personas if int(p.get('id')) == int(args.persona_id)]
-    if not personas:
-        personas = [{}]  # anonymous default run
+def _close_sim_streams(streams: List[Any], fsync: bool) -> None:
+    for f in streams:
+        try:
+            if f.closed:
+                continue
+            if hasattr(f, 'finish'):
+                f.finish()
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        except Exception:
+            pass
+        try:
+            f.close()
+        except Exception:
+            pass
 
-    # Optional single persona to influence decision-making
-    persona: Optional[Dict[str, Any]] = None
-    scales: Optional[Dict[str, float]] = None
-    if args.persona_id is not None:
-        ps = load_personas(pathlib.Path(args.persona_json))
-        for p in ps:
+
+class NormalizedTextStream:
+    """Text stream that applies normalize_transcript_file's cleanup while writing.
+
+    Trailing spaces/tabs are stripped per line, runs of blank lines collapse to one,
+    and leading/trailing whitespace of the whole file is trimmed with a single final
+    newline on close. The output is byte-identical to writing raw and normalizing
+    afterwards, without re-reading and rewriting the file. Text from the last
+    non-blank line onwards is held back until more content arrives (or close),
+    since only then is it known whether it sits at the end of the file.
+    """
+
+    def __init__(self, raw: Any) -> None:
+        self._raw = raw
+        self._partial = ''
+        self._tail = ''
+        self._started = False
+        self._newlines = 0
+
+    def write(self, text: str) -> int:
+        if not text:
+            return 0
+        chunks = (self._partial + text).split('\n')
+        self._partial = chunks.pop()
+        for line in chunks:
+            self._line(line)
+            self._newline()
+        return len(text)
+
+    def _line(self, line: str) -> None:
+        line = line.rstrip(' \t')
+        if not self._started:
+            line = line.lstrip()
+            if not line:
+                return
+            self._started = True
+        if not line:
+            return
+        if line.strip():
+            # A solid line: everything held so far is no longer at the end of the file
+            if self._tail:
+                self._raw.write(self._tail)
+            self._tail = line
+        else:
+            self._tail += line
+        self._newlines = 0
+
+    def _newline(self) -> None:
+        if self._started and self._newlines < 2:
+            self._tail += '\n'
+            self._newlines += 1
+
+    def flush(self) -> None:
+        self._raw.flush()
+
+    def fileno(self) -> int:
+        return self._raw.fileno()
+
+    @property
+    def closed(self) -> bool:
+        return self._raw.closed
+
+    def finish(self) -> None:
+        """Write out the held tail with the final newline (idempotent)."""
+        if self._raw.closed or self._tail is None:
+            return
+        if self._partial:
+            self._line(self._partial)
+            self._partial = ''
+        self._raw.write(self._tail.rstrip() + '\n')
+        self._tail = None
+
+    def close(self) -> None:
+        if self._raw.closed:
+            return
+        self.finish()
+        self._raw.close()
+
+
+class SimulationWriter:
+    """Per-simulation owner of traversal_log.jsonl, transcript.txt and tea.jsonl.
+
+    All files stay open for the whole traversal with sized buffers instead of
+    being reopened for every event/line. Data is flushed at step boundaries and on
+    close(); a weakref finalizer also closes (and flushes) the streams at
+    interpreter exit or when the writer is dropped after an exception, so a crashed
+    simulation still leaves complete lines behind. fsync, when enabled, only
+    happens once at close. The transcript is normalized as it is written.
+    """
+
+    def __init__(self, log_path: pathlib.Path, transcript_path: pathlib.Path, *, tea_path: Optional[pathlib.Path] = None, buffer_size: Optional[int] = None, fsync: bool = False) -> None:
+        if buffer_size is None:
             try:
-                if int(p.get('id')) == int(args.persona_id):
-                    persona = p
-                    break
+                buffer_size = int(os.getenv('SIM_WRITER_BUFFER', str(64 * 1024)))
             except Exception:
-                continue
-        if persona:
-            scales = compute_persona_scales(persona)
+                buffer_size = 64 * 1024
+        buffer_size = max(4096, int(buffer_size))
+        self.log_path = pathlib.Path(log_path)
+        self.transcript_path = pathlib.Path(transcript_path)
+        self.fsync = bool(fsync)
+        # Log keeps the historical append semantics; transcript starts fresh per run
+        self._log = open(self.log_path, 'a', encoding='utf-8', buffering=buffer_size)
+        self._transcript = NormalizedTextStream(open(self.transcript_path, 'w', encoding='utf-8', buffering=buffer_size))
+        self._tea = open(tea_path, 'w', encoding='utf-8', buffering=buffer_size) if tea_path is not None else None
+        streams = [self._log, self._transcript] + ([self._tea] if self._tea is not None else [])
+        self._streams = streams
+        self._finalizer = weakref.finalize(self, _close_sim_streams, streams, self.fsync)
+
+    def event(self, obj: Dict[str, Any]) -> None:
+        self._log.write(json.dumps(obj, ensure_ascii=False) + '\n')
+
+    def tea(self, record: Dict[str, Any]) -> None:
+        if self._tea is not None:
+            self._tea.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    @contextlib.contextmanager
+    def transcript(self):
+        """Borrow the open transcript handle (drop-in for `with open(transcript_path, 'a') as tf`)."""
+        yield self._transcript
+
+    def flush(self) -> None:
+        for f in self._streams:
+            try:
+                if not f.closed:
+                    f.flush()
+            except Exception:
+                pass
 
-    # Build simulations root (purge previous simulations)
-    if args.persona_folder_name:
-        sims_root = run_dir / args.persona_folder_name / 'simulations'
-        persona_root = sims_root.parent
-        persona_root.mkdir(parents=True, exist_ok=True)
-    else:
-        sims_root = run_dir / 'simulations'
-    if sims_root.exists() and not args.append:
+    def close(self) -> None:
+        self._finalizer()
+
+    @property
+    def closed(self) -> bool:
+        return not self._finalizer.alive
+
+    def __enter__(self) -> 'SimulationWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def write_user_report_txt(path: pathlib.Path, report: Dict[str, Any]) -> None:
+    """Text version of user_report.json."""
+    enriched_frictions = report.get('friction_points') or []
+    drop_off_points = report.get('drop_off_points') or []
+    feedback = report.get('feedback') or []
+    thoughts = report.get('thoughts') or []
+    tea_entries = report.get('tea') or []
+    with open(path, 'w', encoding='utf-8') as tf:
+        tf.write(f"Task completion status: {'completed' if report.get('status') == 'completed' else 'not completed'}\n")
+        tf.write(f"Steps: {report['steps']} | Time: {report['time_sec']}s\n")
+        tf.write("Friction points:\n")
+        if enriched_frictions:
+            for fp in enriched_frictions:
+                tf.write(f"- {fp.get('description')}\n")
+        else:
+            tf.write("- None\n")
+        tf.write("Drop-off points:\n")
+        if drop_off_points:
+            for dp in drop_off_points:
+                tf.write(f"- screen_id={dp.get('screen_id')} reason={dp.get('reason')}\n")
+        else:
+            tf.write("- None\n")
+        tf.write("Feedback:\n")
+        if feedback:
+            for f in feedback:
+                tf.write(f"- {f}\n")
+        else:
+            tf.write("- (no additional feedback)\n")
+        tf.write("Thoughts:\n")
+        if thoughts:
+            for t in thoughts:
+                tf.write(f"- {t}\n")
+        else:
+            tf.write("- (no thoughts recorded)\n")
+        if tea_entries:
+            tf.write("\nTEA Logs:\n")
+            for te in tea_entries:
+                tf.write(f"- step={te['step']} screen='{te['screen']}' emotion={te['emotion']} hesitation={te['hesitation']} action='{te['action']}' → {te['outcome_to']}\n")
+        if 'ux_audit' in report:
+            tf.write("\nUX AUDIT (issues):\n")
+            if report.get('ux_audit', {}).get('issues'):
+                for issue in report['ux_audit']['issues']:
+                    tf.write(f"- screen='{issue.get('screen','')}'\n  problem: {issue.get('problem','')}\n  heuristic: {issue.get('heuristic','')}\n  recommendation: {issue.get('recommendation','')}\n")
+            else:
+                tf.write("- None\n")
+
+
+# ------------------------
+# Library entry points (shared by the CLI and in-process batch runners)
+# ------------------------
+class TraversalContext:
+    """Run artifacts loaded once and shared by every simulation over the same run.
+
+    Uses the compiled preprocess/run_graph.bin when present and current, falling back
+    to resolving edges from the JSON artifacts. Everything here is read-only after
+    construction, so one context can back many concurrent traversals (threads)
+    without re-parsing screen_nodes.json or prototype_links_enriched.json per user.
+    """
+
+    def __init__(self, run_dir: pathlib.Path) -> None:
+        self.run_dir = pathlib.Path(run_dir)
+        self.nodes_path = self.run_dir / 'preprocess' / 'screen_nodes.json'
+        self.links_path = self.run_dir / 'preprocess' / 'prototype_links_enriched.json'
+        self.screens_dir = self.run_dir / 'preprocess' / 'screens'
+        if not self.nodes_path.exists() or not self.links_path.exists():
+            raise SystemExit('Missing required run artifacts: screen_nodes.json and prototype_links_enriched.json')
+        # Prefer the compiled run graph (preprocess/run_graph.bin) when it is current
+        self.graph = None
         try:
-            shutil.rmtree(sims_root)
+            from run_graph import load_run_graph_for
+            self.graph = load_run_graph_for(self.run_dir)
         except Exception:
-            pass
-    sims_root.mkdir(parents=True, exist_ok=True)
-    sim_dir = sims_root / time.strftime('%Y%m%d_%H%M%S')
+            self.graph = None
+        if self.graph is not None:
+            g = self.graph
+            self.name_to_id, self.id_to_name, self.id_to_file, self.screenid_to_id = g.name_to_id, g.id_to_name, g.id_to_file, g.screenid_to_id
+            self.id_to_desc: Dict[int, str] = g.id_to_desc
+            self.alias_to_id = g.alias_to_id
+            self.edges_by_source_id = g.edges_by_source_id()
+            self.screen_names = g.screen_names
+        else:
+            self.name_to_id, self.id_to_name, self.id_to_file, self.screenid_to_id = build_node_maps(self.nodes_path)
+            self.id_to_desc = dict(getattr(build_node_maps, '_id_to_desc', {}))  # type: ignore[attr-defined]
+            self.alias_to_id = build_alias_to_id(self.nodes_path)
+            links: List[Dict[str, Any]] = load_json(self.links_path)
+            self.edges_by_source_id = index_edges_by_source_id(links, self.alias_to_id, self.screenid_to_id, self.name_to_id)
+            self.screen_names = sorted({str(l.get('source_screen_name') or '') for l in links}.union({str(l.get('destination_screen_name') or '') for l in links}))
+        self._distances: Dict[Optional[int], Dict[int, int]] = {}
+        self._screen_hashes = None
+        self.scorer = build_edge_scorer(self)
+        self._parity_check = os.getenv('SCORING_PARITY_CHECK', '0').strip().lower() in {'1', 'true', 'yes', 'on'}
+
+    def distances_to(self, target_id: Optional[int]) -> Dict[int, int]:
+        key = int(target_id) if target_id is not None else None
+        if key not in self._distances:
+            if self.graph is not None:
+                self._distances[key] = self.graph.distances_to(key)
+            else:
+                self._distances[key] = compute_distances_to_target(self.edges_by_source_id, list(self.edges_by_source_id.keys()), key)
+        return self._distances[key]
+
+    def rank_edges(self, goal: str, source_id: int, outgoing: List[Dict[str, Any]], target_id: Optional[int], distances: Optional[Dict[int, int]], visited_recent: Optional[List[int]], persona_scales: Optional[Dict[str, float]]) -> Tuple[Optional[Dict[str, Any]], List[Tuple[Dict[str, Any], float]]]:
+        """choose_edge over source_id's outgoing edges, vectorized when the scorer is available."""
+        if self.scorer is None:
+            return choose_edge(goal, outgoing, target_id, distances, visited_recent, persona_scales)
+        if self._parity_check:
+            from edge_scoring import check_parity
+            msg = check_parity(self.scorer, choose_edge, goal, source_id, target_id, distances, visited_recent, persona_scales)
+            if msg:
+                print(f"[scoring] parity mismatch, using reference scores: {msg}", file=sys.stderr)
+                return choose_edge(goal, outgoing, target_id, distances, visited_recent, persona_scales)
+        return self.scorer.rank(goal, source_id, target_id, distances, visited_recent, persona_scales)
+
+    def match_intent(self, decision_text: str, source_id: int, outgoing: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if self.scorer is None:
+            return match_intent_to_edge(decision_text, outgoing)
+        return self.scorer.match_intent(decision_text, source_id)
+
+    def wait_edges(self, source_id: int, outgoing: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.scorer is None:
+            return [edge for edge in outgoing if is_wait_edge(edge)]
+        return self.scorer.wait_edges(source_id)
+
+    def screen_hashes(self):
+        """Perceptual-hash index of the run's screens (preprocess/screen_hash.npz, rebuilt if stale)."""
+        if self._screen_hashes is None:
+            from screen_hash import screen_hash_index_for
+            self._screen_hashes = screen_hash_index_for(self.run_dir, self.id_to_file)
+        return self._screen_hashes
+
+
+def build_edge_scorer(ctx: 'TraversalContext'):
+    """Vectorized scorer (scripts/edge_scoring.py) over ctx's edges; None when NumPy is unavailable."""
+    try:
+        from edge_scoring import EdgeScorer
+    except Exception:
+        return None
+    try:
+        return EdgeScorer(
+            ctx.edges_by_source_id,
+            tokenize=tokenize,
+            generic_cta=GENERIC_CTA_TOKENS,
+            back_tokens=BACK_TOKENS,
+            wait_keywords=WAIT_KEYWORDS,
+            graph=ctx.graph,
+        )
+    except Exception:
+        return None
+
+
+def load_traversal_context(run_dir: pathlib.Path) -> TraversalContext:
+    return TraversalContext(run_dir)
+
+
+def find_persona(personas: List[Dict[str, Any]], persona_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    if persona_id is None:
+        return None
+    for p in personas:
+        try:
+            if int(p.get('id')) == int(persona_id):
+                return p
+        except Exception:
+            continue
+    return None
+
+
+def match_image_to_id(image_path: pathlib.Path, screen_hashes) -> Optional[int]:
+    if screen_hashes is None:
+        return None
+    return screen_hashes.match_image(image_path)
+
+
+def run_traversal(
+    ctx: TraversalContext,
+    *,
+    sim_dir: pathlib.Path,
+    goal: str,
+    source_id: int,
+    target_id: Optional[int] = None,
+    target_name: Optional[str] = None,
+    persona: Optional[Dict[str, Any]] = None,
+    max_minutes: float = 15.0,
+    max_steps: int = 50,
+    tea: bool = True,
+    ux_audit: bool = True,
+    resolved_user_id: Optional[int] = None,
+    verbose: bool = False,
+    virtual_clock: Optional[bool] = None,
+    fsync: Optional[bool] = None,
+) -> pathlib.Path:
+    """Run one traversal into sim_dir and return it.
+
+    Writes traversal_log.jsonl, transcript.txt, tea.jsonl (TEA mode), path.json,
+    user_report.json/.txt and smart_condensed_TEA_log.txt, exactly as the CLI does.
+    """
+    if virtual_clock is None:
+        virtual_clock = os.getenv('SIM_VIRTUAL_CLOCK', '0').strip().lower() in {'1', 'true', 'yes', 'on'}
+    if fsync is None:
+        fsync = os.getenv('SIM_FSYNC', '0').strip().lower() in {'1', 'true', 'yes', 'on'}
+    if target_name is None:
+        target_name = ctx.id_to_name.get(int(target_id)) if target_id is not None else ''
+    id_to_name = ctx.id_to_name
+    id_to_file = ctx.id_to_file
+    id_to_desc = ctx.id_to_desc
+    screens_dir = ctx.screens_dir
+    edges_by_source_id = ctx.edges_by_source_id
+    distances = ctx.distances_to(target_id)
+    scales: Optional[Dict[str, float]] = compute_persona_scales(persona) if persona else None
+
+    sim_dir = pathlib.Path(sim_dir)
     sim_dir.mkdir(parents=True, exist_ok=True)
     log_path = sim_dir / 'traversal_log.jsonl'
     transcript_path = sim_dir / 'transcript.txt'
@@ -1681,53 +2141,18 @@ def main():
     user_report_txt = sim_dir / 'user_report.txt'
     tea_entries: List[Dict[str, Any]] = []
 
+    tea_records: List[Dict[str, Any]] = []
+    writer = SimulationWriter(log_path, transcript_path, tea_path=(sim_dir / 'tea.jsonl' if tea else None), fsync=fsync)
+
     def log_event(obj: Dict[str, Any]):
-        with open(log_path, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(obj, ensure_ascii=False) + '\n')
-        if args.verbose:
+        writer.event(obj)
+        if verbose:
             print(obj)
 
     # Initialize
-    start_ts = time.time()
-    max_end = start_ts + args.max_minutes * 60.0
-    # Validate source id
-    # Allow source-image matching
-    source_id = None
-    if args.source_image:
-        sip = pathlib.Path(args.source_image)
-        src_hash = average_hash(sip) if sip.exists() else None
-        if isinstance(src_hash, int) and id_to_hash:
-            best = None
-            best_d = 1 << 30
-            for sid, h in id_to_hash.items():
-                d = hamming_distance(src_hash, h)
-                if d < best_d:
-                    best_d = d
-                    best = sid
-            source_id = best
-    if not isinstance(source_id, int):
-        source_id = args.source_id if args.source_id is not None else (name_to_id.get(source_name) if source_name else None)
-    if not isinstance(source_id, int):
-        # Try alias mapping from provided source name
-        if args.source:
-            source_id = alias_to_id.get(normalize(args.source))
-    if not isinstance(source_id, int):
-        raise SystemExit('Source screen id could not be resolved (pass --source-id)')
-
-    # Allow target-image matching
-    if args.target_image and args.target_id is None:
-        tip = pathlib.Path(args.target_image)
-        tgt_hash = average_hash(tip) if tip.exists() else None
-        if isinstance(tgt_hash, int) and id_to_hash:
-            best = None
-            best_d = 1 << 30
-            for sid, h in id_to_hash.items():
-                d = hamming_distance(tgt_hash, h)
-                if d < best_d:
-                    best_d = d
-                    best = sid
-            if isinstance(best, int):
-                args.target_id = int(best)
+    clock = SimClock(virtual=virtual_clock)
+    start_ts = clock.time()
+    max_end = start_ts + max_minutes * 60.0
 
     current_id = int(source_id)
     visited: List[int] = []
@@ -1738,47 +2163,49 @@ def main():
 
     start_event = {
         'type': 'start',
-        'run_dir': str(run_dir),
+        'run_dir': str(ctx.run_dir),
         'source': id_to_name.get(current_id),
         'target_name': target_name,
-        'target_id': args.target_id,
-        'validation_mode': 'id' if args.target_id is not None else 'name',
-        'goal': args.goal,
-        'timestamp': time.time(),
+        'target_id': target_id,
+        'validation_mode': 'id' if target_id is not None else 'name',
+        'goal': goal,
+        'timestamp': clock.time(),
     }
     if persona:
         start_event['persona'] = {'id': persona.get('id'), 'name': persona.get('name')}
     log_event(start_event)
 
-    with open(transcript_path, 'w', encoding='utf-8') as tf:
+    with writer.transcript() as tf:
         if persona:
             tf.write(f"Persona: {persona.get('name')} (id={persona.get('id')})\n")
             # OCEAN snapshot
             po = extract_ocean(persona)
             tf.write(f"Persona OCEAN: O={po.get('O',0):.2f} C={po.get('C',0):.2f} E={po.get('E',0):.2f} A={po.get('A',0):.2f} N={po.get('N',0):.2f}\n")
         start_img = image_path_by_id(screens_dir, current_id, id_to_file)
-        tf.write(f"Start at: id={current_id} name={id_to_name.get(current_id, '')}\nTarget: id={args.target_id if args.target_id is not None else ''} name={target_name or ''}\n")
+        tf.write(f"Start at: id={current_id} name={id_to_name.get(current_id, '')}\nTarget: id={target_id if target_id is not None else ''} name={target_name or ''}\n")
         tf.write(f"Image: {start_img.name if start_img else 'N/A'}\n")
-        tf.write(f"Goal: {args.goal}\n\n")
+        tf.write(f"Goal: {goal}\n\n")
 
     # Emotion state init
     emotion_state = init_emotion_state(persona)
     # Lightweight progress tracker for TEA metadata
     user_goal_progress: float = 0.0
 
-    while steps < args.max_steps and time.time() < max_end:
+    while steps < max_steps and clock.time() < max_end:
+        # Step boundary: everything from the previous step reaches disk
+        writer.flush()
         steps += 1
         # Check goal reached
         curr_id = current_id
         reached = False
-        if args.target_id is not None:
-            reached = (curr_id == int(args.target_id))
+        if target_id is not None:
+            reached = (curr_id == int(target_id))
         elif target_name:
             reached = (normalize(id_to_name.get(curr_id, '')) == normalize(target_name))
         if reached:
             outcome = 'reached-target'
             log_event({'type': 'reached', 'screen': id_to_name.get(curr_id, ''), 'screen_id': curr_id, 'step': steps})
-            with open(transcript_path, 'a', encoding='utf-8') as tf:
+            with writer.transcript() as tf:
                 tf.write(f"Reached target at step {steps}: {id_to_name.get(curr_id, '')} (id={curr_id})\n")
             break
 
@@ -1788,7 +2215,7 @@ def main():
         for e in outgoing:
             label = (e.get('click_target') or e.get('user_intent') or e.get('destination_screen_name') or '').strip()
             # Do not truncate when TEA is enabled; keep full data for richer logs
-            if not args.tea and len(label) > 140:
+            if not tea and len(label) > 140:
                 label = label[:140] + '…'
             did = e.get('_dest_id') if isinstance(e.get('_dest_id'), int) else None
             options_brief.append({'to': id_to_name.get(did, ''), 'to_id': did, 'linkId': e.get('linkId'), 'label': label})
@@ -1796,35 +2223,34 @@ def main():
         thought = {
             'screen': id_to_name.get(curr_id, ''),
             'screen_id': curr_id,
-            'goal': args.goal,
+            'goal': goal,
             'available_actions': options_brief,
-            'timestamp': time.time(),
+            'timestamp': clock.time(),
         }
         log_event({'type': 'pre_action_thought', **thought})
 
         # New: Screen-first analysis (blind to links), traits-biased intent and decision
-        id_to_desc = getattr(build_node_maps, '_id_to_desc', {})  # type: ignore[attr-defined]
         screen_desc = id_to_desc.get(curr_id, '')
         screen_name_here = id_to_name.get(curr_id, '')
-        analysis = analyze_screen_llm(screen_name_here, screen_desc, persona, args.goal)
+        analysis = analyze_screen_llm(screen_name_here, screen_desc, persona, goal)
         first_intent_nl = analysis.get('intent_nl') or ''
         # Build enriched intention narrative
         archetype = detect_archetype(screen_name_here, screen_desc)
-        enriched_intent = build_enriched_intention(screen_name_here, screen_desc, args.goal, persona, archetype, steps)
+        enriched_intent = build_enriched_intention(screen_name_here, screen_desc, goal, persona, archetype, steps)
         first_decision_nl = choose_action_blind(enriched_intent, persona)
         # Try to realize the blind decision against available edges
-        first_edge = match_intent_to_edge(first_decision_nl, outgoing)
+        first_edge = ctx.match_intent(first_decision_nl, curr_id, outgoing)
         # Transcript: Only write legacy intention/result when TEA is disabled
-        if not args.tea:
+        if not tea:
             if first_edge is None:
-                with open(transcript_path, 'a', encoding='utf-8') as tf:
+                with writer.transcript() as tf:
                     tf.write(f"- First Action intention: {first_decision_nl}\n")
                 # Could not realize; log UX note and reveal options
                 frictions.append({'type': 'unclear_primary_cta_persona', 'screen_id': curr_id, 'screen_name': id_to_name.get(curr_id, ''), 'note': 'Blind decision not realizable; revealing options.'})
-                with open(transcript_path, 'a', encoding='utf-8') as tf:
+                with writer.transcript() as tf:
                     tf.write("- First Action result: Not found (no matching link). Revealing options…\n")
             else:
-                with open(transcript_path, 'a', encoding='utf-8') as tf:
+                with writer.transcript() as tf:
                     tf.write(f"- First Action intention: {first_decision_nl}\n")
                     tf.write(f"- First Action result: {first_edge.get('user_intent') or first_edge.get('click_target') or ''}\n")
                     # (Dedup UX notes: now summarized later under UX AUDIT (this screen))
@@ -1871,8 +2297,8 @@ def main():
                 })
 
         # Pre-compute wait edges and ranked prediction for current intent
-        wait_edges = [edge for edge in outgoing if is_wait_edge(edge)]
-        predicted_edge, ranked_list = choose_edge(args.goal, outgoing, args.target_id, distances, visited, scales)
+        wait_edges = ctx.wait_edges(curr_id, outgoing)
+        predicted_edge, ranked_list = ctx.rank_edges(goal, curr_id, outgoing, target_id, distances, visited, scales)
 
         # Persona-influenced selection of a non-top edge (if applicable)
         # We keep choose_edge unchanged, but tweak selection here to introduce variation.
@@ -1895,40 +2321,40 @@ def main():
                     predicted_edge = ranked_list[0][0]
 
         current_intent_for_tea: str = ''
-        with open(transcript_path, 'a', encoding='utf-8') as tf:
+        with writer.transcript() as tf:
             curr_img = image_path_by_id(screens_dir, curr_id, id_to_file)
             tf.write(f"Step {steps} - On '{id_to_name.get(curr_id, '')}' (id={curr_id})\n")
             tf.write(f"Image: {curr_img.name if curr_img else 'N/A'}\n")
-            if not args.tea:
-                tf.write(f"- I want to: {args.goal}\n")
+            if not tea:
+                tf.write(f"- I want to: {goal}\n")
             # Persona lens
-            if persona and not args.tea:
+            if persona and not tea:
                 po = extract_ocean(persona)
                 lens_bits = []
                 if po.get('C',0) >= 0.7: lens_bits.append('I prefer clear next steps')
                 if po.get('O',0) >= 0.7: lens_bits.append('I explore but still aim to progress')
                 if po.get('N',0) >= 0.7: lens_bits.append('I dislike uncertainty and long waits')
                 if po.get('E',1) <= 0.3: lens_bits.append('I value self-guided, explicit instructions')
-                if lens_bits and not args.tea:
+                if lens_bits and not tea:
                     tf.write(f"- Persona lens: {'; '.join(lens_bits)}.\n")
-            if options_brief and not args.tea:
+            if options_brief and not tea:
                 tf.write(f"- Options ({len(options_brief)}):\n")
                 for ob in options_brief[:8]:
                     tf.write(f"  • [linkId {ob.get('linkId')}] to '{ob.get('to')}' — {ob.get('label')}\n")
-            elif not args.tea:
+            elif not tea:
                 tf.write("- No available actions from this screen.\n")
             # If first action not realizable, decide second with revealed options
-            if first_edge is None and options_brief and not args.tea:
-                second_decision_nl = choose_action_blind(build_enriched_intention(screen_name_here, screen_desc, args.goal, persona, archetype, steps+1), persona)
+            if first_edge is None and options_brief and not tea:
+                second_decision_nl = choose_action_blind(build_enriched_intention(screen_name_here, screen_desc, goal, persona, archetype, steps+1), persona)
                 # Now match against options again (same matcher, now likely to find)
-                second_edge = match_intent_to_edge(second_decision_nl, outgoing) or (ranked_list[0][0] if 'ranked_list' in locals() and ranked_list else None)
+                second_edge = ctx.match_intent(second_decision_nl, curr_id, outgoing) or (ranked_list[0][0] if 'ranked_list' in locals() and ranked_list else None)
                 if second_edge is not None:
                     tf.write(f"- Second Action intention: {second_decision_nl}\n")
                     tf.write(f"- Second Action result: {build_enriched_result(second_edge, archetype, steps)}\n")
                     predicted_edge = second_edge
             # Replace legacy intention/result lines only when TEA is disabled
             current_intent_for_tea = first_intent_nl or current_intent_for_tea
-            if not args.tea:
+            if not tea:
                 if first_edge is None:
                     tf.write(f"- First Action intention: {first_decision_nl}\n")
                     tf.write("- First Action result: Not found (no matching link). Revealing options…\n")
@@ -1956,10 +2382,10 @@ def main():
             # Log intent during wait
             log_event({'type': 'waiting', 'screen': id_to_name.get(curr_id, ''), 'screen_id': curr_id, 'note': 'Auto/wait transition detected; proceeding without action', 'linkId': chosen.get('linkId')})
             frictions.append({'type': 'auto_wait', 'screen_id': curr_id, 'screen_name': id_to_name.get(curr_id, ''), 'note': 'Screen auto-advances'})
-            with open(transcript_path, 'a', encoding='utf-8') as tf:
+            with writer.transcript() as tf:
                 tf.write("- I see this screen auto-advances; I will wait briefly and let it proceed.\n")
             # dynamic wait for auto-advance
-            base_wait = 0.8 if (args.max_minutes and float(args.max_minutes) <= 2.0) else 1.2
+            base_wait = 0.8 if (max_minutes and float(max_minutes) <= 2.0) else 1.2
             wait_s = compute_dynamic_wait_seconds(
                 base=base_wait,
                 screen_desc=screen_desc,
@@ -1969,6 +2395,7 @@ def main():
                 persona=persona,
                 auto_wait=True,
             )
+            clock.advance(wait_s)
         else:
             # Persona-influenced realistic wait (base ~3s, +/- up to ~1s; clamp 0.5–5s)
             # dynamic wait using screen + persona + emotion + clarity
@@ -1980,7 +2407,7 @@ def main():
                 approx_gap = float(top_sc - second_sc)
             except Exception:
                 approx_gap = 1.0
-            base_wait = 1.2 if (args.max_minutes and float(args.max_minutes) <= 2.0) else 2.6
+            base_wait = 1.2 if (max_minutes and float(max_minutes) <= 2.0) else 2.6
             wait_s = compute_dynamic_wait_seconds(
                 base=base_wait,
                 screen_desc=screen_desc,
@@ -1990,7 +2417,7 @@ def main():
                 persona=persona,
                 auto_wait=False,
             )
-            with open(transcript_path, 'a', encoding='utf-8') as tf:
+            with writer.transcript() as tf:
                 tf.write(f"- Pause: I'll reflect for ~{wait_s:.1f}s before acting.\n")
             # Persona anxiety about waiting
             if persona and extract_ocean(persona).get('N', 0.0) >= 0.7 and wait_s >= 3.5:
@@ -2000,7 +2427,7 @@ def main():
                     'screen_name': id_to_name.get(curr_id, ''),
                     'note': 'Longer reflection time may increase anxiety for this persona',
                 })
-            time.sleep(wait_s)
+            clock.sleep(wait_s)
 
         # Emotion event (after thought and before action)
         top_score = ranked_list[0][1] if ranked_list else 0.0
@@ -2026,7 +2453,7 @@ def main():
             'screen': id_to_name.get(curr_id, ''),
             'screen_id': curr_id,
             'step': steps,
-            'timestamp': time.time(),
+            'timestamp': clock.time(),
             'emotion': {
                 'valence': emotion_state['valence'],
                 'arousal': emotion_state['arousal'],
@@ -2036,7 +2463,7 @@ def main():
                 'label': emotion_label,
             },
         })
-        with open(transcript_path, 'a', encoding='utf-8') as tf:
+        with writer.transcript() as tf:
             tf.write(f"- Emotion: {describe_emotion(emotion_label, emotion_state, persona)}\n")
 
         if not outgoing:
@@ -2068,7 +2495,7 @@ def main():
             for note in analysis['ux_notes']:
                 step_frictions.append({'type': 'note', 'screen_id': curr_id, 'screen_name': id_to_name.get(curr_id, ''), 'note': note})
         if step_frictions:
-            with open(transcript_path, 'a', encoding='utf-8') as tf:
+            with writer.transcript() as tf:
                 tf.write("- UX AUDIT (this screen):\n")
                 # Deduplicate by (problem, recommendation)
                 seen = set()
@@ -2091,12 +2518,12 @@ def main():
             'chosen_user_intent': chosen.get('user_intent'),
             'destination': dest,
             'destination_id': dest_id,
-            'timestamp': time.time(),
+            'timestamp': clock.time(),
         })
-        with open(transcript_path, 'a', encoding='utf-8') as tf:
-            if not args.tea:
+        with writer.transcript() as tf:
+            if not tea:
                 tf.write(f"→ Take linkId {chosen.get('linkId')} to '{dest}' (id={dest_id}).\n\n")
-            if args.tea:
+            if tea:
                 from_name = id_to_name.get(curr_id, '')
                 # Prepare richer TEA block per requested structure
                 perception_text = build_tea_header(from_name, screen_desc, archetype, options_brief, steps)
@@ -2145,11 +2572,11 @@ def main():
 
                 # Provide a single blank line separation for readability
                 tf.write("\n")
-                tea_block_full = render_tea_block_full(
+                tea_record = build_tea_record(
                     tea_idx=steps,
                     screen_name=from_name,
                     screen_id=curr_id,
-                    goal=args.goal,
+                    goal=goal,
                     persona=persona,
                     image_name=(curr_img.name if 'curr_img' in locals() and curr_img else ''),
                     time_spent=wait_s,
@@ -2184,9 +2611,14 @@ def main():
                     friction_points_mapped=friction_points_mapped,
                     positive_moments=positive_moments,
                     suggestions=suggestions,
+                    link_id=chosen.get('linkId'),
+                    outcome_to_id=dest_id,
+                    action_intent=(chosen.get('user_intent') or ''),
                 )
-                tf.write(tea_block_full)
+                tf.write(render_tea_record(tea_record))
                 tf.write("\n")
+                writer.tea(tea_record)
+                tea_records.append(tea_record)
                 tea_entries.append({
                     'step': steps,
                     'screen': from_name,
@@ -2217,7 +2649,7 @@ def main():
             outcome = 'loop-detected'
             log_event({'type': 'stuck', 'screen': id_to_name.get(current_id, ''), 'screen_id': current_id, 'reason': 'loop detected'})
             frictions.append({'type': 'loop_detected', 'screen_id': current_id})
-            with open(transcript_path, 'a', encoding='utf-8') as tf:
+            with writer.transcript() as tf:
                 tf.write("[LOOP DETECTED] Repeated oscillation between the same screens; terminating early.\n")
             break
 
@@ -2228,39 +2660,21 @@ def main():
     path_summary = {
         'outcome': outcome,
         'steps': steps,
-        'time_sec': round(time.time() - start_ts, 2),
+        'time_sec': round(clock.time() - start_ts, 2),
     }
     path_path.write_text(json.dumps(path_summary, ensure_ascii=False, indent=2), encoding='utf-8')
     end_event = {'type': 'end', **path_summary}
     if persona:
         end_event['persona'] = {'id': persona.get('id'), 'name': persona.get('name')}
     log_event(end_event)
+    writer.close()
     # Build user-facing report
     completed = (outcome == 'reached-target')
     drop_off_points: List[Dict[str, Any]] = []
     if not completed:
         drop_off_points.append({'screen_id': (visited[-1] if visited else None), 'reason': outcome})
     # Collect thoughts from simulation logs
-    thoughts: List[str] = []
-    try:
-        with open(log_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                try:
-                    event = json.loads(line.strip())
-                    if event.get('type') == 'pre_action_thought':
-                        # Extract thought content from available actions
-                        available_actions = event.get('available_actions', [])
-                        if available_actions:
-                            # Generate diverse, persona-aware thoughts
-                            thought = generate_diverse_thought(available_actions, persona, event)
-                            if thought:
-                                thoughts.append(thought)
-                except json.JSONDecodeError:
-                    continue
-    except Exception:
-        pass
+    thoughts = collect_thoughts(log_path, persona)
 
     # Feedback heuristics
     feedback: List[str] = []
@@ -2328,9 +2742,9 @@ def main():
         enriched_frictions.append(enriched)
 
     report = {
-        'task': args.goal,
+        'task': goal,
         'source_id': int(source_id),
-        'target_id': int(args.target_id) if args.target_id is not None else None,
+        'target_id': int(target_id) if target_id is not None else None,
         'status': 'completed' if completed else 'not_completed',
         'steps': int(path_summary.get('steps', 0)),
         'time_sec': float(path_summary.get('time_sec', 0.0)),
@@ -2340,65 +2754,136 @@ def main():
         'actions': actions_taken,
         'thoughts': thoughts,
     }
-    if args.tea:
+    if tea:
         report['tea'] = tea_entries
-    if args.ux_audit:
+    if ux_audit:
         ux_issues = [map_friction_to_ux_issue(id_to_name.get(fp.get('screen_id'), ''), fp) for fp in enriched_frictions]
         report['ux_audit'] = { 'issues': ux_issues }
     if persona:
         report['persona'] = {'id': persona.get('id'), 'name': persona.get('name')}
-    if args.resolved_user_id is not None:
-        report['user_id'] = int(args.resolved_user_id)
+    if resolved_user_id is not None:
+        report['user_id'] = int(resolved_user_id)
     user_report_json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
     # Text version
-    with open(user_report_txt, 'w', encoding='utf-8') as tf:
-        tf.write(f"Task completion status: {'completed' if completed else 'not completed'}\n")
-        tf.write(f"Steps: {report['steps']} | Time: {report['time_sec']}s\n")
-        tf.write("Friction points:\n")
-        if enriched_frictions:
-            for fp in enriched_frictions:
-                tf.write(f"- {fp.get('description')}\n")
-        else:
-            tf.write("- None\n")
-        tf.write("Drop-off points:\n")
-        if drop_off_points:
-            for dp in drop_off_points:
-                tf.write(f"- screen_id={dp.get('screen_id')} reason={dp.get('reason')}\n")
-        else:
-            tf.write("- None\n")
-        tf.write("Feedback:\n")
-        if feedback:
-            for f in feedback:
-                tf.write(f"- {f}\n")
-        else:
-            tf.write("- (no additional feedback)\n")
-        tf.write("Thoughts:\n")
-        if thoughts:
-            for t in thoughts:
-                tf.write(f"- {t}\n")
-        else:
-            tf.write("- (no thoughts recorded)\n")
-        if args.tea and tea_entries:
-            tf.write("\nTEA Logs:\n")
-            for te in tea_entries:
-                tf.write(f"- step={te['step']} screen='{te['screen']}' emotion={te['emotion']} hesitation={te['hesitation']} action='{te['action']}' → {te['outcome_to']}\n")
-        if args.ux_audit:
-            tf.write("\nUX AUDIT (issues):\n")
-            if report.get('ux_audit', {}).get('issues'):
-                for issue in report['ux_audit']['issues']:
-                    tf.write(f"- screen='{issue.get('screen','')}'\n  problem: {issue.get('problem','')}\n  heuristic: {issue.get('heuristic','')}\n  recommendation: {issue.get('recommendation','')}\n")
-            else:
-                tf.write("- None\n")
+    write_user_report_txt(user_report_txt, report)
     print(f"Traversal complete → {sim_dir}\nOutcome: {outcome}; steps={steps}")
 
-    # Write smart condensed TEA log alongside transcript
+    # Write smart condensed TEA log alongside transcript (transcript is normalized as written)
     try:
-        # Normalize transcript formatting before generating derived logs
-        normalize_transcript_file(transcript_path)
         condensed = sim_dir / 'smart_condensed_TEA_log.txt'
-        write_smart_condensed_log(transcript_path, condensed)
+        write_smart_condensed_log(transcript_path, condensed, records=tea_records)
     except Exception:
         pass
+    return sim_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate user traversal over the graph to reach a target screen (supports persona-based runs)')
+    parser.add_argument('--run-dir', default=None, help='Path to logs/run_* folder (defaults to latest)')
+    parser.add_argument('--source', required=False, help='Source screen name (human)')
+    parser.add_argument('--source-id', type=int, default=None, help='Source screen_nodes integer ID (preferred)')
+    parser.add_argument('--target-name', default=None, help='Target screen name (human)')
+    parser.add_argument('--target-id', type=int, default=None, help='Target screen_nodes integer ID (if known)')
+    parser.add_argument('--goal', required=True, help='User goal description')
+    parser.add_argument('--max-minutes', type=float, default=15.0, help='Max simulation time in minutes (default: 15)')
+    parser.add_argument('--max-steps', type=int, default=50, help='Max steps (default: 50)')
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--persona-json', default=str(ROOT / 'users' / 'users.json'), help='Path to personas JSON list')
+    parser.add_argument('--persona-id', type=int, default=None, help='Single persona id to run; if omitted, no persona bias')
+    parser.add_argument('--persona-folder-name', default=None, help='If set, place simulations under run_dir/<persona-folder-name>/simulations')
+    parser.add_argument('--append', action='store_true', help='Append to existing simulations instead of purging the folder')
+    parser.add_argument('--sim-dir', default=None, help='Exact simulation folder to write (default: <simulations>/<timestamp>)')
+    parser.add_argument('--resolved-user-id', type=int, default=None, help='Concrete resolved user id for this simulation (if any)')
+    parser.add_argument('--source-image', default=None, help='Path to source screen image (e.g., source.png)')
+    parser.add_argument('--target-image', default=None, help='Path to target screen image (e.g., target.png)')
+    parser.add_argument('--tea', dest='tea', action='store_true', default=True, help='Emit TEA logs per step in transcript and report (default: on)')
+    parser.add_argument('--no-tea', dest='tea', action='store_false', help='Disable TEA logs')
+    parser.add_argument('--ux-audit', dest='ux_audit', action='store_true', default=True, help='Include UX audit issues in report (default: on)')
+    parser.add_argument('--no-ux-audit', dest='ux_audit', action='store_false', help='Disable UX audit issues')
+    parser.add_argument('--virtual-clock', dest='virtual_clock', action='store_true', default=os.getenv('SIM_VIRTUAL_CLOCK', '0').strip().lower() in {'1', 'true', 'yes', 'on'}, help='Advance a simulated clock for pauses instead of sleeping (default from SIM_VIRTUAL_CLOCK)')
+    parser.add_argument('--wall-clock', dest='virtual_clock', action='store_false', help='Sleep through pauses in real time')
+    args = parser.parse_args()
+
+    logs_dir = ROOT / 'logs'
+    run_dir = pathlib.Path(args.run_dir) if args.run_dir else (list_run_dirs(logs_dir)[0] if list_run_dirs(logs_dir) else None)
+    if not run_dir or not run_dir.exists():
+        raise SystemExit('Could not resolve run-dir; please pass --run-dir')
+
+    # Load artifacts
+    ctx = load_traversal_context(run_dir)
+    # Load the screen hash index for matching if needed
+    screen_hashes = None
+    if args.source_image or args.target_image:
+        screen_hashes = ctx.screen_hashes()
+
+    # Resolve source
+    source_name = find_screen_name_match(ctx.screen_names, args.source) if args.source else None
+    # Resolve target
+    target_name: Optional[str] = None
+    if args.target_id is not None:
+        target_name = ctx.id_to_name.get(int(args.target_id))
+    if not target_name and args.target_name:
+        target_name = find_screen_name_match(ctx.screen_names, args.target_name)
+    if not target_name:
+        # As a fallback, pick the best match to the goal terms among screen names
+        target_name = find_screen_name_match(ctx.screen_names, args.target_name or '') or args.target_name or ''
+
+    # Optional single persona to influence decision-making
+    persona: Optional[Dict[str, Any]] = None
+    if args.persona_id is not None:
+        persona = find_persona(load_personas(pathlib.Path(args.persona_json)), args.persona_id)
+
+    # Build simulations root (purge previous simulations)
+    if args.persona_folder_name:
+        sims_root = run_dir / args.persona_folder_name / 'simulations'
+        persona_root = sims_root.parent
+        persona_root.mkdir(parents=True, exist_ok=True)
+    else:
+        sims_root = run_dir / 'simulations'
+    if sims_root.exists() and not args.append:
+        try:
+            shutil.rmtree(sims_root)
+        except Exception:
+            pass
+    sims_root.mkdir(parents=True, exist_ok=True)
+    sim_dir = pathlib.Path(args.sim_dir) if args.sim_dir else sims_root / time.strftime('%Y%m%d_%H%M%S')
+
+    # Validate source id
+    # Allow source-image matching
+    source_id = None
+    if args.source_image:
+        source_id = match_image_to_id(pathlib.Path(args.source_image), screen_hashes)
+    if not isinstance(source_id, int):
+        source_id = args.source_id if args.source_id is not None else (ctx.name_to_id.get(source_name) if source_name else None)
+    if not isinstance(source_id, int):
+        # Try alias mapping from provided source name
+        if args.source:
+            source_id = ctx.alias_to_id.get(normalize(args.source))
+    if not isinstance(source_id, int):
+        raise SystemExit('Source screen id could not be resolved (pass --source-id)')
+
+    # Allow target-image matching
+    if args.target_image and args.target_id is None:
+        best = match_image_to_id(pathlib.Path(args.target_image), screen_hashes)
+        if isinstance(best, int):
+            args.target_id = int(best)
+
+    run_traversal(
+        ctx,
+        sim_dir=sim_dir,
+        goal=args.goal,
+        source_id=int(source_id),
+        target_id=args.target_id,
+        target_name=target_name,
+        persona=persona,
+        max_minutes=args.max_minutes,
+        max_steps=args.max_steps,
+        tea=args.tea,
+        ux_audit=args.ux_audit,
+        resolved_user_id=args.resolved_user_id,
+        verbose=args.verbose,
+        virtual_clock=args.virtual_clock,
+    )
 
 
 if __name__ == '__main__':
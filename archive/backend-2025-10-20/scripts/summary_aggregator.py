@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Streaming persona/global summaries for run_persona_inplace.py.
+
+Each finished persona-user job hands its result row to StreamingSummary.add. The
+aggregator keeps rows per persona and, at most every interval, atomically rewrites
+tests/persona_<slot>/summary.json, tests/persona_summary.json and
+tests/persona_summary.csv, so summaries are readable while a run is in progress.
+Rows are ordered by persona slot then simulation folder, which makes the final
+files identical to a post-run scan of the simulation folders.
+"""
+
+import csv
+import io
+import json
+import os
+import pathlib
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+
+MAJOR_FINDINGS = {
+    'crux': 'Focus on clarifying primary CTAs, reducing ambiguity and auto-advance confusion, and avoiding loops; consider progress cues and shorter paths.',
+    'themes': [
+        'Make primary next actions visually dominant and consistently labeled',
+        'Provide progress indicators / reduce auto-advance ambiguity',
+        'Prevent loops via clearer hierarchy and guardrails',
+        'Shorten the critical path where possible'
+    ]
+}
+
+CSV_FIELDS = [
+    'persona_id', 'persona_name', 'status', 'steps', 'time_sec', 'source_id', 'target_id',
+    'friction_count', 'dropoff_count', 'feedback_count', 'friction_types', 'dropoff_reasons', 'actions_path', 'user_report_text', 'sim_dir'
+]
+
+
+def write_atomic(path: pathlib.Path, text: str) -> None:
+    path = pathlib.Path(path)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(tmp, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def actions_to_path(actions):
+    if not actions:
+        return ''
+    seq = []
+    first = actions[0].get('from_id')
+    if isinstance(first, int):
+        seq.append(str(first))
+    for a in actions:
+        toid = a.get('to_id')
+        if isinstance(toid, int):
+            seq.append(str(toid))
+    return ' -> '.join(seq)
+
+
+def result_row(pid: int, name: str, sim_dir: pathlib.Path, report: Optional[dict] = None) -> Optional[dict]:
+    """Summary row for one simulation folder (report defaults to its user_report.json)."""
+    sim_dir = pathlib.Path(sim_dir)
+    if report is None:
+        rpt = sim_dir / 'user_report.json'
+        if not rpt.exists():
+            return None
+        report = json.loads(rpt.read_text(encoding='utf-8'))
+    data = dict(report)
+    rpt_path = sim_dir / 'user_report.txt'
+    if rpt_path.exists():
+        try:
+            data['user_report_text'] = rpt_path.read_text(encoding='utf-8')
+        except Exception:
+            data['user_report_text'] = ''
+    data['sim_dir'] = str(sim_dir)
+    sim_persona = (data.get('persona') or {}) if isinstance(data.get('persona'), dict) else {}
+    user_id = sim_persona.get('id') if sim_persona else None
+    return {'persona_id': pid, 'persona_name': name, 'user_id': user_id, **data}
+
+
+class StreamingSummary:
+    def __init__(
+        self,
+        run_dir: pathlib.Path,
+        tests_root: pathlib.Path,
+        personas: List[Tuple[int, str]],
+        *,
+        source_id: Any = '',
+        target_id: Any = '',
+        expected: int = 0,
+        interval_sec: Optional[float] = None,
+    ):
+        self.run_dir = run_dir
+        self.tests_root = pathlib.Path(tests_root)
+        self.personas = list(personas)
+        self.source_id = source_id
+        self.target_id = target_id
+        self.expected = int(expected)
+        if interval_sec is None:
+            interval_sec = float(os.getenv('TESTS_SUMMARY_INTERVAL_SEC', '2'))
+        self.interval_sec = interval_sec
+        self._rows: Dict[int, List[dict]] = {pid: [] for pid, _ in self.personas}
+        self._dirty: set[int] = set()
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+
+    def add(self, pid: int, row: Optional[dict]) -> None:
+        """Record one finished simulation and rewrite summaries if the interval elapsed."""
+        if not row:
+            return
+        with self._lock:
+            self._rows.setdefault(pid, []).append(row)
+            self._dirty.add(pid)
+            if time.monotonic() - self._last_write >= self.interval_sec:
+                self._write(final=False)
+
+    def finish(self) -> Dict[str, Any]:
+        with self._lock:
+            self._dirty.update(self._rows)
+            return self._write(final=True)
+
+    def _ordered(self, pid: int) -> List[dict]:
+        return sorted(self._rows.get(pid) or [], key=lambda r: pathlib.Path(r.get('sim_dir') or '').name)
+
+    def _write(self, *, final: bool) -> Dict[str, Any]:
+        self._last_write = time.monotonic()
+        names = dict(self.personas)
+        results: List[dict] = []
+        for pid, name in self.personas:
+            persona_results = self._ordered(pid)
+            results.extend(persona_results)
+            if pid not in self._dirty:
+                continue
+            try:
+                p_total = len(persona_results)
+                p_completed = sum(1 for r in persona_results if r.get('status') == 'completed')
+                p_summary = {
+                    'persona_id': pid,
+                    'persona_name': names.get(pid, name),
+                    'runs': persona_results,
+                    'aggregate': {
+                        'completed_total': p_completed,
+                        'total': p_total,
+                        'completion_rate_pct': round((p_completed / p_total) * 100.0, 2) if p_total else 0.0,
+                        'avg_steps': round(sum(r.get('steps') or 0 for r in persona_results) / p_total, 2) if p_total else 0.0,
+                    }
+                }
+                write_atomic(self.tests_root / f'persona_{pid}' / 'summary.json', json.dumps(p_summary, ensure_ascii=False, indent=2))
+            except Exception:
+                pass
+        self._dirty.clear()
+
+        aggregate = self.aggregate(results)
+        summary = {
+            'run_dir': str(self.run_dir),
+            'results': results,
+            'aggregate': aggregate,
+            'progress': {'done': len(results), 'expected': self.expected, 'final': final},
+        }
+        write_atomic(self.tests_root / 'persona_summary.json', json.dumps(summary, ensure_ascii=False, indent=2))
+        write_atomic(self.tests_root / 'persona_summary.csv', self._csv(results, aggregate))
+        return summary
+
+    @staticmethod
+    def aggregate(results: List[dict]) -> Dict[str, Any]:
+        total = len(results)
+        completed = sum(1 for r in results if r.get('status') == 'completed')
+        friction_counter = Counter()
+        screen_counter = Counter()
+        feedback_counter = Counter()
+        not_completed = []
+        for r in results:
+            for fp in (r.get('friction_points') or []):
+                ftype = fp.get('type') or 'unknown'
+                friction_counter[ftype] += 1
+                sid = fp.get('screen_id')
+                if isinstance(sid, int):
+                    screen_counter[sid] += 1
+            for fb in (r.get('feedback') or []):
+                feedback_counter[fb] += 1
+            if r.get('status') != 'completed':
+                reason = (r.get('drop_off_points') or [{}])[-1].get('reason') if (r.get('drop_off_points') or []) else 'unknown'
+                not_completed.append({'persona_id': r.get('persona_id'), 'persona_name': r.get('persona_name'), 'reason': reason})
+        return {
+            'personas_total': total,
+            'completed_total': completed,
+            'completion_rate_pct': round((completed / total) * 100.0, 2) if total else 0.0,
+            'avg_steps': round(sum(r.get('steps') or 0 for r in results) / total, 2) if total else 0.0,
+            'avg_time_sec': round(sum(r.get('time_sec') or 0.0 for r in results) / total, 2) if total else 0.0,
+            'top_friction_types': [{'type': t, 'count': c} for (t, c) in friction_counter.most_common(5)],
+            'top_feedback': [{'text': t, 'count': c} for (t, c) in feedback_counter.most_common(5)],
+            'top_friction_screens': [{'screen_id': sid, 'count': c} for (sid, c) in screen_counter.most_common(5)],
+            'not_completed': not_completed,
+            'major_findings': MAJOR_FINDINGS,
+        }
+
+    def _csv(self, results: List[dict], aggregate: Dict[str, Any]) -> str:
+        buf = io.StringIO()
+        w = csv.DictWriter(buf, fieldnames=CSV_FIELDS)
+        w.writeheader()
+        for r in results:
+            frictions = r.get('friction_points') or []
+            friction_types = sorted({fp.get('type') or 'unknown' for fp in frictions})
+            dropoffs = r.get('drop_off_points') or []
+            drop_reasons = sorted({dp.get('reason') or '' for dp in dropoffs if dp})
+            w.writerow({
+                'persona_id': r.get('persona_id') or (r.get('persona') or {}).get('id'),
+                'persona_name': r.get('persona_name') or (r.get('persona') or {}).get('name'),
+                'status': r.get('status'),
+                'steps': r.get('steps'),
+                'time_sec': r.get('time_sec'),
+                'source_id': r.get('source_id'),
+                'target_id': r.get('target_id'),
+                'friction_count': len(frictions),
+                'dropoff_count': len(dropoffs),
+                'feedback_count': len(r.get('feedback') or []),
+                'friction_types': '; '.join(friction_types),
+                'dropoff_reasons': '; '.join(drop_reasons),
+                'actions_path': actions_to_path(r.get('actions') or []),
+                'user_report_text': r.get('user_report_text') or '',
+                'sim_dir': r.get('sim_dir') or '',
+            })
+        completed = aggregate['completed_total']
+        total = aggregate['personas_total']
+        completion_rate = aggregate['completion_rate_pct']
+        avg_steps = aggregate['avg_steps']
+        avg_time = aggregate['avg_time_sec']
+        top_friction = [(x['type'], x['count']) for x in aggregate['top_friction_types']]
+        top_feedback = [(x['text'], x['count']) for x in aggregate['top_feedback']]
+        top_screens = [(x['screen_id'], x['count']) for x in aggregate['top_friction_screens']]
+        summary_text = (
+            f"Completion: {completed}/{total} ({completion_rate}%). "
+            f"Avg steps: {avg_steps}, Avg time: {avg_time}s. "
+            f"Top frictions: " + ', '.join(f"{t}:{c}" for (t, c) in top_friction) + ". "
+            f"Top feedback: " + ' | '.join(f"{t}:{c}" for (t, c) in top_feedback) + ". "
+            f"Themes: " + ' | '.join(aggregate.get('major_findings', {}).get('themes', []))
+        )
+        w.writerow({
+            'persona_id': 'ALL',
+            'persona_name': 'SUMMARY',
+            'status': f'{completed}/{total} completed ({completion_rate}%)',
+            'steps': avg_steps,
+            'time_sec': avg_time,
+            'source_id': self.source_id,
+            'target_id': self.target_id,
+            'friction_count': sum(len(r.get('friction_points') or []) for r in results),
+            'dropoff_count': sum(len(r.get('drop_off_points') or []) for r in results),
+            'feedback_count': sum(len(r.get('feedback') or []) for r in results),
+            'friction_types': '; '.join(f"{t}:{c}" for (t, c) in top_friction),
+            'dropoff_reasons': '; '.join(sorted({(r.get('drop_off_points') or [{}])[-1].get('reason') or '' for r in results if (r.get('drop_off_points') or [])})),
+            'actions_path': '',
+            'user_report_text': summary_text,
+            'sim_dir': 'TopScreens: ' + ' | '.join(f"{sid}:{c}" for (sid, c) in top_screens),
+        })
+        return buf.getvalue()
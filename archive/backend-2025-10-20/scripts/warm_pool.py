@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Pre-warmed interpreter pool (zygote) for pipeline stages and per-user simulations.
+
+Instead of exec'ing a fresh `python script.py ...` per stage, WarmPool starts one
+zygote process (`warm_pool.py --serve`) that imports the heavy shared
+dependencies once (PRELOAD: google.generativeai, PIL, requests, dotenv, numpy)
+and then forks a child per job. The child switches to the job's cwd and
+environment and runs the script as __main__ with the job's argv, so it behaves
+as if started from the command line; its exit status is returned like
+subprocess.run's returncode. Children share the caller's stdout/stderr.
+
+The zygote is single-threaded (forking is safe even though callers submit from
+a thread pool). It reads requests as JSON lines on stdin and reports exit codes
+on a separate pipe; it exits when the caller closes stdin.
+
+pool.run() returns None when a command cannot run warm (different interpreter,
+not a script or `-c` command, no fork on this platform, zygote gone), and the
+caller falls back to a subprocess. WARM_POOL=0 disables the pool.
+WARM_POOL_MEASURE=1 times a cold interpreter start with the same imports
+against a warm fork and reports the startup time saved per job and in total.
+"""
+
+import argparse
+import atexit
+import json
+import os
+import runpy
+import select
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+
+PRELOAD = ['google.generativeai', 'PIL.Image', 'PIL.ImageDraw', 'requests', 'dotenv', 'numpy']
+
+
+def warm_pool_enabled() -> bool:
+    return os.getenv('WARM_POOL', '1').strip().lower() not in {'0', 'false', 'no', 'off'}
+
+
+def _same_interpreter(cmd0: str) -> bool:
+    path = shutil.which(cmd0) or cmd0
+    try:
+        return os.path.realpath(path) == os.path.realpath(sys.executable)
+    except Exception:
+        return False
+
+
+# ---- zygote side ----
+
+def _exec_job(argv: List[str], cwd: str, env: Dict[str, str]) -> int:
+    """In the forked child: become `python <argv...>` run from cwd with env."""
+    try:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(env)
+        if argv[0] == '-c':
+            sys.argv = ['-c'] + argv[2:]
+            sys.path.insert(0, '')
+            exec(compile(argv[1], '<string>', 'exec'), {'__name__': '__main__', '__builtins__': __builtins__})
+        else:
+            script = os.path.abspath(argv[0])
+            sys.argv = [argv[0]] + argv[1:]
+            sys.path.insert(0, os.path.dirname(script))
+            runpy.run_path(script, run_name='__main__')
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        traceback.print_exc()
+        return 1
+
+
+def _finalize_job() -> None:
+    """In the forked child: the interpreter shutdown steps os._exit skips.
+
+    Like a real `python script.py` exit: wait for non-daemon threads, run atexit
+    handlers (including weakref.finalize callbacks), then flush stdio.
+    """
+    try:
+        threading._shutdown()  # type: ignore[attr-defined]
+    except BaseException:
+        traceback.print_exc()
+    try:
+        atexit._run_exitfuncs()
+    except BaseException:
+        traceback.print_exc()
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            pass
+
+
+def serve(result_fd: int, preload: List[str]) -> None:
+    for mod in preload:
+        try:
+            __import__(mod)
+        except Exception:
+            pass
+    results = os.fdopen(result_fd, 'w', buffering=1)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    # SIGCHLD wakes select() so exit codes are reported without polling delay
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_w, False)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+    signal.set_wakeup_fd(wake_w)
+    running: Dict[int, str] = {}
+    stdin = sys.stdin.buffer
+    buf = b''
+    eof = False
+    while not eof or running:
+        ready, _, _ = select.select([wake_r] if eof else [stdin, wake_r], [], [], 1.0)
+        if wake_r in ready:
+            os.read(wake_r, 4096)
+        if stdin in ready:
+            chunk = os.read(stdin.fileno(), 65536)
+            if not chunk:
+                eof = True
+            buf += chunk
+            while b'\n' in buf:
+                line, buf = buf.split(b'\n', 1)
+                req = json.loads(line)
+                sys.stdout.flush()
+                sys.stderr.flush()
+                pid = os.fork()
+                if pid == 0:
+                    signal.set_wakeup_fd(-1)
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    os.close(wake_r)
+                    os.close(wake_w)
+                    os.dup2(devnull, 0)
+                    results.close()
+                    rc = _exec_job(req['argv'], req['cwd'], req['env'])
+                    try:
+                        _finalize_job()
+                    finally:
+                        os._exit(rc & 0xFF)
+                running[pid] = req['id']
+        while running:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            rc = os.waitstatus_to_exitcode(status)
+            if rc < 0:
+                # Killed by a signal: report it like a shell would
+                rc = 128 - rc
+            job_id = running.pop(pid, None)
+            if job_id is not None:
+                results.write(json.dumps({'id': job_id, 'exit_code': rc}) + '\n')
+
+
+# ---- caller side ----
+
+class WarmPool:
+    def __init__(self, preload: Optional[List[str]] = None, *, measure: Optional[bool] = None, label: str = '[warm_pool]'):
+        self.preload = list(preload if preload is not None else PRELOAD)
+        self.label = label
+        if measure is None:
+            measure = os.getenv('WARM_POOL_MEASURE', '').strip().lower() in {'1', 'true', 'yes', 'on'}
+        self.measure = measure
+        self.jobs: List[Dict[str, Any]] = []
+        self.cold_start_sec: Optional[float] = None
+        self.warm_start_sec: Optional[float] = None
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self._calibrate_lock = threading.Lock()
+        self._waiters: Dict[str, list] = {}
+        self._next_id = 0
+        if warm_pool_enabled() and hasattr(os, 'fork'):
+            try:
+                self._start()
+            except Exception as e:
+                print(f"{label} unavailable, using subprocesses: {e}", file=sys.stderr)
+                self._proc = None
+
+    def _start(self) -> None:
+        r, w = os.pipe()
+        try:
+            self._proc = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--serve', '--result-fd', str(w), '--preload', ','.join(self.preload)],
+                stdin=subprocess.PIPE,
+                pass_fds=(w,),
+            )
+        finally:
+            os.close(w)
+        threading.Thread(target=self._read_results, args=(r,), daemon=True).start()
+
+    def _read_results(self, fd: int) -> None:
+        with os.fdopen(fd, 'r') as f:
+            for line in f:
+                try:
+                    res = json.loads(line)
+                except Exception:
+                    continue
+                with self._lock:
+                    waiter = self._waiters.pop(res.get('id'), None)
+                if waiter is not None:
+                    waiter[1] = int(res.get('exit_code', 1))
+                    waiter[0].set()
+        # Zygote exited: jobs still waiting are reported as failed (not re-run)
+        with self._lock:
+            self._proc = None
+            pending, self._waiters = self._waiters, {}
+        for waiter in pending.values():
+            waiter[1] = 1
+            waiter[0].set()
+
+    @property
+    def available(self) -> bool:
+        return self._proc is not None
+
+    def _submit(self, argv: List[str], cwd: str, env: Dict[str, str]) -> Optional[int]:
+        waiter: list = [threading.Event(), None]
+        with self._lock:
+            if self._proc is None or self._proc.stdin is None:
+                return None
+            self._next_id += 1
+            job_id = str(self._next_id)
+            self._waiters[job_id] = waiter
+            try:
+                self._proc.stdin.write((json.dumps({'id': job_id, 'argv': argv, 'cwd': cwd, 'env': env}) + '\n').encode('utf-8'))
+                self._proc.stdin.flush()
+            except Exception:
+                self._waiters.pop(job_id, None)
+                return None
+        waiter[0].wait()
+        return waiter[1]
+
+    def run(self, cmd: List[str], *, cwd: str, env: Optional[Dict[str, str]] = None, label: Optional[str] = None) -> Optional[int]:
+        """Run `cmd` (interpreter, script/-c, args...) in a warm child and return its exit
+        code; None when it must be run as a regular subprocess instead."""
+        if self._proc is None or len(cmd) < 2 or not _same_interpreter(cmd[0]):
+            return None
+        argv = list(cmd[1:])
+        if argv[0].startswith('-') and (argv[0] != '-c' or len(argv) < 2):
+            return None
+        if self.measure:
+            self._calibrate()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        t0 = time.perf_counter()
+        rc = self._submit(argv, str(cwd), dict(env if env is not None else os.environ))
+        if rc is None:
+            return None
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.jobs.append({'label': label or argv[0], 'sec': round(elapsed, 3), 'exit_code': rc})
+        if self.measure:
+            saved = (self.cold_start_sec or 0.0) - (self.warm_start_sec or 0.0)
+            print(f"{self.label} {label or argv[0]}: {elapsed:.2f}s, saved ~{saved:.2f}s startup", flush=True)
+        return rc
+
+    def _calibrate(self, samples: int = 3) -> None:
+        with self._calibrate_lock:
+            if self.cold_start_sec is not None:
+                return
+            imports = '\n'.join(f"try:\n    import {m}\nexcept Exception:\n    pass" for m in self.preload)
+            cold: List[float] = []
+            warm: List[float] = []
+            for _ in range(samples):
+                t0 = time.perf_counter()
+                subprocess.run([sys.executable, '-c', imports], check=False)
+                cold.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                self._submit(['-c', 'pass'], os.getcwd(), dict(os.environ))
+                warm.append(time.perf_counter() - t0)
+            self.cold_start_sec = statistics.median(cold)
+            self.warm_start_sec = statistics.median(warm)
+            print(f"{self.label} cold start {self.cold_start_sec:.2f}s vs warm fork {self.warm_start_sec:.3f}s (preload: {', '.join(self.preload)})", flush=True)
+
+    def report(self) -> Dict[str, Any]:
+        """Per-job timings and the estimated startup time saved (measurement mode only)."""
+        out: Dict[str, Any] = {'jobs': list(self.jobs)}
+        if self.cold_start_sec is not None and self.warm_start_sec is not None:
+            per_job = max(0.0, self.cold_start_sec - self.warm_start_sec)
+            out.update({
+                'cold_start_sec': round(self.cold_start_sec, 3),
+                'warm_start_sec': round(self.warm_start_sec, 3),
+                'saved_per_job_sec': round(per_job, 3),
+                'saved_total_sec': round(per_job * len(self.jobs), 3),
+            })
+            print(f"{self.label} {len(self.jobs)} warm jobs, ~{out['saved_total_sec']:.2f}s startup saved", flush=True)
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            proc = self._proc
+        if proc is not None and proc.stdin is not None:
+            try:
+                proc.stdin.close()
+            except Exception:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Zygote for WarmPool (started by WarmPool, not by hand)')
+    parser.add_argument('--serve', action='store_true')
+    parser.add_argument('--result-fd', type=int, required=True)
+    parser.add_argument('--preload', default=','.join(PRELOAD))
+    args = parser.parse_args()
+    serve(args.result_fd, [m for m in args.preload.split(',') if m])
+
+
+if __name__ == '__main__':
+    main()
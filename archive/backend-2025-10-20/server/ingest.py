@@ -4,10 +4,11 @@ Parses simulation results and populates database metrics tables.
 """
 import json
 import pathlib
+import sys
 import uuid
 import traceback
 from collections import Counter, defaultdict, deque
-from typing import Optional, Dict, List, Tuple, Any
+from typing import Optional, Dict, Iterable, List, Tuple, Any
 
 # Import from other modules
 from .storage import get_supabase, use_supabase_db, upload_log_to_supabase
@@ -25,6 +26,21 @@ def set_root_path(root: pathlib.Path):
     ROOT = root
 
 
+def _load_compiled_graph(run_dir: pathlib.Path):
+    """Load preprocess/run_graph.bin via scripts/run_graph.py; None if missing, stale or unavailable."""
+    if ROOT is None:
+        return None
+    try:
+        scripts_dir = str(pathlib.Path(ROOT) / 'scripts')
+        if scripts_dir not in sys.path:
+            sys.path.append(scripts_dir)
+        from run_graph import load_run_graph_for
+        return load_run_graph_for(run_dir)
+    except Exception:
+        traceback.print_exc()
+        return None
+
+
 def _precompute_recommendations(run_dir: pathlib.Path) -> None:
     """Scan journey logs and write normalized recommendations to derived/*.json.
     This is executed once at the end of a run so the metrics API can serve
@@ -182,10 +198,151 @@ def _precompute_recommendations(run_dir: pathlib.Path) -> None:
         traceback.print_exc()
 
 
+def _tea_action_type(intent: str) -> str:
+    intent = (intent or '').lower()
+    if 'confident' in intent or 'ready' in intent:
+        return 'Confident Action'
+    if 'trying' in intent or 'attempt' in intent:
+        return 'Tentative Action'
+    return 'Direct Action'
+
+
+def _count_tea_events(events: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """TEA counters over traversal_log.jsonl events.
+
+    These are the rules the run_persona_teas rows have always been built with, so
+    every source is fed through here to keep old and new runs comparable.
+    """
+    emotions: Counter = Counter()
+    thoughts: Counter = Counter()
+    hesitations: Counter = Counter()
+    actions: Counter = Counter()
+    sentiment_values: List[float] = []
+    for event in events:
+        # Collect emotion data
+        if event.get('type') == 'emotion' and 'emotion' in event:
+            emotion_data = event['emotion']
+            emotions[emotion_data.get('label', 'Unknown')] += 1
+            # Collect sentiment values (valence as proxy for sentiment)
+            sentiment_values.append(emotion_data.get('valence', 0.0))
+        # Collect thought data (from pre_action_thought events)
+        elif event.get('type') == 'pre_action_thought':
+            # Simple thought categorization based on available actions
+            available_actions = event.get('available_actions', [])
+            if len(available_actions) == 1:
+                thoughts['Clear Path'] += 1
+            elif len(available_actions) <= 3:
+                thoughts['Few Options'] += 1
+            else:
+                thoughts['Many Options'] += 1
+        # Collect hesitation data (from wait events or unclear actions)
+        elif event.get('type') == 'wait' or (event.get('type') == 'action' and 'hesitation' in str(event)):
+            hesitations['Hesitation'] += 1
+        # Collect action data
+        elif event.get('type') == 'action':
+            actions[_tea_action_type(event.get('chosen_user_intent') or '')] += 1
+    return {
+        'emotions': emotions,
+        'thoughts': thoughts,
+        'hesitations': hesitations,
+        'actions': actions,
+        'sentiment_values': sentiment_values,
+    }
+
+
+def _read_jsonl(path: pathlib.Path) -> List[Dict[str, Any]]:
+    """Parsed lines of a JSONL file (malformed lines skipped). Raises on unreadable files."""
+    out: List[Dict[str, Any]] = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                out.append(json.loads(line.strip()))
+            except json.JSONDecodeError:
+                continue
+    return out
+
+
+def _tea_record_events(rec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The traversal_log.jsonl events a tea.jsonl record (one acted step) stands for."""
+    state = rec.get('cognitive_state') or {}
+    return [
+        {'type': 'pre_action_thought', 'screen': rec.get('screen'), 'screen_id': rec.get('screen_id'), 'available_actions': rec.get('options') or []},
+        {'type': 'emotion', 'screen': rec.get('screen'), 'screen_id': rec.get('screen_id'), 'emotion': {**state, 'label': rec.get('emotion') or 'Unknown'}},
+        {
+            'type': 'action',
+            'screen': rec.get('screen'),
+            'screen_id': rec.get('screen_id'),
+            'chosen_linkId': rec.get('link_id'),
+            'chosen_user_intent': rec.get('action_intent'),
+            'destination': rec.get('first_outcome_to'),
+            'destination_id': rec.get('outcome_to_id'),
+        },
+    ]
+
+
+def _read_sim_tea(sim_dir: pathlib.Path) -> Optional[Dict[str, Any]]:
+    """TEA counters for one simulation folder, or None when it has no TEA source.
+
+    traversal_log.jsonl is read first: it has every step, including a final one
+    that ends without an action, which tea.jsonl (acted steps only) does not. tea.jsonl
+    is only used for folders without a log and goes through the same rules.
+    """
+    log_path = sim_dir / 'traversal_log.jsonl'
+    if log_path.exists():
+        try:
+            return _count_tea_events(_read_jsonl(log_path))
+        except Exception as e:
+            print(f"[WARN] Error parsing log {log_path}: {e}")
+    tea_path = sim_dir / 'tea.jsonl'
+    if tea_path.exists():
+        try:
+            return _count_tea_events(ev for rec in _read_jsonl(tea_path) for ev in _tea_record_events(rec))
+        except Exception as e:
+            print(f"[WARN] Error reading {tea_path}: {e}")
+    return None
+
+
+def load_persona_tea(persona_dir: pathlib.Path) -> Optional[Dict[str, Any]]:
+    """TEA summary for one persona folder, counted exactly like ingest does.
+    Returns None when no simulation has a traversal log or TEA records."""
+    sims_root = persona_dir / 'simulations'
+    if not sims_root.exists():
+        return None
+    emotions: Counter = Counter()
+    thoughts: Counter = Counter()
+    hesitations: Counter = Counter()
+    actions: Counter = Counter()
+    sentiment_values: List[float] = []
+    found = False
+    for sim_dir in sorted(d for d in sims_root.iterdir() if d.is_dir()):
+        agg = _read_sim_tea(sim_dir)
+        if agg is None:
+            continue
+        found = True
+        emotions.update(agg['emotions'])
+        thoughts.update(agg['thoughts'])
+        hesitations.update(agg['hesitations'])
+        actions.update(agg['actions'])
+        sentiment_values.extend(agg['sentiment_values'])
+    if not found:
+        return None
+    return {
+        'thoughts': dict(thoughts),
+        'emotions': dict(emotions),
+        'hesitations': dict(hesitations),
+        'actions': dict(actions),
+        'sentiment_start': sentiment_values[0] if sentiment_values else 0.0,
+        'sentiment_end': sentiment_values[-1] if sentiment_values else 0.0,
+    }
+
+
 async def _aggregate_tea_data(run_dir: pathlib.Path, db_run_id: str) -> None:
     """Aggregate TEA (Thoughts, Emotions, Actions) data from simulation logs.
     
-    Parses traversal_log.jsonl files from persona simulation folders and aggregates:
+    Reads each simulation's traversal_log.jsonl, or its tea.jsonl when there is no
+    log, through one set of counting rules (_read_sim_tea). Aggregates:
     - Emotion counts by persona (for Emotion Mix chart)
     - Sentiment start/end values (for Sentiment Drift chart)
     - Thoughts, hesitations, actions data
@@ -231,61 +388,14 @@ async def _aggregate_tea_data(run_dir: pathlib.Path, db_run_id: str) -> None:
                 sentiment_values = []
 
                 for sim_dir in sim_dirs:
-                    log_path = sim_dir / 'traversal_log.jsonl'
-                    if not log_path.exists():
-                        continue
-
-                    try:
-                        # Parse the simulation log
-                        with open(log_path, 'r', encoding='utf-8') as f:
-                            for line in f:
-                                if not line.strip():
-                                    continue
-                                try:
-                                    event = json.loads(line.strip())
-                                    
-                                    # Collect emotion data
-                                    if event.get('type') == 'emotion' and 'emotion' in event:
-                                        emotion_data = event['emotion']
-                                        emotion_label = emotion_data.get('label', 'Unknown')
-                                        emotions[emotion_label] += 1
-                                        
-                                        # Collect sentiment values (valence as proxy for sentiment)
-                                        valence = emotion_data.get('valence', 0.0)
-                                        sentiment_values.append(valence)
-                                    
-                                    # Collect thought data (from pre_action_thought events)
-                                    elif event.get('type') == 'pre_action_thought':
-                                        # Simple thought categorization based on available actions
-                                        available_actions = event.get('available_actions', [])
-                                        if len(available_actions) == 1:
-                                            thoughts['Clear Path'] += 1
-                                        elif len(available_actions) <= 3:
-                                            thoughts['Few Options'] += 1
-                                        else:
-                                            thoughts['Many Options'] += 1
-                                    
-                                    # Collect hesitation data (from wait events or unclear actions)
-                                    elif event.get('type') == 'wait' or (event.get('type') == 'action' and 'hesitation' in str(event)):
-                                        hesitations['Hesitation'] += 1
-                                    
-                                    # Collect action data
-                                    elif event.get('type') == 'action':
-                                        action_type = 'Direct Action'
-                                        if 'chosen_user_intent' in event:
-                                            intent = event['chosen_user_intent'].lower()
-                                            if 'confident' in intent or 'ready' in intent:
-                                                action_type = 'Confident Action'
-                                            elif 'trying' in intent or 'attempt' in intent:
-                                                action_type = 'Tentative Action'
-                                        actions[action_type] += 1
-
-                                except json.JSONDecodeError:
-                                    continue
-
-                    except Exception as e:
-                        print(f"[WARN] Error parsing log {log_path}: {e}")
+                    agg = _read_sim_tea(sim_dir)
+                    if agg is None:
                         continue
+                    emotions.update(agg['emotions'])
+                    thoughts.update(agg['thoughts'])
+                    hesitations.update(agg['hesitations'])
+                    actions.update(agg['actions'])
+                    sentiment_values.extend(agg['sentiment_values'])
 
                 # Calculate sentiment start/end
                 sentiment_start = sentiment_values[0] if sentiment_values else 0.0
@@ -663,7 +773,15 @@ async def _ingest_run_artifacts(run_dir: pathlib.Path, db_run_id: Optional[str])
             nodes_path = run_dir / 'preprocess' / 'screen_nodes.json'
             print(f"[DEBUG] edges_path={edges_path.exists()}, nodes_path={nodes_path.exists()}")
 
-            if edges_path.exists() and isinstance(src_id, int) and isinstance(tgt_id, int):
+            graph = _load_compiled_graph(run_dir) if (isinstance(src_id, int) and isinstance(tgt_id, int)) else None
+            if graph is not None:
+                found = graph.shortest_path_len(int(src_id), int(tgt_id))
+                if isinstance(found, int):
+                    shortest_path_steps = int(found)
+                    print(f"[INFO] shortest_path_steps set from compiled run graph = {shortest_path_steps}")
+                else:
+                    print("[WARN] Compiled run graph has no path from source to target")
+            elif edges_path.exists() and isinstance(src_id, int) and isinstance(tgt_id, int):
                 try:
                     edges_text = edges_path.read_text(encoding='utf-8')
                     print(f"[DEBUG] edges file size={len(edges_text)}")
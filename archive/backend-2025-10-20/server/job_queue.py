@@ -0,0 +1,150 @@
+"""
+Durable job queue for preprocess and tests runs.
+
+Jobs are rows in a SQLite database under RUNS (runs/.jobs.sqlite3), so they
+survive API restarts and can be executed by any number of `python -m
+server.job_worker` processes sharing the runs volume. A worker claims the oldest
+QUEUED job atomically, heartbeats while it runs and marks it DONE or FAILED.
+Claims whose heartbeat is older than the stale timeout are put back to QUEUED
+(or FAILED once max_attempts is reached).
+"""
+import contextlib
+import json
+import os
+import pathlib
+import sqlite3
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+
+DB_FILE = '.jobs.sqlite3'
+
+_SCHEMA = '''
+create table if not exists jobs (
+    id text primary key,
+    kind text not null,
+    args text not null,
+    status text not null default 'QUEUED',
+    attempts integer not null default 0,
+    max_attempts integer not null default 2,
+    worker text,
+    created_at real not null,
+    claimed_at real,
+    heartbeat_at real,
+    finished_at real,
+    error text
+);
+create index if not exists jobs_status_created on jobs (status, created_at);
+'''
+
+
+def durable_jobs_enabled() -> bool:
+    """JOB_QUEUE=1 routes jobs through the durable queue instead of in-process tasks."""
+    return os.getenv('JOB_QUEUE', '0').strip().lower() in {'1', 'true', 'yes', 'on'}
+
+
+def _row(cur: sqlite3.Cursor, row: tuple) -> Dict[str, Any]:
+    out = {d[0]: v for d, v in zip(cur.description, row)}
+    out['args'] = json.loads(out.get('args') or '{}')
+    return out
+
+
+class JobQueue:
+    def __init__(self, runs_root: pathlib.Path, *, max_attempts: Optional[int] = None):
+        self.db_path = pathlib.Path(runs_root) / DB_FILE
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = int(max_attempts if max_attempts is not None else os.getenv('JOB_MAX_ATTEMPTS', '2'))
+        db = sqlite3.connect(str(self.db_path), timeout=30.0)
+        try:
+            db.execute('pragma journal_mode=wal')
+            db.executescript(_SCHEMA)
+        finally:
+            db.close()
+
+    @contextlib.contextmanager
+    def _tx(self):
+        db = sqlite3.connect(str(self.db_path), timeout=30.0, isolation_level=None)
+        try:
+            db.execute('begin immediate')
+            try:
+                yield db
+                db.execute('commit')
+            except BaseException:
+                db.execute('rollback')
+                raise
+        finally:
+            db.close()
+
+    def enqueue(self, kind: str, args: Dict[str, Any], *, job_id: Optional[str] = None) -> str:
+        job_id = job_id or str(uuid.uuid4())
+        with self._tx() as db:
+            db.execute(
+                'insert into jobs (id, kind, args, status, max_attempts, created_at) values (?,?,?,?,?,?)',
+                (job_id, kind, json.dumps(args, ensure_ascii=False), 'QUEUED', self.max_attempts, time.time()),
+            )
+        return job_id
+
+    def claim(self, worker_id: str, kinds: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest QUEUED job (of the given kinds); None when idle."""
+        now = time.time()
+        with self._tx() as db:
+            q = "select id from jobs where status='QUEUED'"
+            params: List[Any] = []
+            if kinds:
+                q += f" and kind in ({','.join('?' for _ in kinds)})"
+                params += list(kinds)
+            row = db.execute(q + ' order by created_at limit 1', params).fetchone()
+            if not row:
+                return None
+            db.execute(
+                "update jobs set status='CLAIMED', worker=?, attempts=attempts+1, claimed_at=?, heartbeat_at=? where id=?",
+                (worker_id, now, now, row[0]),
+            )
+            cur = db.execute('select * from jobs where id=?', (row[0],))
+            return _row(cur, cur.fetchone())
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Refresh a claim; False when the job is no longer claimed by this worker."""
+        with self._tx() as db:
+            cur = db.execute(
+                "update jobs set heartbeat_at=? where id=? and worker=? and status='CLAIMED'",
+                (time.time(), job_id, worker_id),
+            )
+            return cur.rowcount > 0
+
+    def finish(self, job_id: str, worker_id: str, *, error: Optional[str] = None) -> None:
+        with self._tx() as db:
+            db.execute(
+                "update jobs set status=?, finished_at=?, error=? where id=? and worker=? and status='CLAIMED'",
+                ('FAILED' if error else 'DONE', time.time(), error, job_id, worker_id),
+            )
+
+    def requeue_stale(self, stale_sec: float) -> List[Dict[str, Any]]:
+        """Release claims without a heartbeat for stale_sec. Returns the jobs given up on
+        (attempts exhausted, now FAILED) so the caller can fail their run status."""
+        cutoff = time.time() - float(stale_sec)
+        with self._tx() as db:
+            cur = db.execute("select * from jobs where status='CLAIMED' and heartbeat_at < ?", (cutoff,))
+            stale = [_row(cur, r) for r in cur.fetchall()]
+            failed: List[Dict[str, Any]] = []
+            for job in stale:
+                if int(job['attempts']) >= int(job['max_attempts']):
+                    db.execute(
+                        "update jobs set status='FAILED', finished_at=?, error=? where id=?",
+                        (time.time(), f"worker {job['worker']} lost after {job['attempts']} attempt(s)", job['id']),
+                    )
+                    failed.append(job)
+                else:
+                    db.execute("update jobs set status='QUEUED', worker=null where id=?", (job['id'],))
+        return failed
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._tx() as db:
+            cur = db.execute('select * from jobs where id=?', (job_id,))
+            row = cur.fetchone()
+            return _row(cur, row) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._tx() as db:
+            return {s: int(n) for s, n in db.execute('select status, count(*) from jobs group by status').fetchall()}
@@ -0,0 +1,89 @@
+"""
+Worker process for the durable job queue (server/job_queue.py).
+
+    python -m server.job_worker
+
+Claims preprocess/tests jobs enqueued by the API when JOB_QUEUE=1 and runs up to
+JOB_WORKER_CONCURRENCY (default 2) of them at a time. Claims are refreshed every
+JOB_HEARTBEAT_SEC; claims older than JOB_STALE_SEC (default 60) from any worker
+are requeued, and runs whose job ran out of attempts are marked FAILED.
+"""
+import asyncio
+import os
+import socket
+import time
+import traceback
+from typing import Any, Dict
+
+from . import main  # noqa: F401  same .env and path setup as the API
+from .job_queue import JobQueue
+from .routes import runs
+
+
+async def _heartbeat(queue: JobQueue, job_id: str, worker_id: str) -> None:
+    while True:
+        await asyncio.sleep(runs.JOB_HEARTBEAT_SEC)
+        try:
+            if not await asyncio.to_thread(queue.heartbeat, job_id, worker_id):
+                print(f"[worker] lost claim on job {job_id}", flush=True)
+        except Exception:
+            traceback.print_exc()
+
+
+async def _run_job(queue: JobQueue, worker_id: str, job: Dict[str, Any]) -> None:
+    error = None
+    hb = asyncio.create_task(_heartbeat(queue, job['id'], worker_id))
+    try:
+        handler = runs.JOB_HANDLERS.get(job['kind'])
+        if handler is None:
+            error = f"unknown job kind {job['kind']!r}"
+        else:
+            await handler(**job['args'])
+    except Exception as e:
+        traceback.print_exc()
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        hb.cancel()
+    try:
+        await asyncio.to_thread(queue.finish, job['id'], worker_id, error=error)
+    except Exception:
+        traceback.print_exc()
+    print(f"[worker] job {job['id']} ({job['kind']}) {'failed: ' + error if error else 'done'}", flush=True)
+
+
+async def serve(concurrency: int, poll_sec: float, stale_sec: float) -> None:
+    queue = JobQueue(runs.RUNS)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    running: set = set()
+    next_reap = 0.0
+    print(f"[worker] {worker_id} serving {runs.RUNS} (concurrency={concurrency})", flush=True)
+    while True:
+        try:
+            if time.monotonic() >= next_reap:
+                next_reap = time.monotonic() + max(poll_sec, stale_sec / 4.0)
+                for job in await asyncio.to_thread(queue.requeue_stale, stale_sec):
+                    print(f"[worker] giving up on job {job['id']} ({job['kind']})", flush=True)
+                    await runs.fail_abandoned_job(job)
+            while len(running) < concurrency:
+                job = await asyncio.to_thread(queue.claim, worker_id, list(runs.JOB_HANDLERS))
+                if job is None:
+                    break
+                print(f"[worker] claimed job {job['id']} ({job['kind']}, attempt {job['attempts']})", flush=True)
+                task = asyncio.create_task(_run_job(queue, worker_id, job))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        except Exception:
+            traceback.print_exc()
+        await asyncio.sleep(poll_sec)
+
+
+def main_cli() -> None:
+    asyncio.run(serve(
+        concurrency=max(1, int(os.getenv('JOB_WORKER_CONCURRENCY', '2'))),
+        poll_sec=float(os.getenv('JOB_POLL_SEC', '1')),
+        stale_sec=float(os.getenv('JOB_STALE_SEC', '60')),
+    ))
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -4,6 +4,7 @@ Provides both internal and public-facing metric endpoints.
 """
 import json
 import pathlib
+import sys
 from typing import Dict, Any, List, Optional, Tuple
 from collections import Counter
 import re
@@ -140,6 +141,10 @@ def _normalize_recommendation_text(text: str) -> str:
         if USE_LLM_PROOF:
             try:
                 from google.generativeai import configure, GenerativeModel
+                scripts_dir = str(pathlib.Path(ROOT) / 'scripts')
+                if scripts_dir not in sys.path:
+                    sys.path.append(scripts_dir)
+                import llm_client
                 api_key = os.environ.get('GOOGLE_API_KEY') or os.environ.get('GEMINI_API_KEY')
                 if api_key:
                     configure(api_key=api_key)
@@ -150,7 +155,7 @@ def _normalize_recommendation_text(text: str) -> str:
                         "no added facts, <=160 chars. Return only the sentence.\n" 
                         f"Sentence: {cleaned}"
                     )
-                    resp = model.generate_content(prompt)
+                    resp = llm_client.generate(model, prompt)
                     cand = (getattr(resp, 'text', None) or '').strip()
                     if cand and 4 <= len(cand) <= 200:
                         cleaned = cand
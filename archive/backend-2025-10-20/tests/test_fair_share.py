@@ -0,0 +1,35 @@
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / 'scripts'))
+
+from fair_share import FairShareScheduler  # noqa: E402
+
+
+def test_run_that_stopped_asking_does_not_block_free_slots(tmp_path):
+    sched = FairShareScheduler(tmp_path, host_slots=16, run_quota=16, owner_quota=16)
+    sched.register('run-a', owner='a', total=10)
+    sched.register('run-b', owner='b', total=10)
+
+    assert all(sched.try_acquire('run-b') is not None for _ in range(5))
+    # run-a takes one lease, reaches its local target and stops polling
+    assert sched.try_acquire('run-a') is not None
+
+    # 10 of 16 host slots are free: run-b must get them right away
+    assert [sched.try_acquire('run-b') is not None for _ in range(3)] == [True, True, True]
+
+
+def test_waiting_run_keeps_its_fair_turn(tmp_path):
+    sched = FairShareScheduler(tmp_path, host_slots=3, run_quota=16, owner_quota=16)
+    sched.register('run-a', owner='a', total=10)
+    sched.register('run-b', owner='b', total=10)
+
+    leases_b = [sched.try_acquire('run-b') for _ in range(3)]
+    assert None not in leases_b
+    # Host is full: run-a asks and is refused, so it stays in the asking set
+    assert sched.try_acquire('run-a') is None
+
+    sched.release(leases_b[0])
+    # The freed slot goes to run-a (fewer leases), not to run-b polling first
+    assert sched.try_acquire('run-b') is None
+    assert sched.try_acquire('run-a') is not None
@@ -6,17 +6,19 @@ import os
 import pathlib
 import json
 import asyncio
+import signal
+import socket
+import sys
 import traceback
 import uuid
 import time
 import re
 import random
 import string
-import subprocess
 import io
 import csv
 import zipfile
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, Tuple
 from fastapi import APIRouter, Header, HTTPException, BackgroundTasks, UploadFile, File, Form, Query
 from fastapi.responses import FileResponse, Response
 
@@ -31,8 +33,9 @@ from ..utils import write_json
 from ..models import PreprocessReq, TestsReq
 from ..auth_utils import get_current_user
 from ..db import fetchrow, execute
+from ..job_queue import JobQueue, durable_jobs_enabled
 from ..report_builder import build_report_pdf, set_runs_path
-from ..ingest import _ingest_run_artifacts
+from ..ingest import _ingest_run_artifacts, load_persona_tea
 from ..persona_matcher import resolve_personas
 from ..metrics import get_run_metrics_public
 from ..storage import use_supabase_db, get_supabase
@@ -83,7 +86,8 @@ async def generate_pdf_report(
 
     # Note: persona data handling can be added here if needed for persona-specific reports
     # For now, we'll pass the section and personaId parameters as-is
-    pdf_bytes = build_report_pdf(
+    pdf_bytes = await asyncio.to_thread(
+        build_report_pdf,
         data,
         run_id,
         section=section,
@@ -426,6 +430,7 @@ async def persona_detail(run_id: str, persona_id: str):
     - Supabase tables: run_persona_teas, run_dropoffs (optionally filtered by persona_id)
     - llm_run_insights.persona_teas JSON (fallback)
     - Local artifacts under runs/<id>/tests/persona_<persona_id>/simulations/*/{path.json,user_report.json}
+    - Local simulation logs (traversal_log.jsonl or tea.jsonl; fallback when the DB has no TEA row)
     - Aggregated persona_summary.json
     """
     # Check if run exists (either locally or in database)
@@ -445,7 +450,7 @@ async def persona_detail(run_id: str, persona_id: str):
     elif not run_exists_locally:
         raise HTTPException(status_code=404, detail='run not found')
 
-    # TEA: DB only (no local fallback)
+    # TEA: DB first; local simulation logs as the last fallback
     tea: Dict[str, Any] | None = None
     try:
         if use_supabase_db():
@@ -505,6 +510,14 @@ async def persona_detail(run_id: str, persona_id: str):
             _tb.print_exc()
             tea = None
 
+    # TEA fallback: same counting as ingest over the local simulation logs
+    if tea is None and run_exists_locally:
+        try:
+            tea = load_persona_tea(run_dir / 'tests' / f'persona_{persona_id}')
+        except Exception as e:
+            print(f"[WARN] Local TEA records unavailable for run_id={run_id} persona_id={persona_id}: {e}")
+            tea = None
+
     # Path distribution and exits/backtracks from local artifacts
     paths_count: Dict[str, int] = {}
     exits_count: Dict[str, int] = {}
@@ -1717,6 +1730,167 @@ async def all_personas_users_excel(run_id: str):
 # _ingest_run_artifacts is imported from parent package (already imported above)
 
 
+def _admission_estimate(priority: Optional[str], jobs: int) -> Optional[Dict[str, Any]]:
+    """Host-wide fair-share admission estimate for a new tests run (scripts/fair_share.py);
+    None when the scheduler database is unavailable."""
+    try:
+        scripts_dir = str(pathlib.Path(ROOT) / 'scripts')
+        if scripts_dir not in sys.path:
+            sys.path.append(scripts_dir)
+        from fair_share import FairShareScheduler
+        return FairShareScheduler(RUNS).estimate(priority=priority, jobs=jobs)
+    except Exception:
+        traceback.print_exc()
+        return None
+
+
+def _match_uploaded_screens(run_dir: pathlib.Path, source_path: pathlib.Path, target_path: pathlib.Path) -> Optional[Dict[str, Any]]:
+    """Match uploaded source/target screenshots against the run's screen hash index
+    (scripts/screen_hash.py); None when the index cannot be loaded or built."""
+    try:
+        scripts_dir = str(pathlib.Path(ROOT) / 'scripts')
+        if scripts_dir not in sys.path:
+            sys.path.append(scripts_dir)
+        from screen_hash import screen_hash_index_for
+        idx = screen_hash_index_for(run_dir)
+        return {'source': idx.match(source_path), 'target': idx.match(target_path)}
+    except Exception:
+        traceback.print_exc()
+        return None
+
+
+def _llm_telemetry_summary(run_dir: pathlib.Path, test_run_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Per-stage/per-model summary of LLM call telemetry (scripts/llm_telemetry.py): of one
+    test run's file when test_run_id is given, else of every file of the run. None when there
+    is no telemetry yet."""
+    try:
+        scripts_dir = str(pathlib.Path(ROOT) / 'scripts')
+        if scripts_dir not in sys.path:
+            sys.path.append(scripts_dir)
+        import llm_telemetry
+        if test_run_id:
+            path = llm_telemetry.tests_telemetry_path(run_dir, test_run_id)
+            paths = [path] if path.exists() else []
+        else:
+            paths = llm_telemetry.run_telemetry_files(run_dir)
+        return llm_telemetry.summarize(paths) if paths else None
+    except Exception:
+        traceback.print_exc()
+        return None
+
+
+# How often a running job's status file is refreshed (updated_at, pid, progress)
+JOB_HEARTBEAT_SEC = float(os.getenv('JOB_HEARTBEAT_SEC', '5'))
+# Wall-clock limits per run (0 disables); SIGTERM grace before SIGKILL
+RUN_DEADLINE_SEC = {
+    'preprocess': float(os.getenv('PREPROCESS_DEADLINE_SEC', '3600')),
+    'tests': float(os.getenv('TESTS_DEADLINE_SEC', '7200')),
+}
+JOB_KILL_GRACE_SEC = float(os.getenv('JOB_KILL_GRACE_SEC', '10'))
+
+
+def _cancel_marker(run_dir: pathlib.Path, kind: str) -> pathlib.Path:
+    """File whose presence asks the process running this kind of job to stop (any host/worker)."""
+    return run_dir / f'.cancel_{kind}'
+
+
+async def _kill_process_tree(proc: asyncio.subprocess.Process) -> None:
+    """SIGTERM the job's process group (runner, zygote, simulations), SIGKILL what is left after the grace period."""
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        await asyncio.wait_for(proc.wait(), timeout=JOB_KILL_GRACE_SEC)
+    except asyncio.TimeoutError:
+        pass
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    await proc.wait()
+
+
+async def _run_logged(
+    cmd: List[str],
+    log_path: pathlib.Path,
+    on_tick: Optional[Callable[[int], None]] = None,
+    *,
+    cancel_path: Optional[pathlib.Path] = None,
+    deadline_sec: Optional[float] = None,
+) -> Tuple[int, Optional[str]]:
+    """Run cmd as an asyncio subprocess with stdout/stderr appended to log_path, without
+    blocking the event loop. Returns (exit code, stop reason or None).
+
+    The child leads its own process group so the whole tree can be stopped. on_tick(pid)
+    runs in a worker thread right after start and then every JOB_HEARTBEAT_SEC; on each
+    tick the job is stopped if cancel_path exists or deadline_sec has elapsed. Returns
+    exit code -1 if the process cannot be started.
+    """
+    if cancel_path is not None and cancel_path.exists():
+        return -1, 'cancelled before start'
+    env = os.environ.copy()
+    env['PYTHONUNBUFFERED'] = '1'
+    started = time.monotonic()
+    with open(log_path, 'ab') as lf:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, cwd=str(ROOT), env=env, stdout=lf, stderr=asyncio.subprocess.STDOUT, start_new_session=True,
+            )
+        except Exception as e:
+            lf.write(f"Failed to start {cmd[1] if len(cmd) > 1 else cmd}: {e}\n".encode('utf-8'))
+            traceback.print_exc()
+            return -1, None
+        while True:
+            if on_tick is not None:
+                try:
+                    await asyncio.to_thread(on_tick, proc.pid)
+                except Exception:
+                    traceback.print_exc()
+            try:
+                rc = await asyncio.wait_for(proc.wait(), timeout=JOB_HEARTBEAT_SEC)
+            except asyncio.TimeoutError:
+                rc = None
+            if rc is not None:
+                if rc != 0 and cancel_path is not None and cancel_path.exists():
+                    # Signalled by the cancel endpoint; stop anything of the tree still alive
+                    await _kill_process_tree(proc)
+                    return rc, 'cancelled'
+                return rc, None
+            reason = None
+            if cancel_path is not None and cancel_path.exists():
+                reason = 'cancelled'
+            elif deadline_sec and time.monotonic() - started > deadline_sec:
+                reason = f'deadline of {int(deadline_sec)}s exceeded'
+            if reason:
+                lf.write(f"[api] stopping job: {reason}\n".encode('utf-8'))
+                lf.flush()
+                await _kill_process_tree(proc)
+                return proc.returncode, reason
+
+
+def _tests_progress(run_dir: pathlib.Path) -> Optional[Dict[str, Any]]:
+    """Progress block of the runner's streaming tests/persona_summary.json, if written yet."""
+    try:
+        summary = json.loads((run_dir / 'tests' / 'persona_summary.json').read_text(encoding='utf-8'))
+        return summary.get('progress')
+    except Exception:
+        return None
+
+
+def _supabase_run_project_name(db_run_id: str) -> Optional[str]:
+    """Project name of a Supabase runs row, or None. Blocking; call via asyncio.to_thread."""
+    try:
+        rr = get_supabase().table('runs').select('project_id').eq('id', db_run_id).limit(1).execute()
+        pid = rr.data[0]['project_id'] if rr.data else None
+        if pid:
+            pr = get_supabase().table('projects').select('name').eq('id', pid).limit(1).execute()
+            if pr.data:
+                return pr.data[0]['name']
+    except Exception:
+        pass
+    return None
+
 def resolve_project_run_dir(project_id_or_name: Optional[str]) -> pathlib.Path:
     print("Project Id received: {0}".format(project_id_or_name))
     if not project_id_or_name:
@@ -1755,44 +1929,55 @@ async def preprocess_job(run_id: str, page: str, figma_url: str, verbose: bool,
     ]
     if verbose:
         cmd.append('--verbose')
-    env = os.environ.copy()
-    env['PYTHONUNBUFFERED'] = '1'
-    with open(log_path, 'ab') as lf:
-        rc = subprocess.run(cmd, cwd=str(ROOT), env=env, stdout=lf, stderr=subprocess.STDOUT).returncode
+
+    deadline_sec = RUN_DEADLINE_SEC['preprocess']
+    if deadline_sec:
+        status['deadline_at'] = time.time() + deadline_sec
+
+    def _heartbeat(pid: int) -> None:
+        status['pid'] = pid
+        status['host'] = socket.gethostname()
+        status['updated_at'] = time.time()
+        write_json(status_path, status)
+
+    rc, stopped = await _run_logged(cmd, log_path, _heartbeat, cancel_path=_cancel_marker(run_dir, 'preprocess'), deadline_sec=deadline_sec)
+    final_status = 'CANCELLED' if stopped else ('COMPLETED' if rc == 0 else 'FAILED')
+    status.pop('pid', None)
     status['updated_at'] = time.time()
     status['finished_at'] = time.time()
     status['exit_code'] = rc
-    status['status'] = 'COMPLETED' if rc == 0 else 'FAILED'
+    status['status'] = final_status
+    if stopped:
+        status['cancel_reason'] = stopped
     write_json(status_path, status)
     # Mark project status and attach preprocess log URL
     if use_supabase_db():
         try:
-            client = get_supabase()
             if project_db_id:
-                client.table('projects').update({
-                    'status': ('COMPLETED' if rc == 0 else 'FAILED')
-                }).eq('id', project_db_id).execute()
+                await asyncio.to_thread(lambda: get_supabase().table('projects').update({
+                    'status': final_status
+                }).eq('id', project_db_id).execute())
         except Exception:
             pass
         try:
             project_name = 'project'
             if project_db_id:
                 try:
-                    res = get_supabase().table('projects').select('name').eq('id', project_db_id).limit(1).execute()
+                    res = await asyncio.to_thread(lambda: get_supabase().table('projects').select('name').eq('id', project_db_id).limit(1).execute())
                     if res.data:
                         project_name = res.data[0].get('name') or project_name
                 except Exception:
                     pass
-            public_url = upload_log_to_supabase(log_path, project_name, 'preprocess')
+            public_url = await asyncio.to_thread(upload_log_to_supabase, log_path, project_name, 'preprocess')
             if project_db_id and public_url:
-                get_supabase().table('projects').update({'meta': {'log_url': public_url}}).eq('id', project_db_id).execute()
+                await asyncio.to_thread(lambda: get_supabase().table('projects').update({'meta': {'log_url': public_url}}).eq('id', project_db_id).execute())
         except Exception:
             pass
     else:
         try:
             if project_db_id:
                 await execute('update projects set status=$1, updated_at=now() where id=$2',
-                              'COMPLETED' if rc == 0 else 'FAILED', project_db_id)
+                              final_status, project_db_id)
         except Exception:
             pass
         # Upload log to Supabase (path: <project>/preprocess/<file>)
@@ -1803,7 +1988,7 @@ async def preprocess_job(run_id: str, page: str, figma_url: str, verbose: bool,
                 row = await fetchrow('select name from projects where id=$1', project_db_id)
                 if row:
                     project_name = row['name']
-            public_url = upload_log_to_supabase(log_path, project_name, 'preprocess')
+            public_url = await asyncio.to_thread(upload_log_to_supabase, log_path, project_name, 'preprocess')
             if project_db_id and public_url:
                 await execute('update projects set meta = coalesce(meta, \"{}\"::jsonb) || jsonb_build_object(\"log_url\", $1) where id=$2', public_url, project_db_id)
         except Exception:
@@ -1819,6 +2004,9 @@ async def tests_job(
     source_image: Optional[str] = None,
     target_image: Optional[str] = None,
     db_run_id: Optional[str] = None,
+    owner_id: Optional[str] = None,
+    priority: Optional[str] = None,
+    admission: Optional[Dict[str, Any]] = None,
 ) -> None:
     print("Executing job...  Here is run_dir_str: {0}".format(run_dir_str))
     run_dir = pathlib.Path(run_dir_str)
@@ -1827,21 +2015,29 @@ async def tests_job(
     run_id = run_dir.name
     status_path = run_dir / 'tests_status.json'
     log_path = run_dir / 'api_tests.log'
+    # Names this test run's LLM telemetry file; the project's run folder is shared with
+    # preprocess and earlier test runs
+    test_run_id = str(db_run_id) if db_run_id else time.strftime('%Y%m%d_%H%M%S')
     status = {
         'run_id': run_id,
         'type': 'tests',
         'status': 'INPROGRESS',
         'goal': goal,
+        'test_run_id': test_run_id,
         'started_at': time.time(),
         'updated_at': time.time(),
         'log': f"/runs-files/{run_id}/api_tests.log",
     }
+    if admission:
+        status['admission'] = admission
 
     print("Here is status: {0}".format(status))
     write_json(status_path, status)
 
     print("Now almost starting...  Here is cmd")
 
+    rc = -1
+    final_status = 'FAILED'
     try:
         # If a resolved persona plan exists, pass it to the runner via --persona-plan
         persona_plan_path = run_dir / 'tests' / 'persona_plan.json'
@@ -1850,7 +2046,12 @@ async def tests_job(
             '--run-dir', str(run_dir),
             '--goal', goal,
             '--max-minutes', str(max_minutes or 2),
+            '--test-run-id', test_run_id,
         ]
+        if owner_id:
+            cmd += ['--owner', str(owner_id)]
+        if priority in ('interactive', 'bulk'):
+            cmd += ['--priority', priority]
         if persona_plan_path.exists():
             cmd += ['--persona-plan', str(persona_plan_path)]
         if source_image and target_image:
@@ -1858,15 +2059,36 @@ async def tests_job(
         else:
             cmd += ['--source-id', str(source_id), '--target-id', str(target_id)]
 
-        env = os.environ.copy()
-        env['PYTHONUNBUFFERED'] = '1'
-        with open(log_path, 'ab') as lf:
-            rc = subprocess.run(cmd, cwd=str(ROOT), env=env, stdout=lf, stderr=subprocess.STDOUT).returncode
+        deadline_sec = RUN_DEADLINE_SEC['tests']
+        if deadline_sec:
+            status['deadline_at'] = time.time() + deadline_sec
+
+        def _heartbeat(pid: int) -> None:
+            status['pid'] = pid
+            status['host'] = socket.gethostname()
+            status['updated_at'] = time.time()
+            progress = _tests_progress(run_dir)
+            if progress:
+                status['progress'] = progress
+            write_json(status_path, status)
+
+        rc, stopped = await _run_logged(cmd, log_path, _heartbeat, cancel_path=_cancel_marker(run_dir, 'tests'), deadline_sec=deadline_sec)
+        final_status = 'CANCELLED' if stopped else ('COMPLETED' if rc == 0 else 'FAILED')
         print("RC status...  Here is rc: {0}".format(rc))
+        status.pop('pid', None)
+        progress = _tests_progress(run_dir)
+        if progress:
+            status['progress'] = progress
         status['updated_at'] = time.time()
         status['finished_at'] = time.time()
         status['exit_code'] = rc
-        status['status'] = 'COMPLETED' if rc == 0 else 'FAILED'
+        status['status'] = final_status
+        if stopped:
+            status['cancel_reason'] = stopped
+        llm_summary = await asyncio.to_thread(_llm_telemetry_summary, run_dir, test_run_id)
+        if llm_summary:
+            status['llm'] = llm_summary
+            status['llm_log'] = f"/runs-files/{run_id}/telemetry/tests_{test_run_id}.jsonl"
         write_json(status_path, status)
     except Exception as e:
         print("The test run executon exceptio error: {0}".format(e))
@@ -1882,37 +2104,28 @@ async def tests_job(
                 # Try to upload tests.zip and persist URL in meta.report_url
                 tests_zip_url = None
                 try:
-                    # Derive project name for storage path
-                    project_name = None
-                    try:
-                        rr = get_supabase().table('runs').select('project_id').eq('id', db_run_id).limit(1).execute()
-                        pid = rr.data[0]['project_id'] if rr.data else None
-                        if pid:
-                            pr = get_supabase().table('projects').select('name').eq('id', pid).limit(1).execute()
-                            if pr.data:
-                                project_name = pr.data[0]['name']
-                    except Exception:
-                        project_name = None
+                    # Derive project name for storage path; zipping and uploading tests/ runs off the event loop
+                    project_name = await asyncio.to_thread(_supabase_run_project_name, db_run_id)
                     if project_name:
-                        tests_zip_url = upload_tests_dir_zip(run_dir, project_name, run_id)
+                        tests_zip_url = await asyncio.to_thread(upload_tests_dir_zip, run_dir, project_name, run_id)
                 except Exception:
                     tests_zip_url = None
 
                 payload = {
-                    'status': ('COMPLETED' if rc == 0 else 'FAILED'),
+                    'status': final_status,
                     'finished_at': None,  # server timestamp handled by DB default/trigger if any
                     'log_path': str(status['log'])
                 }
                 if tests_zip_url:
                     payload['meta'] = {'report_url': tests_zip_url}
-                get_supabase().table('runs').update(payload).eq('id', db_run_id).execute()
+                await asyncio.to_thread(lambda: get_supabase().table('runs').update(payload).eq('id', db_run_id).execute())
         except Exception as e:
             print("DB test failed update exception error: {0}".format(e))
     else:
         try:
             if db_run_id:
                 await execute('update runs set status=$1, finished_at=now(), log_path=$2 where id=$3',
-                              'COMPLETED' if rc == 0 else 'FAILED', str(status['log']), db_run_id)
+                              final_status, str(status['log']), db_run_id)
         except Exception as e:
             print("DB test completed update exception error: {0}".format(e))
     # Upload tests log and artifacts to Supabase: <project>/runs/<test_run_id>/
@@ -1921,24 +2134,16 @@ async def tests_job(
         project_name = None
         if db_run_id:
             if use_supabase_db():
-                try:
-                    rr = get_supabase().table('runs').select('project_id').eq('id', db_run_id).limit(1).execute()
-                    pid = rr.data[0]['project_id'] if rr.data else None
-                    if pid:
-                        pr = get_supabase().table('projects').select('name').eq('id', pid).limit(1).execute()
-                        if pr.data:
-                            project_name = pr.data[0]['name']
-                except Exception:
-                    project_name = None
+                project_name = await asyncio.to_thread(_supabase_run_project_name, db_run_id)
             else:
                 row = await fetchrow('select p.name from runs r join projects p on r.project_id=p.id where r.id=$1', db_run_id)
                 if row:
                     project_name = row['name']
         if project_name:
-            upload_log_to_supabase(log_path, project_name, 'tests', run_id)
+            await asyncio.to_thread(upload_log_to_supabase, log_path, project_name, 'tests', run_id)
             # Upload all artifacts (images, csv, logs) under the run directory
             try:
-                upload_run_artifacts(run_dir, project_name, run_id)
+                await asyncio.to_thread(upload_run_artifacts, run_dir, project_name, run_id)
             except Exception as e:
                 print("Upload run artifacts exception: {0}".format(e))
     except Exception as e:
@@ -1947,6 +2152,50 @@ async def tests_job(
     
 
 
+# Job kinds run by server.job_worker; queued args are the handler's keyword arguments
+JOB_HANDLERS = {
+    'preprocess': preprocess_job,
+    'tests': tests_job,
+}
+
+
+def _enqueue_job(kind: str, args: Dict[str, Any]) -> str:
+    return JobQueue(RUNS).enqueue(kind, args)
+
+
+async def fail_abandoned_job(job: Dict[str, Any]) -> None:
+    """Mark the run of a queued job that ran out of attempts as FAILED (status file and DB row)."""
+    args = job.get('args') or {}
+    error = job.get('error') or 'job abandoned by its worker'
+    if job.get('kind') == 'preprocess':
+        status_path = RUNS / str(args.get('run_id')) / 'status.json'
+        table, row_id = 'projects', args.get('project_db_id')
+    else:
+        run_dir = pathlib.Path(str(args.get('run_dir_str') or ''))
+        if not run_dir.is_absolute():
+            run_dir = RUNS / run_dir
+        status_path = run_dir / 'tests_status.json'
+        table, row_id = 'runs', args.get('db_run_id')
+    try:
+        status = json.loads(status_path.read_text(encoding='utf-8')) if status_path.exists() else {}
+        status.pop('pid', None)
+        status.update({'status': 'FAILED', 'error': error, 'updated_at': time.time(), 'finished_at': time.time()})
+        write_json(status_path, status)
+    except Exception:
+        traceback.print_exc()
+    if not row_id:
+        return
+    try:
+        if use_supabase_db():
+            await asyncio.to_thread(lambda: get_supabase().table(table).update({'status': 'FAILED'}).eq('id', row_id).execute())
+        elif table == 'projects':
+            await execute('update projects set status=$1, updated_at=now() where id=$2', 'FAILED', row_id)
+        else:
+            await execute('update runs set status=$1, finished_at=now() where id=$2', 'FAILED', row_id)
+    except Exception:
+        traceback.print_exc()
+
+
 @router.post('/runs/preprocess')
 async def start_preprocess(req: PreprocessReq, authorization: Optional[str] = Header(None)):
     RUNS.mkdir(parents=True, exist_ok=True)
@@ -1995,6 +2244,7 @@ async def start_preprocess(req: PreprocessReq, authorization: Optional[str] = He
         'log': f"/runs-files/{run_id}/api_preprocess.log",
     })
     log_message(f"Run {run_id} started. Project candidate {candidate_db_project_id}. Status set to INPROGRESS.")
+    _cancel_marker(run_dir, 'preprocess').unlink(missing_ok=True)
 
     # helper for failures
     def fail_process(error_msg: str):
@@ -2124,6 +2374,16 @@ async def start_preprocess(req: PreprocessReq, authorization: Optional[str] = He
             log_message(f"Legacy JSON update failed: {e}", level="WARNING")
 
         # launch extraction
+        if durable_jobs_enabled():
+            try:
+                job_id = await asyncio.to_thread(_enqueue_job, 'preprocess', {
+                    'run_id': run_id, 'page': req.page, 'figma_url': req.figma_url,
+                    'verbose': req.verbose, 'project_db_id': db_project_id,
+                })
+                log_message(f"preprocess_job queued as job {job_id}.")
+            except Exception as e:
+                fail_process(f"preprocess_job enqueue failed: {e}")
+            return
         log_message("Launching preprocess_job...")
         try:
             await preprocess_job(run_id, req.page, req.figma_url, req.verbose, db_project_id)
@@ -2162,6 +2422,7 @@ async def start_tests_by_images(
     target: UploadFile = File(...),
     personas: Optional[str] = Form(None),
     exclusiveUsers: Optional[str] = Form(None),
+    priority: Optional[str] = Form(None),
     authorization: Optional[str] = Header(None)
 ):
 
@@ -2236,6 +2497,11 @@ async def start_tests_by_images(
     source_path.write_bytes(await source.read())
     target_path.write_bytes(await target.read())
 
+    # Fail fast when an upload is far from every screen or matches several near-identical frames
+    matches = await asyncio.to_thread(_match_uploaded_screens, run_dir, source_path, target_path)
+    if matches and not all(isinstance(m.get('screen_id'), int) for m in matches.values()):
+        raise HTTPException(status_code=422, detail={'message': 'Uploaded screenshots do not match a unique screen', **matches})
+
     print("img_dir: {0}, source_path: {1}, target_path: {2}".format(img_dir, source_path, target_path))
 
     # Parse personas + exclusivity flag
@@ -2277,6 +2543,10 @@ async def start_tests_by_images(
     except Exception as e:
         print(f"persona resolution error: {e}")
 
+    # Fair-share class (interactive unless the caller asks for bulk) and admission estimate
+    priority = 'bulk' if str(priority or '').strip().lower() == 'bulk' else 'interactive'
+    admission = await asyncio.to_thread(_admission_estimate, priority, sum(int(p.get('users') or 1) for p in persona_plan))
+
     # mark INPROGRESS
     write_json(run_dir / 'tests_status.json', {
         'run_id': run_dir.name,
@@ -2291,8 +2561,10 @@ async def start_tests_by_images(
             'source': f"/runs-files/{run_dir.name}/uploads/source.png",
             'target': f"/runs-files/{run_dir.name}/uploads/target.png",
         },
-        'meta': { 'persona_plan': persona_plan, 'allow_overlap': allow_overlap }
+        'meta': { 'persona_plan': persona_plan, 'allow_overlap': allow_overlap },
+        'admission': admission,
     })
+    _cancel_marker(run_dir, 'tests').unlink(missing_ok=True)
 
     # DB run insert
     db_run_id = test_run_id
@@ -2351,14 +2623,22 @@ async def start_tests_by_images(
 
     #bg.add_task(tests_job, str(run_dir), goal, int(maxMinutes or 2), None, None, str(source_path), str(target_path), db_run_id)
 
+    job_id = None
     import os as _os
     if _os.getenv('DISABLE_BACKGROUND', '').lower() in ('1','true','yes','y'):
         log_message("tests_job scheduling skipped (DISABLE_BACKGROUND)")
+    elif durable_jobs_enabled():
+        job_id = await asyncio.to_thread(_enqueue_job, 'tests', {
+            'run_dir_str': str(run_dir), 'goal': goal, 'max_minutes': int(maxMinutes or 2),
+            'source_image': str(source_path), 'target_image': str(target_path), 'db_run_id': db_run_id,
+            'owner_id': owner_id, 'priority': priority, 'admission': admission,
+        })
     else:
         asyncio.create_task(
             tests_job(
                 str(run_dir), goal, int(maxMinutes or 2),
-                None, None, str(source_path), str(target_path), db_run_id
+                None, None, str(source_path), str(target_path), db_run_id,
+                owner_id=owner_id, priority=priority, admission=admission,
             )
         )
 
@@ -2369,7 +2649,70 @@ async def start_tests_by_images(
         'uploads': {'source': f"/runs-files/{run_dir.name}/uploads/source.png", 'target': f"/runs-files/{run_dir.name}/uploads/target.png"},
         'status_url': f"/runs/{run_dir.name}/status",
         'log': f"/runs-files/{run_dir.name}/api_tests.log",
-        'db': {'run_id': db_run_id}
+        'db': {'run_id': db_run_id},
+        'admission': admission,
+        'job_id': job_id,
+    }
+
+
+@router.post('/runs/{run_id}/cancel')
+async def cancel_run(run_id: str, kind: Optional[str] = None, authorization: Optional[str] = Header(None)):
+    """Stop a running or queued preprocess/tests job of this run.
+
+    Drops a cancel marker that the process supervising the job (this API process,
+    another replica or a job worker) polls every JOB_HEARTBEAT_SEC; it then kills the
+    job's whole process tree and marks the run CANCELLED in its status file and DB row.
+    When the job runs on this host its process group is signalled right away.
+    """
+    if not get_current_user(authorization):
+        raise HTTPException(status_code=401, detail="unauthorized")
+    run_dir = RUNS / run_id
+    if not run_dir.exists():
+        raise HTTPException(status_code=404, detail='run not found')
+    status_files = {'tests': run_dir / 'tests_status.json', 'preprocess': run_dir / 'status.json'}
+    if kind is not None and kind not in status_files:
+        raise HTTPException(status_code=400, detail="kind must be 'tests' or 'preprocess'")
+    status: Dict[str, Any] = {}
+    for k in ([kind] if kind else ['tests', 'preprocess']):
+        try:
+            st = json.loads(status_files[k].read_text(encoding='utf-8'))
+        except Exception:
+            continue
+        if st.get('status') == 'INPROGRESS':
+            kind, status = k, st
+            break
+    if not status:
+        raise HTTPException(status_code=409, detail='no job in progress for this run')
+
+    write_json(_cancel_marker(run_dir, kind), {'requested_at': time.time()})
+    signalled = False
+    pid = status.get('pid')
+    if isinstance(pid, int) and status.get('host') == socket.gethostname():
+        try:
+            os.killpg(pid, signal.SIGTERM)
+            signalled = True
+        except (ProcessLookupError, PermissionError):
+            pass
+    return {'run_id': run_id, 'kind': kind, 'cancel_requested': True, 'signalled': signalled}
+
+
+@router.get('/runs/{run_id}/telemetry')
+async def get_run_telemetry(run_id: str, authorization: Optional[str] = Header(None)):
+    """LLM call telemetry of a run, all files together (preprocess stages and every test run):
+    totals, per stage and per model — latency percentiles, retries, limiter wait, backoff,
+    bytes, tokens, cache hits. tests_status.json carries the summary of its own test run."""
+    if not get_current_user(authorization):
+        raise HTTPException(status_code=401, detail="unauthorized")
+    run_dir = RUNS / run_id
+    if not run_dir.exists():
+        raise HTTPException(status_code=404, detail='run not found')
+    summary = await asyncio.to_thread(_llm_telemetry_summary, run_dir)
+    telemetry_dir = run_dir / 'telemetry'
+    logs = sorted(p.name for p in telemetry_dir.glob('*.jsonl')) if telemetry_dir.exists() else []
+    return {
+        'run_id': run_id,
+        'logs': [f"/runs-files/{run_id}/telemetry/{name}" for name in logs],
+        'summary': summary or {},
     }
 
 